@@ -0,0 +1,74 @@
+import random
+import string
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+
+# 固定基准时间，保证相同种子生成完全相同的数据
+BASE_TIME = datetime(2025, 1, 1)
+KEY_ALPHABET = string.ascii_letters + string.digits
+# 与生成器为 PROD-000 这类产品ID签发的密钥长度一致（19组），产品ID越长组数越多
+KEY_GROUPS = 19
+PRODUCT_COUNT = 20
+ISSUED_PRODUCT = "PROD-ISSUED"
+
+# 状态分布：大部分为激活，少量过期、吊销和待激活
+STATUS_WEIGHTS = (
+    (LicenseStatus.ACTIVE, 80),
+    (LicenseStatus.EXPIRED, 10),
+    (LicenseStatus.REVOKED, 5),
+    (LicenseStatus.PENDING, 5),
+)
+
+
+def random_key(rng: random.Random) -> str:
+    """随机许可证密钥，格式与生成器相同但无法解密，只用于查询类测试"""
+    return '-'.join(''.join(rng.choices(KEY_ALPHABET, k=8)) for _ in range(KEY_GROUPS))
+
+
+def generate_licenses(count: int, seed: int = 42):
+    """按种子逐条生成可复现的许可证数据集"""
+    rng = random.Random(seed)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    license_types = list(LicenseType)
+
+    for i in range(count):
+        start_date = BASE_TIME + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        license = License(
+            license_key=random_key(rng),
+            license_type=rng.choice(license_types),
+            start_date=start_date,
+            end_date=start_date + timedelta(days=rng.choice((30, 365, 730))),
+            product_id=f"PROD-{rng.randrange(PRODUCT_COUNT):03d}",
+            user_info={"company": f"Company {rng.randrange(count // 10 + 1)}", "batch_id": i},
+            status=rng.choices(statuses, weights)[0]
+        )
+        license.created_at = license.updated_at = start_date
+        yield license
+
+
+def populate(repository, count: int, seed: int = 42, chunk_size: int = 10000) -> list[tuple]:
+    """分块写入数据集，返回每个许可证的 (密钥, 产品ID, 状态)
+
+    验证类的测试应只选用激活状态的许可证并使用其自身的产品ID，否则测到的只是拒绝路径。
+    """
+    licenses = []
+    chunk = []
+    for license in generate_licenses(count, seed):
+        licenses.append((license.license_key, license.product_id, license.status))
+        chunk.append(license)
+        if len(chunk) >= chunk_size:
+            repository.save_licenses(chunk, on_conflict='skip')
+            chunk = []
+    if chunk:
+        repository.save_licenses(chunk, on_conflict='skip')
+    return licenses
+
+
+def issue_licenses(manager, count: int, product_id: str = ISSUED_PRODUCT) -> list[tuple]:
+    """通过管理器签发 count 个有效期100年的许可证，返回 (密钥, 产品ID)
+
+    数据集中的密钥无法解密，验证类的测试使用这里签发的密钥，测到的是完整的验证路径。
+    """
+    licenses = manager.batch_create_licenses(count, LicenseType.STANDARD, 100, product_id)
+    return [(license.license_key, product_id) for license in licenses]
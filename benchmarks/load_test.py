@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from collections import defaultdict
+from datetime import datetime, timedelta
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from benchmarks.datasets import populate, issue_licenses
+
+SECRET_KEY = "load_test_secret_key"
+DEFAULT_MIX = {'validate': 90, 'create': 5, 'revoke': 5}
+
+
+def parse_mix(text: str) -> dict:
+    """解析操作比例，例如 validate=90,create=5,revoke=5"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"未知的操作: {name}")
+        mix[name] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("操作比例之和必须大于0")
+    return mix
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    return values[int(q * (len(values) - 1))]
+
+
+def _summarize(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'p50_ms': _percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p99_ms': _percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': latencies[-1] * 1000 if latencies else None,
+    }
+
+
+class _WorkerStats:
+    """单个进程内各线程共享的统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.lock_waits = []
+
+    def record(self, operation: str, seconds: float, error: str = None, rejected: bool = False):
+        with self.lock:
+            self.latencies[operation].append(seconds)
+            if error:
+                self.errors[f"{operation}: {error}"] += 1
+            elif rejected:
+                self.rejected[operation] += 1
+
+
+def _run_operation(manager: LicenseManager, operation: str, licenses: dict, rng: random.Random) -> tuple:
+    """执行一次操作，返回 (错误描述, 是否被拒绝)
+
+    验证使用预先签发的许可证和它自身的产品ID，经过完整的离线解密和数据库读写；
+    数据集中的许可证只用于吊销，验证通常不会被拒绝，被拒绝的计入 rejected 而不是错误。
+    """
+    if operation == 'validate':
+        license_key, product_id = rng.choice(licenses['issued'])
+        valid, message = manager.validator.validate_license_online(
+            license_key, product_id, {"machine_id": f"m{rng.randrange(100)}"}
+        )
+        # 在线验证内部捕获数据库异常并以消息返回
+        if not valid and message.startswith("在线验证失败"):
+            return message, False
+        return None, not valid
+    elif operation == 'create':
+        now = datetime.now()
+        manager.create_license(LicenseType.STANDARD, now, now + timedelta(days=365), "PROD-LOAD")
+    elif operation == 'revoke':
+        if not manager.revoke_license(rng.choice(licenses['keys'])):
+            return "吊销失败", False
+    return None, False
+
+
+def _thread_loop(manager, licenses, mix, deadline, seed, stats):
+    rng = random.Random(seed)
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            error, rejected = _run_operation(manager, operation, licenses, rng)
+        except Exception as e:
+            error, rejected = f"{type(e).__name__}: {e}", False
+        stats.record(operation, time.perf_counter() - start, error, rejected)
+
+
+def _probe_lock_wait(db_path, deadline, interval, stats):
+    """定期用 BEGIN IMMEDIATE 获取写锁，记录等待时间"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("ROLLBACK")
+                stats.lock_waits.append(time.perf_counter() - start)
+            except sqlite3.OperationalError as e:
+                stats.record('lock_probe', time.perf_counter() - start, str(e))
+            time.sleep(interval)
+    finally:
+        conn.close()
+
+
+def _process_main(db_path, licenses, mix, threads, duration, seed, aggregate, results):
+    """一个工作进程：独立的 LicenseManager，多个线程并发执行操作"""
+    manager = LicenseManager(db_path=db_path, secret_key=SECRET_KEY, aggregate_validations=aggregate)
+    stats = _WorkerStats()
+    deadline = time.monotonic() + duration
+    workers = [
+        threading.Thread(target=_thread_loop, args=(manager, licenses, mix, deadline, seed * 1000 + i, stats))
+        for i in range(threads)
+    ]
+    workers.append(threading.Thread(target=_probe_lock_wait, args=(db_path, deadline, 0.05, stats)))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    manager.repository.close()
+    results.put({
+        'latencies': dict(stats.latencies),
+        'errors': dict(stats.errors),
+        'rejected': dict(stats.rejected),
+        'lock_waits': stats.lock_waits,
+    })
+
+
+def run_load_test(db_path: str, processes: int = 2, threads: int = 4, duration: float = 10.0,
+                  mix: dict = None, dataset_size: int = 10000, seed: int = 42, aggregate: bool = False) -> dict:
+    """对同一个数据库文件发起多进程、多线程的混合负载，返回汇总结果"""
+    mix = mix or DEFAULT_MIX
+    setup = LicenseManager(db_path=db_path, secret_key=SECRET_KEY)
+    dataset = populate(setup.repository, dataset_size, seed)
+    licenses = {
+        'keys': [key for key, _, _ in dataset],
+        'issued': issue_licenses(setup, min(dataset_size, 1000)),
+    }
+    setup.repository.close()
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_process_main,
+            args=(db_path, licenses, mix, threads, duration, seed + i, aggregate, results)
+        )
+        for i in range(processes)
+    ]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    rejected = defaultdict(int)
+    lock_waits = []
+    for result in collected:
+        for operation, values in result['latencies'].items():
+            latencies[operation].extend(values)
+        for error, count in result['errors'].items():
+            errors[error] += count
+        for operation, count in result['rejected'].items():
+            rejected[operation] += count
+        lock_waits.extend(result['lock_waits'])
+
+    operations = {}
+    for operation, values in latencies.items():
+        failed = sum(count for error, count in errors.items() if error.startswith(f"{operation}:"))
+        operations[operation] = {
+            'count': len(values),
+            'errors': failed,
+            'rejected': rejected[operation],
+            'ops_per_sec': len(values) / elapsed,
+            **_summarize(values),
+        }
+
+    lock_waits.sort()
+    return {
+        'config': {
+            'processes': processes, 'threads': threads, 'duration': duration, 'mix': mix,
+            'dataset_size': dataset_size, 'seed': seed, 'aggregate_validations': aggregate,
+        },
+        'elapsed_seconds': elapsed,
+        'total_ops_per_sec': sum(len(values) for operation, values in latencies.items()
+                                 if operation != 'lock_probe') / elapsed,
+        'operations': operations,
+        'lock_wait': {
+            'samples': len(lock_waits),
+            'mean_ms': sum(lock_waits) / len(lock_waits) * 1000 if lock_waits else None,
+            **_summarize(lock_waits),
+        },
+        'errors': dict(errors),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="在线验证并发负载测试")
+    parser.add_argument('--db', default='load_test.db', help="测试数据库路径（会被覆盖）")
+    parser.add_argument('--processes', type=int, default=2, help="进程数")
+    parser.add_argument('--threads', type=int, default=4, help="每个进程的线程数")
+    parser.add_argument('--duration', type=float, default=10.0, help="持续时间（秒）")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="操作比例，例如 validate=90,create=5,revoke=5")
+    parser.add_argument('--dataset-size', type=int, default=10000, help="预先写入的许可证数量")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--aggregate', action='store_true', help="按天聚合验证计数，而不是逐条写审计日志")
+    parser.add_argument('--output', help="结果JSON文件路径")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    try:
+        report = run_load_test(args.db, args.processes, args.threads, args.duration, args.mix,
+                               args.dataset_size, args.seed, args.aggregate)
+    finally:
+        if os.path.exists(args.db):
+            os.remove(args.db)
+
+    print(f"总吞吐量: {report['total_ops_per_sec']:.1f} ops/s")
+    for operation, stats in sorted(report['operations'].items()):
+        print(f"{operation:12s} {stats['count']:8d} 次  {stats['ops_per_sec']:10.1f} ops/s  "
+              f"p50 {stats['p50_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms  错误 {stats['errors']}  "
+              f"拒绝 {stats['rejected']}")
+    lock_wait = report['lock_wait']
+    if lock_wait['samples']:
+        print(f"写锁等待: 平均 {lock_wait['mean_ms']:.3f} ms  p99 {lock_wait['p99_ms']:.3f} ms  "
+              f"最大 {lock_wait['max_ms']:.3f} ms")
+    for error, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+        print(f"- {error}: {count}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import subprocess
+import platform
+import tempfile
+from datetime import datetime, timedelta
+from src import analytics
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.license_generator import LicenseGenerator
+from src.license_validator import LicenseValidator
+from benchmarks.datasets import BASE_TIME, populate, issue_licenses
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+SECRET_KEY = "benchmark_secret_key"
+COLD_START_BUDGET_MS = 300.0
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 冷启动脚本：新进程中导入并构造 LicenseManager，执行一次数据库查询
+COLD_START_SCRIPT = (
+    "import sys\n"
+    "from src.license_manager import LicenseManager\n"
+    "manager = LicenseManager(db_path=sys.argv[1], secret_key='benchmark_secret_key')\n"
+    "manager.get_license_by_key('missing')\n"
+)
+
+
+def measure(func, iterations: int, ops_per_call: int = 1, warmup: int = None) -> dict:
+    """预热后重复调用 func，返回吞吐量和延迟分位数"""
+    for _ in range(iterations // 10 if warmup is None else warmup):
+        func()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations * ops_per_call / total if total else float('inf'),
+        'p50_ms': latencies[int(0.50 * (len(latencies) - 1))] * 1000,
+        'p99_ms': latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def issued_keys(count: int, product_id: str, secret_key: str = SECRET_KEY) -> list[str]:
+    """由 LicenseGenerator 签发、能通过离线验证的密钥，有效期从当前时间起100年"""
+    generator = LicenseGenerator(secret_key)
+    return [license.license_key
+            for license in generator.batch_generate_licenses(count, LicenseType.STANDARD, 100, product_id)]
+
+
+def bench_crypto(iterations: int, seed: int) -> dict:
+    """与数据量无关的生成和离线验证，离线验证使用能通过验证的密钥"""
+    generator = LicenseGenerator(SECRET_KEY)
+    validator = LicenseValidator(SECRET_KEY)
+    rng = random.Random(seed)
+    keys = issued_keys(min(iterations, 1000), "PROD-000")
+    valid, message = validator.validate_license_offline(keys[0], "PROD-000")
+    if not valid:
+        raise RuntimeError(f"基准密钥未通过离线验证: {message}")
+    return {
+        'generate_license_key': measure(
+            lambda: generator.generate_license_key(LicenseType.STANDARD, BASE_TIME, BASE_TIME, "PROD-000"),
+            iterations
+        ),
+        'validate_license_offline': measure(
+            lambda: validator.validate_license_offline(rng.choice(keys), "PROD-000"), iterations
+        ),
+    }
+
+
+def bench_storage(size: int, iterations: int, seed: int, work_dir: str) -> dict:
+    """在 size 条许可证的SQLite数据库上测量查询、在线验证和批量创建
+
+    数据集的密钥是无法解密的随机字符串，只用于查询；在线验证使用另外签发的许可证，
+    测量的是包括离线解密和数据库读写在内、验证通过时的完整路径。
+    """
+    db_path = os.path.join(work_dir, f"bench_{size}.db")
+    manager = LicenseManager(db_path=db_path, secret_key=SECRET_KEY)
+    try:
+        dataset = populate(manager.repository, size, seed)
+        keys = [key for key, _, _ in dataset]
+        issued = issue_licenses(manager, min(iterations, 1000))
+        # 签发的许可证也在表中，全表类测试按实际行数计算吞吐量
+        rows = size + len(issued)
+        rng = random.Random(seed)
+
+        def validate_online():
+            license_key, product_id = rng.choice(issued)
+            valid, message = manager.validator.validate_license_online(license_key, product_id, {"machine_id": "m1"})
+            if not valid:
+                raise RuntimeError(f"在线验证未通过: {message}")
+
+        results = {
+            'get_license_by_key': measure(lambda: manager.get_license_by_key(rng.choice(keys)), iterations),
+            'validate_license_online': measure(validate_online, iterations),
+            'batch_create_licenses': measure(
+                lambda: manager.batch_create_licenses(100, LicenseType.STANDARD, 1, "PROD-BENCH"),
+                max(iterations // 100, 3), ops_per_call=100, warmup=1
+            ),
+            # 全表读取的耗时与数据量成正比，迭代次数相应减少
+            'get_all_licenses': measure(
+                manager.get_all_licenses, max(3, min(20, 100000 // size)), ops_per_call=rows, warmup=1
+            ),
+        }
+        if analytics.np is not None:
+            columns = manager.license_columns()
+
+            def weeks():
+                mask = columns.filter(product_id="PROD-000", license_type=LicenseType.PROFESSIONAL)
+                return columns.expiring_by_period(BASE_TIME, mask=mask)
+
+            results['license_columns'] = measure(manager.license_columns, 3, ops_per_call=rows, warmup=0)
+            results['expiring_by_week'] = measure(weeks, max(3, min(100, 1000000 // size)), ops_per_call=rows)
+
+        # 续期会写入新许可证，放在最后以免影响其他测试的数据量；每批使用尚未续期的密钥
+        renew_size = max(1, min(100, size // 20))
+        renew_batches = (keys[i:i + renew_size] for i in range(0, len(keys), renew_size))
+        results['renew_licenses'] = measure(
+            lambda: manager.renew_licenses(next(renew_batches), timedelta(days=365)),
+            max(iterations // 100, 3), ops_per_call=renew_size, warmup=1
+        )
+    finally:
+        manager.repository.close()
+    return results
+
+
+def bench_cold_start(iterations: int, work_dir: str) -> dict:
+    """测量新进程从启动到完成一次查询的耗时，包括解释器启动
+
+    fresh 为每次使用新数据库（需要建表），existing 为打开已初始化的数据库。
+    """
+    db_path = os.path.join(work_dir, "bench_cold_start.db")
+
+    def start_process(path):
+        subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, path], cwd=PROJECT_ROOT, check=True)
+
+    def fresh():
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        start_process(db_path)
+
+    return {
+        'cold_start_fresh_db': measure(fresh, iterations, warmup=1),
+        'cold_start_existing_db': measure(lambda: start_process(db_path), iterations, warmup=1),
+    }
+
+
+def run(sizes, iterations: int = 1000, seed: int = 42, work_dir: str = None, progress=None,
+        cold_start_iterations: int = 10) -> dict:
+    """运行全部基准测试，返回可序列化为JSON的结果"""
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="license-bench-")
+    results = {}
+    try:
+        for name, result in bench_crypto(iterations, seed).items():
+            results[name] = result
+            if progress:
+                progress(name, result)
+        for name, result in bench_cold_start(cold_start_iterations, work_dir).items():
+            results[name] = result
+            if progress:
+                progress(name, result)
+        for size in sizes:
+            for name, result in bench_storage(size, iterations, seed, work_dir).items():
+                key = f"{name}[{size}]"
+                results[key] = result
+                if progress:
+                    progress(key, result)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+            'seed': seed,
+            'iterations': iterations,
+            'sizes': list(sizes),
+            'cold_start_iterations': cold_start_iterations,
+        },
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """与基线比较，返回吞吐量下降超过 threshold 的项目"""
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = results['results'].get(name)
+        if current is None:
+            continue
+        floor = base['ops_per_sec'] * (1 - threshold)
+        if current['ops_per_sec'] < floor:
+            change = current['ops_per_sec'] / base['ops_per_sec'] - 1
+            regressions.append(
+                f"{name}: {current['ops_per_sec']:.1f} ops/s，基线 {base['ops_per_sec']:.1f} ops/s（{change:+.1%}）"
+            )
+    return regressions
+
+
+def check_cold_start(results: dict, budget_ms: float) -> list[str]:
+    """返回冷启动 p50 超出预算的项目"""
+    return [
+        f"{name}: p50 {result['p50_ms']:.1f} ms，预算 {budget_ms:.1f} ms"
+        for name, result in results['results'].items()
+        if name.startswith('cold_start_') and result['p50_ms'] > budget_ms
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="许可证系统基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="数据集大小")
+    parser.add_argument('--iterations', type=int, default=1000, help="每项测试的调用次数")
+    parser.add_argument('--seed', type=int, default=42, help="数据集随机种子")
+    parser.add_argument('--output', default='benchmarks/results.json', help="结果JSON文件路径")
+    parser.add_argument('--baseline', help="基线结果JSON文件，用于回归比较")
+    parser.add_argument('--threshold', type=float, default=0.2, help="允许的吞吐量下降比例")
+    parser.add_argument('--work-dir', help="存放基准数据库的目录，默认使用临时目录")
+    parser.add_argument('--cold-start-iterations', type=int, default=10, help="冷启动测试的进程启动次数")
+    parser.add_argument('--cold-start-budget', type=float, default=COLD_START_BUDGET_MS,
+                        help="冷启动 p50 预算（毫秒），超出时以非零状态退出")
+    args = parser.parse_args(argv)
+
+    def report(name, result):
+        print(f"{name:40s} {result['ops_per_sec']:12.1f} ops/s  "
+              f"p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms")
+
+    results = run(args.sizes, args.iterations, args.seed, args.work_dir, progress=report,
+                  cold_start_iterations=args.cold_start_iterations)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.output}")
+
+    status = 0
+    over_budget = check_cold_start(results, args.cold_start_budget)
+    if over_budget:
+        print("冷启动超出预算：")
+        for line in over_budget:
+            print(f"- {line}")
+        status = 1
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"性能回退超过 {args.threshold:.0%}：")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+        print("未发现性能回退")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,23 +6,37 @@ ENCRYPTION_ALGORITHM = "AES-256-CBC"
 
 # 数据库配置
 DATABASE_PATH = "licenses.db"  # SQLite数据库路径
+INDEXED_USER_INFO_FIELDS = ("company", "email", "batch_id")  # 建立索引的 user_info 字段，供 search_licenses 使用
+FULL_TEXT_SEARCH_ENABLED = False  # 是否为 user_info 建立FTS5全文索引
 
 # 许可证配置
 DEFAULT_TRIAL_DAYS = 30  # 默认试用期天数
 DEFAULT_VALID_YEARS = 1  # 默认许可证有效期年数
 MAX_ACTIVATION_COUNT = 5  # 单个许可证最大激活次数
+RESERVOIR_SKUS = ()  # 预生成密钥的商品，(product_id, LicenseType 名称, 有效天数)，为空时不启用蓄水池
+RESERVOIR_TARGET_SIZE = 200  # 每种商品保留的预生成密钥数量
+RESERVOIR_LOW_WATER = 50  # 库存低于该值时唤醒后台线程补充
 
 # 日志配置
 LOG_LEVEL = "INFO"
 LOG_FILE = "license_system.log"
+METRICS_ENABLED = False  # 是否统计操作耗时和缓存命中率（src.metrics.METRICS），关闭时几乎没有开销
+AUDIT_RETENTION_MONTHS = 12  # 审计日志分区保留月数，超过后归档
+AGGREGATE_VALIDATIONS = False  # 是否将在线验证事件聚合为按天计数，而不是逐条写入审计日志
 
 # 在线验证配置
 ONLINE_VERIFICATION_ENABLED = True
 VERIFICATION_SERVER_URL = "https://license.yourcompany.com/verify"  # 在线验证服务器URL
+SERVER_HOST = "127.0.0.1"  # 验证服务监听地址（python -m src.server）
+SERVER_PORT = 8080  # 验证服务监听端口
+SERVER_WORKERS = 8  # 验证服务执行数据库操作的线程数
+SERVER_PROCESSES = 1  # 验证服务进程数，大于1时启用预派生模式（src.prefork），工作进程通过共享内存读取许可证快照和吊销集合
+SERVER_SNAPSHOT_INTERVAL = 60  # 预派生模式下重建共享快照的最短间隔（秒），吊销会立即发布
+SERVER_MAX_BATCH_SIZE = 100  # 批量验证接口单次最多验证的许可证数
 
 # API配置
 API_KEY = "your_api_key_here"  # 实际应用中应使用安全的API密钥
-API_RATE_LIMIT = 100  # 每分钟最大API请求次数
+API_RATE_LIMIT = 100  # 每分钟最大API请求次数，按客户端IP、API密钥和许可证密钥分别计数（RateLimiter）
 
 # 安全配置
 REQUIRE_ONLINE_VERIFICATION = False  # 是否强制要求在线验证
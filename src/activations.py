@@ -0,0 +1,85 @@
+import sqlite3
+from datetime import datetime
+
+
+class ActivationStore:
+    """许可证的设备激活记录
+
+    每个 (license_key, 机器指纹) 一行，由唯一索引保证不重复。
+    上限检查与插入在同一条语句中完成，并发激活也不会超过上限。
+    """
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """创建激活记录表"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS activations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                license_key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                validation_count INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_activations_license_key_fingerprint "
+            "ON activations (license_key, fingerprint)"
+        )
+
+    def register(self, conn: sqlite3.Connection, license_key: str, fingerprint: str,
+                 max_count: int, now: datetime) -> bool:
+        """登记一次设备激活，超过上限时返回False"""
+        seen = now.isoformat()
+
+        # 已激活的设备只需一次索引查找
+        cursor = conn.execute(
+            '''
+            UPDATE activations SET last_seen = ?, validation_count = validation_count + 1
+            WHERE license_key = ? AND fingerprint = ?
+            ''',
+            (seen, license_key, fingerprint)
+        )
+        if cursor.rowcount:
+            return True
+
+        # 新设备：上限检查与插入在同一条语句中原子完成；
+        # 并发登记同一设备时由唯一索引冲突转为更新
+        cursor = conn.execute(
+            '''
+            INSERT INTO activations (license_key, fingerprint, first_seen, last_seen)
+            SELECT ?, ?, ?, ?
+            WHERE (SELECT COUNT(*) FROM activations WHERE license_key = ?) < ?
+            ON CONFLICT (license_key, fingerprint)
+            DO UPDATE SET last_seen = excluded.last_seen, validation_count = validation_count + 1
+            ''',
+            (license_key, fingerprint, seen, seen, license_key, max_count)
+        )
+        return cursor.rowcount > 0
+
+    def list(self, conn: sqlite3.Connection, license_key: str) -> list[dict]:
+        """列出许可证已激活的设备"""
+        conn.row_factory = sqlite3.Row
+        cursor = conn.execute(
+            '''
+            SELECT fingerprint, first_seen, last_seen, validation_count FROM activations
+            WHERE license_key = ? ORDER BY id
+            ''',
+            (license_key,)
+        )
+        return [
+            {
+                'fingerprint': row['fingerprint'],
+                'first_seen': datetime.fromisoformat(row['first_seen']),
+                'last_seen': datetime.fromisoformat(row['last_seen']),
+                'validation_count': row['validation_count']
+            }
+            for row in cursor.fetchall()
+        ]
+
+    def remove(self, conn: sqlite3.Connection, license_key: str, fingerprint: str) -> bool:
+        """移除一台设备的激活记录"""
+        cursor = conn.execute(
+            "DELETE FROM activations WHERE license_key = ? AND fingerprint = ?",
+            (license_key, fingerprint)
+        )
+        return cursor.rowcount > 0
@@ -0,0 +1,239 @@
+from datetime import datetime, timedelta
+from .models import LicenseType, LicenseStatus
+from .sqlite_repository import SQLiteLicenseRepository
+from .sharded_repository import ShardedSQLiteRepository
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，只有列式分析需要
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+LICENSE_TYPES = tuple(LicenseType)
+LICENSE_STATUSES = tuple(LicenseStatus)
+GROUP_COLUMNS = ('product_id', 'license_type', 'status')
+AGGREGATES = ('count', 'sum', 'mean')
+
+
+def to_epoch(value: datetime) -> int:
+    """与数据库中的日期使用相同约定（不带时区）换算为秒数"""
+    return int((value - EPOCH).total_seconds())
+
+
+def _case(column: str, members) -> str:
+    """把枚举值映射为从0开始的整数编码"""
+    branches = ' '.join(f"WHEN '{member.value}' THEN {code}" for code, member in enumerate(members))
+    return f"CASE {column} {branches} ELSE -1 END"
+
+
+_COLUMNS_QUERY = f'''
+    SELECT product_id,
+           {_case('license_type', LICENSE_TYPES)},
+           {_case('status', LICENSE_STATUSES)},
+           CAST(strftime('%s', start_date) AS INTEGER),
+           CAST(strftime('%s', end_date) AS INTEGER),
+           activation_count
+    FROM licenses
+'''
+
+
+class LicenseColumns:
+    """许可证表的列式快照，用于报表统计
+
+    每个字段是一个 NumPy 数组：日期为秒数，类型和状态为整数编码，
+    产品ID按出现顺序字典编码。过滤返回布尔掩码，可在多次查询间复用。
+    """
+
+    def __init__(self, products: list, product_codes, license_types, statuses, start_dates, end_dates,
+                 activation_counts):
+        self.products = products
+        self.product_codes = product_codes
+        self.license_types = license_types
+        self.statuses = statuses
+        self.start_dates = start_dates
+        self.end_dates = end_dates
+        self.activation_counts = activation_counts
+        self._product_index = {product: code for code, product in enumerate(products)}
+
+    @classmethod
+    def load(cls, repository, chunk_size: int = 100000) -> 'LicenseColumns':
+        """分块读取许可证表
+
+        SQLite 和分片后端直接在SQL中完成日期和枚举的转换，
+        其他后端通过 iter_licenses 逐条读取。
+        """
+        if np is None:
+            raise ImportError("列式分析需要安装 numpy")
+
+        builder = _ColumnBuilder()
+        if isinstance(repository, ShardedSQLiteRepository):
+            for shard in repository.shards:
+                builder.add_query(shard, chunk_size)
+        elif isinstance(repository, SQLiteLicenseRepository):
+            builder.add_query(repository, chunk_size)
+        else:
+            builder.add_licenses(repository.iter_licenses(chunk_size), chunk_size)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.end_dates)
+
+    def filter(self, product_id: str = None, license_type: LicenseType = None, status: LicenseStatus = None,
+               end_after: datetime = None, end_before: datetime = None, mask=None):
+        """按条件返回布尔掩码；end_after / end_before 为到期时间的左闭右开区间"""
+        result = np.ones(len(self), dtype=bool) if mask is None else mask.copy()
+        if product_id is not None:
+            if product_id not in self._product_index:
+                result[:] = False
+            else:
+                result &= self.product_codes == self._product_index[product_id]
+        if license_type is not None:
+            result &= self.license_types == LICENSE_TYPES.index(license_type)
+        if status is not None:
+            result &= self.statuses == LICENSE_STATUSES.index(status)
+        if end_after is not None:
+            result &= self.end_dates >= to_epoch(end_after)
+        if end_before is not None:
+            result &= self.end_dates < to_epoch(end_before)
+        return result
+
+    def count(self, mask=None) -> int:
+        return len(self) if mask is None else int(np.count_nonzero(mask))
+
+    def expiring_by_period(self, start: datetime, periods: int = 12, period: timedelta = timedelta(weeks=1),
+                           mask=None) -> list[int]:
+        """从 start 开始每个周期内到期的数量，例如未来12周每周到期的许可证数"""
+        end_dates = self.end_dates if mask is None else self.end_dates[mask]
+        offsets = end_dates - to_epoch(start)
+        offsets = offsets[(offsets >= 0) & (offsets < periods * int(period.total_seconds()))]
+        buckets = offsets // int(period.total_seconds())
+        return np.bincount(buckets, minlength=periods).tolist()
+
+    def histogram(self, column: str, bins, mask=None, by: str = None):
+        """列的直方图，返回 (各区间数量, 区间边界)；by 不为空时按该列分组返回字典"""
+        values = self._column(column)
+        if by is None:
+            counts, edges = np.histogram(values if mask is None else values[mask], bins=bins)
+            return counts.tolist(), edges.tolist()
+
+        keys = self._column(by)
+        result = {}
+        for code in np.unique(keys if mask is None else keys[mask]):
+            selected = keys == code if mask is None else mask & (keys == code)
+            counts, edges = np.histogram(values[selected], bins=bins)
+            result[self._decode(by, code)] = (counts.tolist(), edges.tolist())
+        return result
+
+    def group_by(self, by: str, value: str = None, agg: str = 'count', mask=None) -> dict:
+        """按产品、类型或状态分组聚合，agg 可选 count、sum、mean"""
+        if by not in GROUP_COLUMNS:
+            raise ValueError(f"不支持的分组列: {by}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"不支持的聚合方式: {agg}")
+
+        keys = self._column(by)
+        if mask is not None:
+            keys = keys[mask]
+        size = len(self.products) if by == 'product_id' else len(LICENSE_TYPES if by == 'license_type' else LICENSE_STATUSES)
+        counts = np.bincount(keys, minlength=size)
+        if agg == 'count':
+            totals = counts
+        else:
+            values = self._column(value)
+            if mask is not None:
+                values = values[mask]
+            totals = np.bincount(keys, weights=values, minlength=size)
+            if agg == 'sum':
+                totals = totals.astype(np.int64)
+            else:
+                totals = np.divide(totals, counts, out=np.zeros(size), where=counts > 0)
+        return {
+            self._decode(by, code): totals[code].item()
+            for code in np.flatnonzero(counts)
+        }
+
+    def _column(self, name: str):
+        columns = {
+            'product_id': self.product_codes,
+            'license_type': self.license_types,
+            'status': self.statuses,
+            'start_date': self.start_dates,
+            'end_date': self.end_dates,
+            'activation_count': self.activation_counts,
+        }
+        if name not in columns:
+            raise ValueError(f"未知的列: {name}")
+        return columns[name]
+
+    def _decode(self, column: str, code):
+        if column == 'product_id':
+            return self.products[code]
+        if column == 'license_type':
+            return LICENSE_TYPES[code]
+        if column == 'status':
+            return LICENSE_STATUSES[code]
+        return code.item()
+
+
+class _ColumnBuilder:
+    """逐块收集列数据，最后拼接为连续数组"""
+
+    def __init__(self):
+        self.products = {}
+        self.product_chunks = []
+        self.numeric_chunks = []
+
+    def add_query(self, repository: SQLiteLicenseRepository, chunk_size: int):
+        with repository.connection() as conn:
+            cursor = conn.cursor()
+            # 直接返回元组，跳过 sqlite3.Row 的构造
+            cursor.row_factory = None
+            cursor.execute(_COLUMNS_QUERY)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                self._add_rows(rows)
+
+    def add_licenses(self, licenses, chunk_size: int):
+        rows = []
+        for license in licenses:
+            rows.append((
+                license.product_id,
+                LICENSE_TYPES.index(license.license_type),
+                LICENSE_STATUSES.index(license.status),
+                to_epoch(license.start_date),
+                to_epoch(license.end_date),
+                license.activation_count,
+            ))
+            if len(rows) >= chunk_size:
+                self._add_rows(rows)
+                rows = []
+        if rows:
+            self._add_rows(rows)
+
+    def _add_rows(self, rows: list):
+        products = self.products
+        product_ids, *numeric = zip(*rows)
+        self.product_chunks.append(np.fromiter(
+            (products.setdefault(product_id, len(products)) for product_id in product_ids),
+            dtype=np.int32, count=len(rows)
+        ))
+        self.numeric_chunks.append(np.array(numeric, dtype=np.int64).T)
+
+    def build(self) -> LicenseColumns:
+        if self.numeric_chunks:
+            numeric = np.concatenate(self.numeric_chunks)
+            product_codes = np.concatenate(self.product_chunks)
+        else:
+            numeric = np.empty((0, 5), dtype=np.int64)
+            product_codes = np.empty(0, dtype=np.int32)
+        return LicenseColumns(
+            products=list(self.products),
+            product_codes=product_codes,
+            license_types=numeric[:, 0].astype(np.int8),
+            statuses=numeric[:, 1].astype(np.int8),
+            start_dates=np.ascontiguousarray(numeric[:, 2]),
+            end_dates=np.ascontiguousarray(numeric[:, 3]),
+            activation_counts=np.ascontiguousarray(numeric[:, 4]),
+        )
@@ -0,0 +1,226 @@
+import os
+import gzip
+import json
+import sqlite3
+from datetime import datetime
+from .models import AuditLog
+
+PARTITION_PREFIX = "audit_logs_"
+LEGACY_TABLE = "audit_logs"
+
+
+def partition_name(timestamp: datetime) -> str:
+    """按月份计算审计日志分区表名，例如 audit_logs_202610"""
+    return f"{PARTITION_PREFIX}{timestamp.strftime('%Y%m')}"
+
+
+def row_to_audit_log(row) -> AuditLog:
+    """将数据库行转换为审计日志对象"""
+    data = dict(row)
+    data['details'] = json.loads(data['details']) if data['details'] else {}
+    return AuditLog.from_dict(data)
+
+
+def _month_index(month: str) -> int:
+    """将 YYYYMM 转换为可比较的月份序号"""
+    return int(month[:4]) * 12 + int(month[4:6]) - 1
+
+
+class AuditLogStore:
+    """按月分区的审计日志存储
+
+    每个自然月一张 audit_logs_YYYYMM 表，查询只访问时间范围内的分区；
+    超过保留期的分区可归档为 gzip 压缩的 JSONL 文件后删除。
+    """
+
+    def __init__(self, retention_months: int = None):
+        self.retention_months = retention_months
+        self._known_partitions = set()
+
+    def load_partitions(self, conn: sqlite3.Connection):
+        """读取已存在的月份分区"""
+        self._known_partitions = set(self.list_partitions(conn))
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """加载已有分区，升级分区索引，并将旧版单表审计日志迁移到分区表"""
+        self.load_partitions(conn)
+        for table in self._known_partitions:
+            self._create_history_index(conn, table)
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_TABLE,))
+        if cursor.fetchone() is None:
+            return
+
+        cursor.execute(f"SELECT DISTINCT substr(timestamp, 1, 7) FROM {LEGACY_TABLE}")
+        for (month,) in cursor.fetchall():
+            table = self._ensure_partition(conn, datetime.strptime(month, '%Y-%m'))
+            cursor.execute(
+                f'''
+                INSERT INTO {table} (action, license_key, user_id, details, timestamp)
+                SELECT action, license_key, user_id, details, timestamp FROM {LEGACY_TABLE}
+                WHERE substr(timestamp, 1, 7) = ? ORDER BY id
+                ''',
+                (month,)
+            )
+        cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    def insert(self, conn: sqlite3.Connection, log: AuditLog):
+        """写入一条审计日志到对应月份的分区"""
+        params = (
+            log.action,
+            log.license_key,
+            log.user_id,
+            json.dumps(log.details),
+            log.timestamp.isoformat()
+        )
+        table = self._ensure_partition(conn, log.timestamp)
+        try:
+            conn.execute(
+                f"INSERT INTO {table} (action, license_key, user_id, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+                params
+            )
+        except sqlite3.OperationalError:
+            # 分区可能已被其他进程归档删除，重新创建后重试
+            self._known_partitions.discard(table)
+            table = self._ensure_partition(conn, log.timestamp)
+            conn.execute(
+                f"INSERT INTO {table} (action, license_key, user_id, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+                params
+            )
+
+    def list_partitions(self, conn: sqlite3.Connection, since: datetime = None, until: datetime = None) -> list[str]:
+        """列出与时间范围有交集的分区表，按月份升序排列"""
+        cursor = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (PARTITION_PREFIX + '[0-9][0-9][0-9][0-9][0-9][0-9]',)
+        )
+        partitions = sorted(row[0] for row in cursor.fetchall())
+        if since:
+            partitions = [name for name in partitions if name >= partition_name(since)]
+        if until:
+            partitions = [name for name in partitions if name <= partition_name(until)]
+        return partitions
+
+    def iter_history(self, conn: sqlite3.Connection, license_key: str, since: datetime = None,
+                     until: datetime = None, actions: list[str] = None, limit: int = None,
+                     cursor: str = None, batch_size: int = 500):
+        """按时间倒序逐条产出许可证的审计日志，只访问时间范围内的分区
+
+        每个分区的查询都由 (license_key, timestamp, ...) 覆盖索引按序返回，
+        游标条件 (timestamp, id) < (?, ?) 同样走索引范围扫描，无需排序也无需回表。
+        """
+        after = None
+        if cursor:
+            cursor_timestamp, cursor_id = cursor.rsplit('|', 1)
+            after = (cursor_timestamp, int(cursor_id))
+            cursor_until = datetime.fromisoformat(cursor_timestamp)
+            until = min(until, cursor_until) if until else cursor_until
+
+        conn.row_factory = sqlite3.Row
+        remaining = limit
+        for table in reversed(self.list_partitions(conn, since, until)):
+            query = f"SELECT * FROM {table} WHERE license_key = ?"
+            params = [license_key]
+            if since:
+                query += " AND timestamp >= ?"
+                params.append(since.isoformat())
+            if until:
+                query += " AND timestamp <= ?"
+                params.append(until.isoformat())
+            if after:
+                query += " AND (timestamp, id) < (?, ?)"
+                params.extend(after)
+            if actions:
+                query += f" AND action IN ({', '.join('?' for _ in actions)})"
+                params.extend(actions)
+            query += " ORDER BY timestamp DESC, id DESC"
+            if remaining is not None:
+                query += " LIMIT ?"
+                params.append(remaining)
+
+            rows_cursor = conn.execute(query, params)
+            while True:
+                rows = rows_cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row_to_audit_log(row)
+                if remaining is not None:
+                    remaining -= len(rows)
+            if remaining is not None and remaining <= 0:
+                return
+
+    def expired_partitions(self, conn: sqlite3.Connection, now: datetime = None) -> list[str]:
+        """返回超过保留期的分区表"""
+        if self.retention_months is None:
+            return []
+        now = now or datetime.now()
+        oldest_kept = _month_index(now.strftime('%Y%m')) - self.retention_months + 1
+        return [
+            name for name in self.list_partitions(conn)
+            if _month_index(name[len(PARTITION_PREFIX):]) < oldest_kept
+        ]
+
+    def archive_expired_partitions(self, conn: sqlite3.Connection, archive_dir: str,
+                                   now: datetime = None) -> list[str]:
+        """将过期分区归档为 gzip 压缩的 JSONL 文件并删除分区表，返回归档文件路径"""
+        os.makedirs(archive_dir, exist_ok=True)
+        archived = []
+        for table in self.expired_partitions(conn, now):
+            path = os.path.join(archive_dir, f"{table}.jsonl.gz")
+            tmp_path = path + ".tmp"
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    for row in rows:
+                        f.write(json.dumps(row_to_audit_log(row).to_dict(), ensure_ascii=False))
+                        f.write('\n')
+            # 文件完整写入后再替换并删除分区，避免中断时丢失数据
+            os.replace(tmp_path, path)
+            conn.execute(f"DROP TABLE {table}")
+            conn.commit()
+            self._known_partitions.discard(table)
+            archived.append(path)
+        return archived
+
+    @staticmethod
+    def read_archive(path: str) -> list[AuditLog]:
+        """读取归档文件中的审计日志"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [AuditLog.from_dict(json.loads(line)) for line in f if line.strip()]
+
+    def _ensure_partition(self, conn: sqlite3.Connection, timestamp: datetime) -> str:
+        """确保分区表及其索引存在"""
+        table = partition_name(timestamp)
+        if table not in self._known_partitions:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action TEXT NOT NULL,
+                    license_key TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    details TEXT,
+                    timestamp TEXT NOT NULL
+                )
+            ''')
+            self._create_history_index(conn, table)
+            self._known_partitions.add(table)
+        return table
+
+    @staticmethod
+    def _create_history_index(conn: sqlite3.Connection, table: str):
+        """创建使用历史查询的覆盖索引
+
+        索引包含查询返回的全部列，按许可证读取历史时只访问索引、不回表；
+        id 紧跟 timestamp，ORDER BY timestamp DESC, id DESC 仍按索引顺序返回。
+        代价是 details 在索引中多存一份。旧版只有 (license_key, timestamp) 的索引随之删除。
+        """
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_history "
+            f"ON {table} (license_key, timestamp, id, action, user_id, details)"
+        )
+        conn.execute(f"DROP INDEX IF EXISTS idx_{table}_license_key_timestamp")
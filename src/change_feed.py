@@ -0,0 +1,65 @@
+import sqlite3
+from datetime import datetime
+from .models import LicenseStatus
+
+# 变化时写入变更日志的许可证字段；使用次数、最近使用时间等统计字段不计入
+TRACKED_FIELDS = ('license_type', 'start_date', 'end_date', 'product_id', 'user_info', 'status')
+
+
+def change_entry(seq: int, license_key: str, operation: str, status: str, end_date: str,
+                 changed_at: str) -> dict:
+    """变更日志条目"""
+    return {
+        'seq': seq,
+        'license_key': license_key,
+        'operation': operation,
+        'status': LicenseStatus(status),
+        'end_date': datetime.fromisoformat(end_date),
+        'changed_at': datetime.fromisoformat(changed_at)
+    }
+
+
+class ChangeFeedStore:
+    """许可证变更日志
+
+    由 licenses 表上的触发器写入，与引起变化的语句处于同一事务，
+    序号单调递增且不会复用。下游缓存记住最后处理的序号，
+    之后只需读取更大的序号即可增量同步。
+    """
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """创建变更日志表及写入触发器"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS license_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                license_key TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                status TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                changed_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS license_changes_ai AFTER INSERT ON licenses BEGIN
+                INSERT INTO license_changes (license_key, operation, status, end_date, changed_at)
+                VALUES (new.license_key, 'create', new.status, new.end_date, new.updated_at);
+            END
+        ''')
+        changed = ' OR '.join(f"old.{field} IS NOT new.{field}" for field in TRACKED_FIELDS)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS license_changes_au AFTER UPDATE ON licenses WHEN {changed} BEGIN
+                INSERT INTO license_changes (license_key, operation, status, end_date, changed_at)
+                VALUES (new.license_key, 'update', new.status, new.end_date, new.updated_at);
+            END
+        ''')
+
+    def since(self, conn: sqlite3.Connection, seq: int = 0, limit: int = 1000) -> list[dict]:
+        """按序号升序返回大于 seq 的变更"""
+        rows = conn.execute(
+            '''
+            SELECT seq, license_key, operation, status, end_date, changed_at
+            FROM license_changes WHERE seq > ? ORDER BY seq LIMIT ?
+            ''',
+            (seq, limit)
+        ).fetchall()
+        return [change_entry(*row) for row in rows]
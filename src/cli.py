@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import itertools
+from datetime import datetime
+from .models import LicenseType, LicenseStatus
+from .license_manager import LicenseManager
+from .license_generator import LicenseGenerator
+from .parallel import parallel_map
+
+
+class Progress:
+    """在标准错误输出上显示已处理数量和吞吐量"""
+
+    def __init__(self, label: str, total: int = None, stream=None, interval: float = 0.5,
+                 initial: int = 0, clock=time.monotonic):
+        self.label = label
+        self.total = total
+        # 断点续传时只按本次处理的数量计算吞吐量
+        self.initial = initial
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self._clock = clock
+        self._started = clock()
+        self._last_report = None
+
+    def update(self, done: int):
+        """报告当前已处理的数量，按 interval 限制刷新频率"""
+        now = self._clock()
+        if self._last_report is not None and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        total = f"/{self.total}" if self.total is not None else ""
+        self.stream.write(f"\r{self.label}: {done}{total}  {self._rate(done, now):.1f} 条/秒")
+        self.stream.flush()
+
+    def finish(self, done: int):
+        now = self._clock()
+        elapsed = now - self._started
+        self.stream.write(f"\r{self.label}: {done} 条，用时 {elapsed:.1f} 秒，{self._rate(done, now):.1f} 条/秒\n")
+        self.stream.flush()
+
+    def _rate(self, done: int, now: float) -> float:
+        elapsed = now - self._started
+        return (done - self.initial) / elapsed if elapsed > 0 else 0.0
+
+
+class Checkpoint:
+    """断点文件，记录任务已完成的数量；任务完成后删除
+
+    断点文件同时保存任务参数，参数不一致时拒绝继续，避免用错误的断点跳过数据。
+    state 保存任务首次运行时确定、继续时必须沿用的值（例如生成许可证的起止时间）。
+    """
+
+    def __init__(self, path: str, task: dict):
+        self.path = path
+        self.task = task
+        self.state = {}
+
+    def load(self) -> int:
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('task') != self.task:
+            raise ValueError(f"断点文件 {self.path} 与当前任务不匹配")
+        self.state = data.get('state', {})
+        return data['done']
+
+    def save(self, done: int):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'task': self.task, 'state': self.state, 'done': done,
+                       'updated_at': datetime.now().isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+_generators = {}
+
+
+def _generate_chunk(spec: tuple) -> list:
+    """工作进程中生成一批许可证，batch_id 在整个任务内连续编号"""
+    secret_key, first_id, count, license_type, start_date, end_date, product_id, user_info = spec
+    generator = _generators.get(secret_key)
+    if generator is None:
+        generator = _generators[secret_key] = LicenseGenerator(secret_key)
+    licenses = []
+    for batch_id in range(first_id, first_id + count):
+        licenses.append(generator.generate_license_key(
+            license_type=LicenseType[license_type],
+            start_date=start_date,
+            end_date=end_date,
+            product_id=product_id,
+            user_info=dict(user_info, batch_id=batch_id)
+        ))
+    return licenses
+
+
+def _add_years(value: datetime, years: int) -> datetime:
+    try:
+        return value.replace(year=value.year + years)
+    except ValueError:
+        # 2月29日顺延到2月28日
+        return value.replace(year=value.year + years, day=28)
+
+
+def generate(manager: LicenseManager, secret_key: str, count: int, license_type: str, valid_years: int,
+             product_id: str, user_info: dict = None, output: str = None, workers: int = 1,
+             chunk_size: int = 1000, checkpoint: Checkpoint = None, progress: Progress = None) -> int:
+    """多进程生成许可证并分批写入数据库，返回本次生成的数量
+
+    加密在工作进程中完成，写入由主进程按批提交（SQLite 同一时间只允许一个写事务）。
+    output 为许可证密钥文件，每行一个密钥，可直接用于 revoke 命令。
+    起止时间在首次运行时确定并写入断点，继续生成的许可证与之前的保持一致。
+    """
+    done = checkpoint.load() if checkpoint else 0
+    start_date = datetime.now()
+    end_date = _add_years(start_date, valid_years)
+    if checkpoint:
+        checkpoint.state.setdefault('start_date', start_date.isoformat())
+        checkpoint.state.setdefault('end_date', end_date.isoformat())
+        start_date = datetime.fromisoformat(checkpoint.state['start_date'])
+        end_date = datetime.fromisoformat(checkpoint.state['end_date'])
+    specs = (
+        (secret_key, first + 1, min(chunk_size, count - first), license_type, start_date, end_date,
+         product_id, user_info or {})
+        for first in range(done, count, chunk_size)
+    )
+
+    generated = 0
+    keys_file = open(output, 'a' if done else 'w', encoding='utf-8') if output else None
+    try:
+        for licenses in parallel_map(_generate_chunk, specs, workers):
+            manager.repository.save_licenses(licenses)
+            manager.add_audit_log(
+                action="批量创建许可证",
+                license_key="batch",
+                user_id="system",
+                details={"count": len(licenses), "license_type": LicenseType[license_type].value,
+                         "product_id": product_id}
+            )
+            if keys_file:
+                keys_file.writelines(f"{license.license_key}\n" for license in licenses)
+                keys_file.flush()
+            generated += len(licenses)
+            done += len(licenses)
+            if checkpoint:
+                checkpoint.save(done)
+            if progress:
+                progress.update(done)
+    finally:
+        if keys_file:
+            keys_file.close()
+    return generated
+
+
+def read_keys(path: str):
+    """逐行读取许可证密钥，忽略空行和 # 开头的注释"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            key = line.strip()
+            if key and not key.startswith('#'):
+                yield key
+
+
+def revoke_from_file(manager: LicenseManager, path: str, chunk_size: int = 1000,
+                     checkpoint: Checkpoint = None, progress: Progress = None) -> dict:
+    """吊销文件中列出的许可证，返回吊销成功和未找到（或吊销失败）的数量"""
+    done = checkpoint.load() if checkpoint else 0
+    keys = itertools.islice(read_keys(path), done, None)
+    result = {'revoked': 0, 'failed': 0}
+    while True:
+        chunk = list(itertools.islice(keys, chunk_size))
+        if not chunk:
+            break
+        for key in chunk:
+            result['revoked' if manager.revoke_license(key) else 'failed'] += 1
+        done += len(chunk)
+        if checkpoint:
+            checkpoint.save(done)
+        if progress:
+            progress.update(done)
+    return result
+
+
+def _parse_json(text: str) -> dict:
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"无效的JSON: {e}")
+    if not isinstance(value, dict):
+        raise argparse.ArgumentTypeError("需要JSON对象")
+    return value
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from config import settings
+
+    parser = argparse.ArgumentParser(prog="python -m src", description="许可证批量运维工具")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="SQLite数据库路径")
+    parser.add_argument('--secret-key', default=settings.SECRET_KEY, help="许可证加密密钥")
+    parser.add_argument('--quiet', action='store_true', help="不显示进度")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('generate', help="批量生成许可证")
+    command.add_argument('--count', type=int, required=True, help="生成数量")
+    command.add_argument('--type', default='STANDARD', choices=[t.name for t in LicenseType], help="许可证类型")
+    command.add_argument('--years', type=int, default=settings.DEFAULT_VALID_YEARS, help="有效期年数")
+    command.add_argument('--product', required=True, help="产品ID")
+    command.add_argument('--user-info', type=_parse_json, default={}, help="user_info 模板（JSON对象）")
+    command.add_argument('--output', help="写出许可证密钥的文件，每行一个")
+    command.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="生成密钥的进程数")
+    command.add_argument('--chunk-size', type=int, default=1000, help="每批写入的数量")
+    command.add_argument('--checkpoint', help="断点文件，中断后使用相同参数继续")
+
+    command = commands.add_parser('import', help="从 JSONL / CSV 文件导入许可证")
+    command.add_argument('path', help="导入文件（.gz 为gzip压缩）")
+    command.add_argument('--format', choices=('jsonl', 'csv'), help="文件格式，默认按扩展名判断")
+    command.add_argument('--on-conflict', default='error', choices=('error', 'skip', 'replace'),
+                         help="密钥已存在时的处理方式")
+    command.add_argument('--chunk-size', type=int, default=1000, help="每批写入的数量")
+    command.add_argument('--checkpoint', help="断点文件，中断后使用相同参数继续")
+
+    command = commands.add_parser('export', help="导出许可证到 JSONL / CSV 文件")
+    command.add_argument('path', help="导出文件（.gz 为gzip压缩）")
+    command.add_argument('--format', choices=('jsonl', 'csv'), help="文件格式，默认按扩展名判断")
+    command.add_argument('--product', help="只导出指定产品")
+    command.add_argument('--status', choices=[s.name for s in LicenseStatus], help="只导出指定状态")
+
+    command = commands.add_parser('revoke', help="吊销文件中列出的许可证（每行一个密钥）")
+    command.add_argument('path', help="许可证密钥文件")
+    command.add_argument('--chunk-size', type=int, default=1000, help="每批处理的数量")
+    command.add_argument('--checkpoint', help="断点文件，中断后使用相同参数继续")
+
+    command = commands.add_parser('sweep-expired', help="将已到期的许可证标记为过期")
+    command.add_argument('--now', type=datetime.fromisoformat, help="以该时间判断是否到期，默认当前时间")
+    command.add_argument('--chunk-size', type=int, default=500, help="每个事务更新的数量")
+
+    commands.add_parser('stats', help="显示许可证统计信息")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    manager = LicenseManager.from_settings(start_reservoir=False, db_path=args.db, secret_key=args.secret_key)
+    stream = open(os.devnull, 'w') if args.quiet else sys.stderr
+    checkpoint = None
+    try:
+        if args.command == 'generate':
+            checkpoint = Checkpoint(args.checkpoint, {
+                'command': 'generate', 'count': args.count, 'type': args.type, 'years': args.years,
+                'product': args.product, 'user_info': args.user_info, 'output': args.output,
+            })
+            progress = Progress("生成", args.count, stream, initial=checkpoint.load())
+            generated = generate(manager, args.secret_key, args.count, args.type, args.years, args.product,
+                                 args.user_info, args.output, args.workers, args.chunk_size, checkpoint, progress)
+            progress.finish(progress.initial + generated)
+            print(f"已生成 {generated} 个许可证")
+
+        elif args.command == 'import':
+            checkpoint = Checkpoint(args.checkpoint, {
+                'command': 'import', 'path': os.path.abspath(args.path), 'on_conflict': args.on_conflict,
+            })
+            progress = Progress("导入", stream=stream)
+            imported = manager.import_licenses(args.path, args.format, args.on_conflict, progress=progress.update,
+                                               chunk_size=args.chunk_size, skip=checkpoint.load(),
+                                               checkpoint=checkpoint.save)
+            progress.finish(imported)
+            print(f"已导入 {imported} 个许可证")
+
+        elif args.command == 'export':
+            progress = Progress("导出", stream=stream)
+            status = LicenseStatus[args.status] if args.status else None
+            exported = manager.export_licenses(args.path, args.format, product_id=args.product, status=status,
+                                               progress=progress.update)
+            progress.finish(exported)
+            print(f"已导出 {exported} 个许可证到 {args.path}")
+
+        elif args.command == 'revoke':
+            checkpoint = Checkpoint(args.checkpoint, {'command': 'revoke', 'path': os.path.abspath(args.path)})
+            progress = Progress("吊销", stream=stream, initial=checkpoint.load())
+            result = revoke_from_file(manager, args.path, args.chunk_size, checkpoint, progress)
+            progress.finish(progress.initial + result['revoked'] + result['failed'])
+            print(f"已吊销 {result['revoked']} 个许可证，{result['failed']} 个未找到或吊销失败")
+
+        elif args.command == 'sweep-expired':
+            swept = manager.sweep_expired_licenses(args.now, chunk_size=args.chunk_size)
+            print(f"已将 {swept} 个许可证标记为过期")
+
+        elif args.command == 'stats':
+            print(json.dumps(manager.get_statistics(), indent=2, ensure_ascii=False))
+
+        if checkpoint:
+            checkpoint.clear()
+        return 0
+    except KeyboardInterrupt:
+        stream.write("\n")
+        if checkpoint and checkpoint.path:
+            print(f"已中断，使用相同参数和 --checkpoint {checkpoint.path} 可继续", file=sys.stderr)
+        else:
+            print("已中断", file=sys.stderr)
+        return 130
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    except sqlite3.IntegrityError as e:
+        # --on-conflict error 时遇到已存在的密钥，当前分块已回滚
+        print(f"错误: 许可证已存在 ({e})", file=sys.stderr)
+        return 1
+    finally:
+        manager.repository.close()
+        if args.quiet:
+            stream.close()
@@ -0,0 +1,65 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """每次读取都返回当前系统时间"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class CoarseClock:
+    """按 resolution 秒缓存的系统时间，用于批量和高吞吐的路径
+
+    读取时只比较单调时钟，超过 resolution 才重新获取系统时间；
+    返回值最多落后真实时间 resolution 秒。
+    """
+
+    def __init__(self, resolution: float = 1.0, source=datetime.now, monotonic=time.monotonic):
+        self.resolution = resolution
+        self._source = source
+        self._monotonic = monotonic
+        self._lock = threading.Lock()
+        self._now = source()
+        self._refresh_at = monotonic() + resolution
+
+    def now(self) -> datetime:
+        if self._monotonic() >= self._refresh_at:
+            with self._lock:
+                self._now = self._source()
+                self._refresh_at = self._monotonic() + self.resolution
+        return self._now
+
+
+class FakeClock:
+    """只在显式设置或推进时才变化的时钟，用于测试和流量重放
+
+    monotonic 和 sleep 可替代 time.monotonic / time.sleep 注入到以秒计时的组件。
+    """
+
+    def __init__(self, now: datetime = None):
+        self._now = now or datetime.now()
+        self._origin = self._now
+
+    def now(self) -> datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        """自创建以来经过的秒数"""
+        return (self._now - self._origin).total_seconds()
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def set(self, now: datetime):
+        self._now = now
+
+    def advance(self, seconds: float = 0, **kwargs) -> datetime:
+        """向前推进，参数与 timedelta 相同，返回推进后的时间"""
+        self._now += timedelta(seconds=seconds, **kwargs)
+        return self._now
+
+
+SYSTEM_CLOCK = SystemClock()
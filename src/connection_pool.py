@@ -0,0 +1,67 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .metrics import METRICS
+
+
+class ConnectionPool:
+    """SQLite 连接池
+
+    复用已打开的连接，避免每次操作都重新打开数据库文件。
+    空闲连接最多保留 size 个，并发超过时临时创建新连接，用完即关闭。
+    """
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 5.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接；发生异常时回滚未提交的事务"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            METRICS.record_cache('connection_pool', True)
+            return conn
+        except queue.Empty:
+            METRICS.record_cache('connection_pool', False)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            closed = self._closed
+        if closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
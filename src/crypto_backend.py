@@ -0,0 +1,21 @@
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def _load():
+    """首次加解密时才导入 cryptography，缩短不做加解密的进程的启动时间"""
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.backends import default_backend
+    return Cipher, algorithms, modes, padding, default_backend
+
+
+def aes_cbc(key: bytes, iv: bytes):
+    """返回 AES-CBC 密码器，可重复调用 encryptor() / decryptor()"""
+    Cipher, algorithms, modes, _, default_backend = _load()
+    return Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+
+
+def pkcs7():
+    """返回 128 位分组的 PKCS7 填充"""
+    return _load()[3].PKCS7(128)
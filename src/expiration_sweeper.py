@@ -0,0 +1,94 @@
+import heapq
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ExpirationSweeper:
+    """后台过期清理调度器
+
+    使用最小堆保存下一次到期时间，到期后调用管理器的批量清理，
+    再通过 end_date 索引查询下一个到期时间，避免周期性全表扫描。
+    """
+
+    def __init__(self, manager, max_interval: float = 3600, chunk_size: int = 500):
+        self.manager = manager
+        self.max_interval = max_interval
+        self.chunk_size = chunk_size
+        self.sweep_count = 0
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动调度线程"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._reload_next_due()
+        self._thread = threading.Thread(target=self._run, name="license-expiration-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """停止调度线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def schedule(self, due: datetime):
+        """登记一个到期时间，只有早于当前堆顶时才需要唤醒调度线程"""
+        with self._lock:
+            if self._heap and due >= self._heap[0]:
+                return
+            heapq.heappush(self._heap, due)
+        self._wakeup.set()
+
+    def next_due(self) -> datetime:
+        """返回下一次计划清理的时间"""
+        with self._lock:
+            return self._heap[0] if self._heap else None
+
+    def run_pending(self, now: datetime = None) -> int:
+        """执行所有已到期的清理，返回标记为过期的许可证数量"""
+        now = now or self.manager.clock.now()
+        with self._lock:
+            if not self._heap or self._heap[0] > now:
+                return 0
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+
+        count = self.manager.sweep_expired_licenses(now=now, chunk_size=self.chunk_size)
+        self.sweep_count += 1
+        self._reload_next_due()
+        return count
+
+    def _reload_next_due(self):
+        """从数据库索引中读取下一个到期时间"""
+        due = self.manager.get_next_expiration()
+        if due is not None:
+            self.schedule(due)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            due = self.next_due()
+            timeout = self.max_interval
+            if due is not None:
+                timeout = min(max((due - self.manager.clock.now()).total_seconds(), 0), self.max_interval)
+
+            if self._wakeup.wait(timeout) or self._stopped.is_set():
+                continue
+
+            try:
+                if self.run_pending() == 0 and self.next_due() is None:
+                    # 长时间无到期任务时重新读取，感知其他进程写入的许可证
+                    self._reload_next_due()
+            except Exception:
+                # 清理失败不应终止调度线程，记录后在下一个周期重试
+                logger.exception("过期清理失败")
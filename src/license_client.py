@@ -0,0 +1,136 @@
+import os
+import hmac
+import json
+import time
+import random
+import hashlib
+import urllib.error
+import urllib.request
+from .license_validator import LicenseValidator, machine_fingerprint, is_transient_failure
+from .metrics import METRICS
+
+
+def remote_online_check(server_url: str, timeout: float = 5.0):
+    """返回调用验证服务 POST /validate 接口的在线检查函数
+
+    网络错误和服务端错误（包括429限流和503服务不可用）抛出 ConnectionError，
+    由客户端按离线宽限期处理。
+    """
+    url = server_url.rstrip('/') + '/validate'
+
+    def check(license_key: str, product_id: str, machine_info: dict = None) -> tuple[bool, str]:
+        body = json.dumps({
+            "license_key": license_key, "product_id": product_id, "machine_info": machine_info or {}
+        }).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise ConnectionError(f"验证服务器暂时不可用: HTTP {e.code}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ConnectionError(f"无法连接验证服务器: {e}")
+        return bool(result.get('valid')), result.get('message', '')
+
+    return check
+
+
+class LicenseClient:
+    """客户端许可证检查，带本地缓存和离线宽限期
+
+    每次启动先做离线验证；在线验证成功的结果连同下次检查时间写入
+    HMAC 签名的本地缓存文件，检查时间到期前不再访问服务器。
+    检查间隔带有随机抖动，避免大量客户端同时重新验证。
+    服务器不可达、限流或出错时，只要距离上次在线验证成功未超过宽限期仍视为有效，
+    不会删除缓存。
+    """
+
+    def __init__(self, validator: LicenseValidator, license_key: str, product_id: str, cache_path: str,
+                 machine_info: dict = None, online_check=None, revalidate_interval: float = 24 * 3600,
+                 grace_period: float = 7 * 24 * 3600, jitter: float = 0.1, clock=time.time, rng=random.random):
+        self.validator = validator
+        self.license_key = license_key
+        self.product_id = product_id
+        self.cache_path = cache_path
+        self.machine_info = machine_info or {}
+        self.online_check = online_check or validator.validate_license_online
+        self.revalidate_interval = revalidate_interval
+        self.grace_period = grace_period
+        self.jitter = jitter
+        self._clock = clock
+        self._rng = rng
+
+    def check(self) -> tuple[bool, str]:
+        """检查许可证，返回 (是否有效, 提示信息)"""
+        valid, message = self.validator.validate_license_offline(self.license_key, self.product_id)
+        if not valid:
+            return False, message
+
+        now = self._clock()
+        cache = self._load_cache()
+        fresh = cache is not None and now < cache['next_check_at']
+        METRICS.record_cache('client_validation', fresh)
+        if fresh:
+            return True, "许可证验证成功（本地缓存）"
+
+        try:
+            valid, message = self.online_check(self.license_key, self.product_id, self.machine_info)
+            if not valid and is_transient_failure(message):
+                # 直接使用验证器做在线检查时，限流和数据库错误同样按无法连接处理
+                raise ConnectionError(message)
+        except ConnectionError as e:
+            if cache is not None and now < cache['validated_at'] + self.grace_period:
+                return True, "无法连接验证服务器，许可证在离线宽限期内"
+            return False, f"无法连接验证服务器且已超出离线宽限期: {e}"
+
+        if valid:
+            self._save_cache(now)
+        else:
+            self.clear_cache()
+        return valid, message
+
+    def clear_cache(self):
+        """删除本地缓存，下次检查时强制在线验证"""
+        try:
+            os.remove(self.cache_path)
+        except FileNotFoundError:
+            pass
+
+    def _save_cache(self, now: float):
+        """写入签名的缓存文件，下次检查时间带随机抖动"""
+        spread = 1 + self.jitter * (2 * self._rng() - 1)
+        payload = {
+            'license_key': self.license_key,
+            'product_id': self.product_id,
+            'fingerprint': machine_fingerprint(self.machine_info),
+            'validated_at': now,
+            'next_check_at': now + self.revalidate_interval * spread
+        }
+        data = {'payload': payload, 'signature': self._sign(payload)}
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _load_cache(self) -> dict:
+        """读取缓存，文件缺失、被篡改或不属于当前许可证和机器时返回None"""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            payload = data['payload']
+            signature = data['signature']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(signature, str) or not isinstance(payload, dict):
+            return None
+
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        if (payload.get('license_key'), payload.get('product_id'), payload.get('fingerprint')) != (
+                self.license_key, self.product_id, machine_fingerprint(self.machine_info)):
+            return None
+        return payload
+
+    def _sign(self, payload: dict) -> str:
+        message = json.dumps(payload, sort_keys=True).encode('utf-8')
+        return hmac.new(self.validator.secret_key, message, hashlib.sha256).hexdigest()
@@ -2,18 +2,23 @@ import uuid
 import hashlib
 import base64
 from datetime import datetime, timedelta
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
 from .models import License, LicenseType, LicenseStatus
+from .metrics import timed
+from .crypto_backend import aes_cbc, pkcs7
+from .clock import SYSTEM_CLOCK
+
+# 许可证密钥使用的 base64 替换字符，与连字符分组和URL路径都不冲突
+KEY_ALTCHARS = b'._'
 
 
 class LicenseGenerator:
-    def __init__(self, secret_key: str):
+    def __init__(self, secret_key: str, clock=SYSTEM_CLOCK):
+        self.clock = clock
         # 确保密钥长度为32字节（AES-256需要）
         self.secret_key = hashlib.sha256(secret_key.encode()).digest()
         self.iv = bytes.fromhex('0123456789abcdef0123456789abcdef')  # 初始化向量（实际应用中应使用随机IV）
 
+    @timed('generator.generate_license_key')
     def generate_license_key(self, license_type: LicenseType, start_date: datetime, end_date: datetime, 
                            product_id: str, user_info: dict = None) -> License:
         # 生成唯一标识
@@ -35,14 +40,15 @@ class LicenseGenerator:
             start_date=start_date,
             end_date=end_date,
             product_id=product_id,
-            user_info=user_info
+            user_info=user_info,
+            created_at=self.clock.now()
         )
         
         return license
 
     def generate_trial_license(self, product_id: str, days: int = 30, user_info: dict = None) -> License:
         """生成试用版许可证"""
-        start_date = datetime.now()
+        start_date = self.clock.now()
         end_date = start_date + timedelta(days=days)
         return self.generate_license_key(
             license_type=LicenseType.TRIAL,
@@ -54,7 +60,7 @@ class LicenseGenerator:
 
     def generate_standard_license(self, product_id: str, valid_years: int = 1, user_info: dict = None) -> License:
         """生成正式版许可证"""
-        start_date = datetime.now()
+        start_date = self.clock.now()
         end_date = datetime(start_date.year + valid_years, start_date.month, start_date.day)
         return self.generate_license_key(
             license_type=LicenseType.STANDARD,
@@ -66,7 +72,7 @@ class LicenseGenerator:
 
     def generate_professional_license(self, product_id: str, valid_years: int = 1, user_info: dict = None) -> License:
         """生成专业版许可证"""
-        start_date = datetime.now()
+        start_date = self.clock.now()
         end_date = datetime(start_date.year + valid_years, start_date.month, start_date.day)
         return self.generate_license_key(
             license_type=LicenseType.PROFESSIONAL,
@@ -76,19 +82,21 @@ class LicenseGenerator:
             user_info=user_info
         )
 
+    @timed('generator.batch_generate_licenses')
     def batch_generate_licenses(self, count: int, license_type: LicenseType, valid_years: int, 
                                product_id: str, user_info_template: dict = None) -> list[License]:
         """批量生成许可证"""
         licenses = []
         user_info_template = user_info_template or {}
         
+        # 同一批许可证使用相同的有效期，只读取一次时钟
+        start_date = self.clock.now()
+        end_date = datetime(start_date.year + valid_years, start_date.month, start_date.day)
+        
         for i in range(count):
             user_info = user_info_template.copy()
             user_info['batch_id'] = i + 1
             
-            start_date = datetime.now()
-            end_date = datetime(start_date.year + valid_years, start_date.month, start_date.day)
-            
             license = self.generate_license_key(
                 license_type=license_type,
                 start_date=start_date,
@@ -100,31 +108,30 @@ class LicenseGenerator:
         
         return licenses
 
+    @timed('generator.encrypt_data')
     def _encrypt_data(self, data: str) -> bytes:
         # 填充数据
-        padder = padding.PKCS7(128).padder()
+        padder = pkcs7().padder()
         data_bytes = data.encode()
         padded_data = padder.update(data_bytes) + padder.finalize()
         
         # 创建密码器并加密
-        cipher = Cipher(algorithms.AES(self.secret_key), modes.CBC(self.iv), backend=default_backend())
+        cipher = aes_cbc(self.secret_key, self.iv)
         encryptor = cipher.encryptor()
         encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
         
         return encrypted_data
 
     def _format_license_key(self, encrypted_data: bytes) -> str:
-        # 将加密数据转换为base64编码
-        base64_data = base64.b64encode(encrypted_data).decode('utf-8')
-        
-        # 移除base64中的特殊字符
-        formatted = base64_data.replace('+', '').replace('/', '').replace('=', '')
+        """将完整密文编码为许可证密钥
+
+        密钥是密文的 base64 编码，以 `.` 和 `_` 代替 `+` 和 `/`（密钥可直接放在URL路径中），
+        去掉末尾的 `=` 填充，再按8个字符一组用连字符连接。密文不能截断或删改字符，
+        否则无法解密，因此密钥长度随许可证数据增长。
+        """
+        encoded = base64.b64encode(encrypted_data, altchars=KEY_ALTCHARS).decode('ascii').rstrip('=')
         
         # 按照8个字符一组进行分组，并添加连字符
-        chunks = [formatted[i:i+8] for i in range(0, len(formatted), 8)]
-        
-        # 确保许可证密钥长度适中
-        if len(chunks) > 5:
-            chunks = chunks[:5]
+        chunks = [encoded[i:i+8] for i in range(0, len(encoded), 8)]
         
-        return '-'.join(chunks)
\ No newline at end of file
+        return '-'.join(chunks)
@@ -0,0 +1,70 @@
+import io
+import csv
+import gzip
+import json
+from .models import License
+
+FORMATS = ('jsonl', 'csv')
+
+# CSV 列与 License.to_dict() 的键一致，user_info 以JSON文本存放
+CSV_FIELDS = (
+    'license_key', 'license_type', 'start_date', 'end_date', 'product_id', 'user_info',
+    'status', 'created_at', 'updated_at', 'activation_count', 'last_used'
+)
+
+
+def detect_format(path: str, format: str = None) -> str:
+    """根据参数或文件扩展名（可带 .gz）确定文件格式"""
+    if format is None:
+        name = path[:-3] if path.endswith('.gz') else path
+        format = name.rsplit('.', 1)[-1].lower()
+    if format not in FORMATS:
+        raise ValueError(f"不支持的文件格式: {format}")
+    return format
+
+
+def open_text(path: str, mode: str, compress: bool = None):
+    """打开文本文件，compress 为None时按 .gz 扩展名决定是否使用gzip"""
+    if compress is None:
+        compress = path.endswith('.gz')
+    if compress:
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def write_licenses(f: io.TextIOBase, licenses, format: str, progress=None, progress_every: int = 1000) -> int:
+    """逐条写出许可证，返回写出的数量"""
+    writer = None
+    if format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+    count = 0
+    for license in licenses:
+        data = license.to_dict()
+        if writer:
+            data['user_info'] = json.dumps(data['user_info'], ensure_ascii=False)
+            writer.writerow(data)
+        else:
+            f.write(json.dumps(data, ensure_ascii=False))
+            f.write('\n')
+        count += 1
+        if progress and count % progress_every == 0:
+            progress(count)
+    if progress and count % progress_every:
+        progress(count)
+    return count
+
+
+def read_licenses(f: io.TextIOBase, format: str):
+    """逐条读取许可证"""
+    if format == 'csv':
+        for row in csv.DictReader(f):
+            row['user_info'] = json.loads(row['user_info']) if row['user_info'] else {}
+            row['activation_count'] = int(row['activation_count'] or 0)
+            row['last_used'] = row['last_used'] or None
+            yield License.from_dict(row)
+    else:
+        for line in f:
+            if line.strip():
+                yield License.from_dict(json.loads(line))
@@ -1,69 +1,100 @@
-import sqlite3
-import json
-from datetime import datetime
+import itertools
+from collections import deque
+from datetime import datetime, timedelta
 from .models import License, LicenseType, LicenseStatus, AuditLog
 from .license_generator import LicenseGenerator
 from .license_validator import LicenseValidator
+from .expiration_sweeper import ExpirationSweeper
+from .license_reservoir import LicenseReservoir, issue_period
+from .renewals import encrypt_renewals, renewed_end_date, renewed_license
+from .parallel import parallel_map
+from .repository import LicenseRepository, SWEEPABLE_STATUSES
+from .sqlite_repository import SQLiteLicenseRepository
+from .user_info_index import DEFAULT_INDEXED_FIELDS
+from .license_snapshot import write_snapshot
+from .license_io import detect_format, open_text, read_licenses, write_licenses
+from .metrics import timed, METRICS
+from .clock import SYSTEM_CLOCK
 
 
 class LicenseManager:
-    def __init__(self, db_path: str = 'licenses.db', secret_key: str = 'default_secret_key'):
+    def __init__(self, db_path: str = 'licenses.db', secret_key: str = 'default_secret_key',
+                 audit_retention_months: int = None, aggregate_validations: bool = False,
+                 indexed_user_fields: tuple = DEFAULT_INDEXED_FIELDS, full_text_search: bool = False,
+                 max_activation_count: int = 5, machine_fingerprint_enabled: bool = True,
+                 repository: LicenseRepository = None, clock=SYSTEM_CLOCK):
         self.db_path = db_path
         self.secret_key = secret_key
-        self.generator = LicenseGenerator(secret_key)
-        self.validator = LicenseValidator(secret_key)
+        self.aggregate_validations = aggregate_validations
+        self.max_activation_count = max_activation_count
+        self.machine_fingerprint_enabled = machine_fingerprint_enabled
+        if repository is None:
+            repository = SQLiteLicenseRepository(
+                db_path,
+                audit_retention_months=audit_retention_months,
+                indexed_user_fields=indexed_user_fields,
+                full_text_search=full_text_search
+            )
+        self.repository = repository
+        self.clock = clock
+        self.generator = LicenseGenerator(secret_key, clock=clock)
+        self.validator = LicenseValidator(secret_key, clock=clock)
         self.validator.set_license_repository(self)
-        self._init_database()
+        self.expiration_sweeper = None
+        self.reservoir = None
 
-    def _init_database(self):
-        """初始化数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 创建许可证表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS licenses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    license_key TEXT UNIQUE NOT NULL,
-                    license_type TEXT NOT NULL,
-                    start_date TEXT NOT NULL,
-                    end_date TEXT NOT NULL,
-                    product_id TEXT NOT NULL,
-                    user_info TEXT,
-                    status TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    activation_count INTEGER DEFAULT 0,
-                    last_used TEXT
-                )
-            ''')
-            
-            # 创建审计日志表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    action TEXT NOT NULL,
-                    license_key TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    details TEXT,
-                    timestamp TEXT NOT NULL
-                )
-            ''')
-            
-            conn.commit()
+    @classmethod
+    def from_settings(cls, settings=None, start_reservoir: bool = True, **overrides) -> 'LicenseManager':
+        """按 config/settings.py 创建许可证管理器，overrides 中的参数优先
 
+        METRICS_ENABLED 为真时开启运行指标统计；RESERVOIR_SKUS 非空且 start_reservoir 为真时
+        启动预生成密钥的蓄水池，只验证不签发的进程（验证服务、批量运维工具）不需要蓄水池。
+        """
+        if settings is None:
+            from config import settings
+        options = {
+            'db_path': settings.DATABASE_PATH,
+            'secret_key': settings.SECRET_KEY,
+            'audit_retention_months': settings.AUDIT_RETENTION_MONTHS,
+            'aggregate_validations': settings.AGGREGATE_VALIDATIONS,
+            'indexed_user_fields': tuple(settings.INDEXED_USER_INFO_FIELDS),
+            'full_text_search': settings.FULL_TEXT_SEARCH_ENABLED,
+            'max_activation_count': settings.MAX_ACTIVATION_COUNT,
+            'machine_fingerprint_enabled': settings.MACHINE_FINGERPRINT_ENABLED,
+        }
+        options.update(overrides)
+        if settings.METRICS_ENABLED:
+            METRICS.enable()
+        manager = cls(**options)
+        if start_reservoir and settings.RESERVOIR_SKUS:
+            skus = [(product_id, LicenseType[license_type], valid_days)
+                    for product_id, license_type, valid_days in settings.RESERVOIR_SKUS]
+            manager.start_license_reservoir(skus, target_size=settings.RESERVOIR_TARGET_SIZE,
+                                            low_water=settings.RESERVOIR_LOW_WATER)
+        return manager
+
+    @timed('manager.create_license')
     def create_license(self, license_type: LicenseType, start_date: datetime, end_date: datetime, 
                       product_id: str, user_info: dict = None) -> License:
         """创建许可证"""
-        license = self.generator.generate_license_key(
-            license_type=license_type,
-            start_date=start_date,
-            end_date=end_date,
-            product_id=product_id,
-            user_info=user_info
-        )
+        license = None
+        if self.reservoir is not None:
+            license = self.reservoir.take(product_id, license_type, start_date, end_date)
+        if license is not None:
+            # 预生成的密钥只需绑定用户信息
+            license.user_info = user_info or {}
+            license.created_at = license.updated_at = self.clock.now()
+        else:
+            license = self.generator.generate_license_key(
+                license_type=license_type,
+                start_date=start_date,
+                end_date=end_date,
+                product_id=product_id,
+                user_info=user_info
+            )
         
-        self._save_license(license)
+        self.repository.save_license(license)
+        self._schedule_expiration(license.end_date)
         
         # 记录审计日志
         self.add_audit_log(
@@ -75,6 +106,13 @@ class LicenseManager:
         
         return license
 
+    def issue_license(self, product_id: str, license_type: LicenseType, valid_days: int,
+                      user_info: dict = None) -> License:
+        """按签发日零点起算的有效期创建许可证，启用蓄水池时可直接使用预生成的密钥"""
+        start_date, end_date = issue_period(self.clock.now(), valid_days)
+        return self.create_license(license_type, start_date, end_date, product_id, user_info)
+
+    @timed('manager.batch_create_licenses')
     def batch_create_licenses(self, count: int, license_type: LicenseType, valid_years: int, 
                              product_id: str, user_info_template: dict = None) -> list[License]:
         """批量创建许可证"""
@@ -86,11 +124,10 @@ class LicenseManager:
             user_info_template=user_info_template
         )
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for license in licenses:
-                self._save_license(license, conn, cursor)
-            conn.commit()
+        self.repository.save_licenses(licenses)
+        
+        if licenses:
+            self._schedule_expiration(min(license.end_date for license in licenses))
         
         # 记录审计日志
         self.add_audit_log(
@@ -104,57 +141,77 @@ class LicenseManager:
 
     def get_license_by_key(self, license_key: str) -> License:
         """根据许可证密钥获取许可证"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM licenses WHERE license_key = ?", (license_key,))
-            row = cursor.fetchone()
-            
-            if row:
-                return self._row_to_license(row)
-            return None
+        return self.repository.get_license_by_key(license_key)
 
+    @timed('manager.update_license')
     def update_license(self, license: License) -> bool:
         """更新许可证信息"""
-        license.updated_at = datetime.now()
+        license.updated_at = self.clock.now()
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute(
-                    '''
-                    UPDATE licenses 
-                    SET license_type = ?, start_date = ?, end_date = ?, product_id = ?, user_info = ?, 
-                        status = ?, updated_at = ?, activation_count = ?, last_used = ?
-                    WHERE license_key = ?
-                    ''',
-                    (
-                        license.license_type.value,
-                        license.start_date.isoformat(),
-                        license.end_date.isoformat(),
-                        license.product_id,
-                        json.dumps(license.user_info),
-                        license.status.value,
-                        license.updated_at.isoformat(),
-                        license.activation_count,
-                        license.last_used.isoformat() if license.last_used else None,
-                        license.license_key
-                    )
-                )
-                conn.commit()
-                
-                # 记录审计日志
-                self.add_audit_log(
-                    action="更新许可证",
-                    license_key=license.license_key,
-                    user_id="system",
-                    details={"status": license.status.value}
-                )
-                
-                return cursor.rowcount > 0
-            except Exception:
-                return False
+        try:
+            updated = self.repository.update_license(license)
+        except Exception:
+            return False
+        
+        if license.status in SWEEPABLE_STATUSES:
+            self._schedule_expiration(license.end_date)
+        
+        # 记录审计日志
+        self.add_audit_log(
+            action="更新许可证",
+            license_key=license.license_key,
+            user_id="system",
+            details={"status": license.status.value}
+        )
+        
+        return updated
+
+    def record_validation(self, license: License, machine_info: dict = None):
+        """记录一次成功的在线验证"""
+        machine_info = machine_info or {}
+        if not self.aggregate_validations:
+            self.update_license(license)
+            self.add_audit_log(
+                action="验证许可证",
+                license_key=license.license_key,
+                user_id=machine_info.get('user_id', 'unknown'),
+                details={"machine_info": machine_info}
+            )
+            return
+
+        # 聚合模式：只更新使用记录并累加按天计数，不写审计日志
+        self.repository.record_usage(license.license_key, machine_info, license.last_used or self.clock.now())
+
+    def register_activation(self, license_key: str, fingerprint: str) -> bool:
+        """登记设备激活，已达到激活设备数上限时返回False"""
+        if not self.machine_fingerprint_enabled or self.max_activation_count is None:
+            return True
+        
+        return self.repository.add_activation(license_key, fingerprint, self.max_activation_count, self.clock.now())
+
+    def get_activations(self, license_key: str) -> list[dict]:
+        """获取许可证已激活的设备列表"""
+        return self.repository.get_activations(license_key)
+
+    def deactivate_machine(self, license_key: str, fingerprint: str) -> bool:
+        """解除设备激活，释放一个激活名额"""
+        removed = self.repository.remove_activation(license_key, fingerprint)
+        
+        if removed:
+            self.add_audit_log(
+                action="解除设备激活",
+                license_key=license_key,
+                user_id="system",
+                details={"fingerprint": fingerprint}
+            )
+        return removed
+
+    def get_validation_counters(self, license_key: str, since: datetime = None,
+                                until: datetime = None) -> list[dict]:
+        """获取许可证按天、按机器聚合的验证次数"""
+        return self.repository.get_validation_counters(license_key, since, until)
 
+    @timed('manager.revoke_license')
     def revoke_license(self, license_key: str) -> bool:
         """吊销许可证"""
         license = self.get_license_by_key(license_key)
@@ -174,107 +231,279 @@ class LicenseManager:
             return result
         return False
 
+    @timed('manager.renew_licenses')
+    def renew_licenses(self, selector, extend_by: timedelta, chunk_size: int = 500, workers: int = 1,
+                       progress=None) -> dict:
+        """批量续期许可证，返回 {旧密钥: 新许可证}
+
+        selector 可以是许可证密钥的列表，也可以是筛选条件字典，例如
+        {"product_id": "PROD-A", "status": LicenseStatus.ACTIVE} 或 {"company": "示例公司"}
+        （后者通过 search_licenses 按 user_info 索引查找）。已吊销的许可证不会续期。
+
+        新的到期时间为 max(原到期时间, 当前时间) + extend_by；由于到期时间是密钥密文的一部分，
+        每个许可证都会签发新的密钥，旧密钥被吊销并记录由哪个新密钥取代（get_superseded_by）。
+        加密在 workers 个进程中执行，每 chunk_size 个许可证一个写事务；progress(count) 在每批提交后调用。
+        """
+        now = self.clock.now()
+        renewed = {}
+        selected = set()
+        new_keys = set()
+
+        def chunks():
+            chunk = []
+            for license in self._select_licenses(selector, chunk_size):
+                # 按条件遍历时会读到本次刚写入的新许可证，重复的密钥也只续期一次
+                if (license.status == LicenseStatus.REVOKED or license.license_key in new_keys
+                        or license.license_key in selected):
+                    continue
+                selected.add(license.license_key)
+                chunk.append((license, renewed_end_date(license, now, extend_by)))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        # parallel_map 按提交顺序返回，与 pending 中的分块一一对应
+        pending = deque()
+
+        def specs():
+            for chunk in chunks():
+                pending.append(chunk)
+                yield (self.secret_key, [
+                    (license.license_type.name, license.start_date, end_date, license.product_id)
+                    for license, end_date in chunk
+                ])
+
+        for keys in parallel_map(encrypt_renewals, specs(), workers):
+            renewals = [
+                (license.license_key, renewed_license(license, key, end_date, now))
+                for (license, end_date), key in zip(pending.popleft(), keys)
+            ]
+            logs = [
+                AuditLog(action="续期许可证", license_key=old_key, user_id="system",
+                         details={"new_license_key": license.license_key, "end_date": license.end_date.isoformat()},
+                         timestamp=now)
+                for old_key, license in renewals
+            ]
+            self.repository.save_renewals(renewals, logs, now)
+            for old_key, license in renewals:
+                renewed[old_key] = license
+                new_keys.add(license.license_key)
+            if progress:
+                progress(len(renewed))
+
+        if renewed:
+            self._schedule_expiration(min(license.end_date for license in renewed.values()))
+        return renewed
+
+    def get_superseded_by(self, license_key: str) -> str:
+        """返回续期后取代该许可证的新密钥，没有续期过则返回None"""
+        return self.repository.get_superseded_by(license_key)
+
+    def _select_licenses(self, selector, chunk_size: int):
+        """按密钥列表或筛选条件逐条产出许可证"""
+        if not isinstance(selector, dict):
+            for license_key in selector:
+                license = self.repository.get_license_by_key(license_key)
+                if license is not None:
+                    yield license
+            return
+
+        fields = dict(selector)
+        product_id = fields.pop('product_id', None)
+        status = fields.pop('status', None)
+        if fields:
+            yield from self.repository.search_licenses(product_id=product_id, status=status, **fields)
+        else:
+            yield from self.repository.iter_licenses(chunk_size, product_id=product_id, status=status)
+
     def get_all_licenses(self, product_id: str = None, status: LicenseStatus = None) -> list[License]:
         """获取所有许可证，可以按产品ID和状态过滤"""
-        query = "SELECT * FROM licenses"
-        params = []
-        
-        if product_id or status:
-            query += " WHERE"
-            conditions = []
-            
-            if product_id:
-                conditions.append(" product_id = ?")
-                params.append(product_id)
-            
-            if status:
-                if conditions:
-                    conditions.append(" AND")
-                conditions.append(" status = ?")
-                params.append(status.value)
-            
-            query += ''.join(conditions)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            return [self._row_to_license(row) for row in rows]
-
-    def get_license_usage_history(self, license_key: str) -> list[AuditLog]:
-        """获取许可证的使用历史"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM audit_logs WHERE license_key = ? ORDER BY timestamp DESC",
-                (license_key,)
-            )
-            rows = cursor.fetchall()
-            
-            return [self._row_to_audit_log(row) for row in rows]
+        return self.repository.get_all_licenses(product_id=product_id, status=status)
 
-    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
-        """添加审计日志"""
-        log = AuditLog(action=action, license_key=license_key, user_id=user_id, details=details)
+    def get_statistics(self) -> dict:
+        """获取许可证统计信息：总数、按状态和按类型的数量、累计使用次数"""
+        return self.repository.get_statistics()
+
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> list[dict]:
+        """获取序号大于 seq 的许可证变更，按序号升序
+
+        每条变更包含 seq、license_key、operation（create/update）、status、end_date 和 changed_at。
+        下游缓存保存最后处理的 seq，下次从该序号继续，同步开销只与变更量有关。
+        """
+        return self.repository.changes_since(seq, limit)
+
+    @timed('manager.search_licenses')
+    def search_licenses(self, text: str = None, product_id: str = None, status: LicenseStatus = None,
+                        limit: int = None, **fields) -> list[License]:
+        """按 user_info 中已建立索引的字段或全文检索查找许可证
+
+        例如 search_licenses(company="示例公司") 或 search_licenses(text="zhangsan")
+        """
+        return self.repository.search_licenses(text=text, product_id=product_id, status=status,
+                                               limit=limit, **fields)
+
+    @timed('manager.sweep_expired_licenses')
+    def sweep_expired_licenses(self, now: datetime = None, chunk_size: int = 500) -> int:
+        """将已到期的激活/待激活许可证批量标记为过期，返回本次标记的数量"""
+        now = now or self.clock.now()
+        total = self.repository.expire_licenses(now, chunk_size=chunk_size)
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO audit_logs (action, license_key, user_id, details, timestamp) VALUES (?, ?, ?, ?, ?)",
-                (
-                    log.action,
-                    log.license_key,
-                    log.user_id,
-                    json.dumps(log.details),
-                    log.timestamp.isoformat()
-                )
+        # 每次清理只记录一条汇总审计日志
+        if total:
+            self.add_audit_log(
+                action="过期清理",
+                license_key="batch",
+                user_id="system",
+                details={"count": total, "swept_at": now.isoformat()}
             )
-            conn.commit()
-
-    def _save_license(self, license: License, conn=None, cursor=None):
-        """保存许可证到数据库"""
-        is_external_conn = conn is not None
-        if not is_external_conn:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
         
-        cursor.execute(
-            '''
-            INSERT INTO licenses (
-                license_key, license_type, start_date, end_date, product_id, user_info, 
-                status, created_at, updated_at, activation_count, last_used
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''',
-            (
-                license.license_key,
-                license.license_type.value,
-                license.start_date.isoformat(),
-                license.end_date.isoformat(),
-                license.product_id,
-                json.dumps(license.user_info),
-                license.status.value,
-                license.created_at.isoformat(),
-                license.updated_at.isoformat(),
-                license.activation_count,
-                license.last_used.isoformat() if license.last_used else None
-            )
+        return total
+
+    def get_next_expiration(self) -> datetime:
+        """获取下一个待过期许可证的到期时间，没有则返回None"""
+        return self.repository.get_next_expiration()
+
+    def start_expiration_sweeper(self, max_interval: float = 3600, chunk_size: int = 500) -> ExpirationSweeper:
+        """启动后台过期清理调度器"""
+        if self.expiration_sweeper is None:
+            self.expiration_sweeper = ExpirationSweeper(self, max_interval=max_interval, chunk_size=chunk_size)
+            self.expiration_sweeper.start()
+        return self.expiration_sweeper
+
+    def stop_expiration_sweeper(self):
+        """停止后台过期清理调度器"""
+        if self.expiration_sweeper is not None:
+            self.expiration_sweeper.stop()
+            self.expiration_sweeper = None
+
+    def start_license_reservoir(self, skus, target_size: int = 200, low_water: int = None,
+                                interval: float = 5.0) -> LicenseReservoir:
+        """启动预生成密钥的蓄水池，skus 为 (product_id, license_type, valid_days) 列表"""
+        if self.reservoir is None:
+            self.reservoir = LicenseReservoir(self.generator, skus, target_size=target_size,
+                                              low_water=low_water, interval=interval, clock=self.clock.now)
+            self.reservoir.start()
+        return self.reservoir
+
+    def stop_license_reservoir(self):
+        """停止蓄水池，之后 create_license 恢复同步生成"""
+        if self.reservoir is not None:
+            self.reservoir.stop()
+            self.reservoir = None
+
+    def get_license_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                                  actions: list[str] = None, limit: int = None,
+                                  cursor: str = None) -> list[AuditLog]:
+        """获取许可证的使用历史，按时间倒序
+
+        传入上一页最后一条记录的 cursor 即可获取下一页。
+        """
+        return list(self.iter_license_usage_history(
+            license_key, since=since, until=until, actions=actions, limit=limit, cursor=cursor
+        ))
+
+    def iter_license_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                                   actions: list[str] = None, limit: int = None, cursor: str = None):
+        """流式遍历许可证的使用历史，适用于记录数很多的许可证"""
+        return self.repository.iter_usage_history(
+            license_key, since=since, until=until, actions=actions, limit=limit, cursor=cursor
         )
-        
-        if not is_external_conn:
-            conn.commit()
-            conn.close()
-
-    def _row_to_license(self, row: sqlite3.Row) -> License:
-        """将数据库行转换为许可证对象"""
-        data = dict(row)
-        data['user_info'] = json.loads(data['user_info']) if data['user_info'] else {}
-        return License.from_dict(data)
-
-    def _row_to_audit_log(self, row: sqlite3.Row) -> AuditLog:
-        """将数据库行转换为审计日志对象"""
-        data = dict(row)
-        data['details'] = json.loads(data['details']) if data['details'] else {}
-        return AuditLog.from_dict(data)
\ No newline at end of file
+
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """添加审计日志，时间戳取自管理器的时钟"""
+        log = AuditLog(action=action, license_key=license_key, user_id=user_id, details=details,
+                       timestamp=self.clock.now())
+        self.repository.add_audit_logs([log])
+
+    def archive_audit_logs(self, archive_dir: str, now: datetime = None) -> list[str]:
+        """归档超过保留期的审计日志，返回生成的归档文件路径"""
+        return self.repository.archive_audit_logs(archive_dir, now)
+
+    @timed('manager.export_licenses')
+    def export_licenses(self, path: str, format: str = None, product_id: str = None,
+                        status: LicenseStatus = None, compress: bool = None, progress=None,
+                        chunk_size: int = 1000) -> int:
+        """流式导出许可证到 JSONL 或 CSV 文件，返回导出的数量
+
+        format 为None时按扩展名判断（licenses.jsonl、licenses.csv.gz），
+        以 .gz 结尾的文件使用gzip压缩；progress(count) 定期报告已导出的数量。
+        """
+        format = detect_format(path, format)
+        licenses = self.repository.iter_licenses(chunk_size, product_id=product_id, status=status)
+        with open_text(path, 'w', compress) as f:
+            return write_licenses(f, licenses, format, progress=progress, progress_every=chunk_size)
+
+    @timed('manager.import_licenses')
+    def import_licenses(self, path: str, format: str = None, on_conflict: str = 'error',
+                        compress: bool = None, progress=None, chunk_size: int = 1000,
+                        skip: int = 0, checkpoint=None) -> int:
+        """流式导入 export_licenses 导出的文件，返回写入的数量
+
+        按 chunk_size 分批写入，每批一个事务；on_conflict 可选
+        'error'（密钥已存在时报错）、'skip'（跳过）或 'replace'（覆盖）。
+        skip 跳过文件开头已导入的记录数；每批提交后调用 checkpoint(已读取的记录数)，
+        中断后可从该位置继续。
+        """
+        format = detect_format(path, format)
+        imported = 0
+        consumed = skip
+        earliest_end = None
+
+        def flush(chunk):
+            nonlocal imported, consumed
+            imported += self.repository.save_licenses(chunk, on_conflict=on_conflict)
+            consumed += len(chunk)
+            if checkpoint:
+                checkpoint(consumed)
+            if progress:
+                progress(imported)
+
+        with open_text(path, 'r', compress) as f:
+            chunk = []
+            for license in itertools.islice(read_licenses(f, format), skip, None):
+                chunk.append(license)
+                if license.status in SWEEPABLE_STATUSES and (earliest_end is None or license.end_date < earliest_end):
+                    earliest_end = license.end_date
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+
+        if earliest_end is not None:
+            self._schedule_expiration(earliest_end)
+
+        # 记录审计日志
+        self.add_audit_log(
+            action="批量导入许可证",
+            license_key="batch",
+            user_id="system",
+            details={"count": imported, "source": path, "on_conflict": on_conflict}
+        )
+        return imported
+
+    def license_columns(self, chunk_size: int = 100000):
+        """将许可证表加载为列式快照（LicenseColumns），用于续费和财务报表的向量化统计
+
+        需要安装 numpy；为了不影响启动时间，分析模块在首次调用时才导入。
+        """
+        from .analytics import LicenseColumns
+        return LicenseColumns.load(self.repository, chunk_size)
+
+    def metrics(self) -> dict:
+        """返回操作计数、延迟分布和缓存命中率的快照；需先调用 METRICS.enable() 开启统计"""
+        return METRICS.snapshot()
+
+    def export_snapshot(self, path: str) -> int:
+        """导出供验证副本使用的只读快照文件，返回导出的许可证数量
+
+        新快照原子替换旧文件，副本通过 SnapshotRepository.reload() 切换。
+        """
+        return write_snapshot(path, self.repository.iter_licenses(), self.repository.get_statistics()['total'])
+
+    def _schedule_expiration(self, end_date: datetime):
+        """通知过期清理调度器新的到期时间"""
+        if self.expiration_sweeper is not None:
+            self.expiration_sweeper.schedule(end_date)
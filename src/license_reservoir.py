@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from .models import License, LicenseType
+from .metrics import METRICS
+
+
+def issue_period(now: datetime, valid_days: int) -> tuple[datetime, datetime]:
+    """签发日零点开始、有效 valid_days 天的有效期
+
+    有效期是密文的一部分，预先生成的密钥只能对应固定的日期，
+    因此从蓄水池签发的许可证都从当天零点开始计算。
+    """
+    start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_date, start_date + timedelta(days=valid_days)
+
+
+class LicenseReservoir:
+    """预先生成许可证密钥的蓄水池
+
+    按 (product_id, license_type, valid_days) 为每种商品保留一批已加密的密钥，
+    create_license 命中时只需绑定 user_info 并写入数据库，不再在请求中执行加密。
+    每种商品的库存低于 low_water 时唤醒后台线程补充到 target_size；
+    日期变化后前一天生成的密钥被丢弃。
+    """
+
+    def __init__(self, generator, skus, target_size: int = 200, low_water: int = None,
+                 interval: float = 5.0, clock=datetime.now):
+        self.generator = generator
+        self.target_size = target_size
+        self.low_water = target_size // 4 if low_water is None else low_water
+        self.interval = interval
+        self._clock = clock
+        self._slots = {
+            (product_id, license_type, valid_days): deque()
+            for product_id, license_type, valid_days in skus
+        }
+        self._counters = {'hits': 0, 'misses': 0, 'generated': 0, 'discarded': 0}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """先同步补满一次，再启动后台补充线程"""
+        if self._thread is not None:
+            return
+        self.refill()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="license-reservoir", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """停止后台补充线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def take(self, product_id: str, license_type: LicenseType, start_date: datetime,
+             end_date: datetime) -> License:
+        """取出一个有效期完全相同的预生成许可证，没有时返回None"""
+        valid_days = (end_date - start_date).days
+        slots = self._slots.get((product_id, license_type, valid_days))
+        if slots is None:
+            return None
+
+        expected = issue_period(self._clock(), valid_days)
+        with self._lock:
+            self._discard_stale(slots, expected[0])
+            license = slots.popleft() if slots and (start_date, end_date) == expected else None
+            self._counters['hits' if license else 'misses'] += 1
+            low = len(slots) < self.low_water
+        METRICS.record_cache('license_reservoir', license is not None)
+        if low:
+            self._wakeup.set()
+        return license
+
+    def refill(self) -> int:
+        """将每种商品的库存补充到 target_size，返回新生成的数量
+
+        加密在锁外进行，不阻塞并发的 take。
+        """
+        generated = 0
+        for (product_id, license_type, valid_days), slots in self._slots.items():
+            start_date, end_date = issue_period(self._clock(), valid_days)
+            with self._lock:
+                self._discard_stale(slots, start_date)
+                needed = self.target_size - len(slots)
+            if needed <= 0:
+                continue
+
+            licenses = [
+                self.generator.generate_license_key(license_type, start_date, end_date, product_id)
+                for _ in range(needed)
+            ]
+            with self._lock:
+                self._discard_stale(slots, start_date)
+                slots.extend(licenses)
+                self._counters['generated'] += needed
+            generated += needed
+        return generated
+
+    def stats(self) -> dict:
+        """返回各商品的库存以及命中、未命中、生成和丢弃的次数"""
+        with self._lock:
+            return {
+                **self._counters,
+                'sizes': {
+                    f"{product_id}/{license_type.name}/{valid_days}": len(slots)
+                    for (product_id, license_type, valid_days), slots in self._slots.items()
+                },
+            }
+
+    def _discard_stale(self, slots: deque, start_date: datetime):
+        """丢弃不是 start_date 当天生成的密钥，调用方需持有锁"""
+        if slots and slots[0].start_date != start_date:
+            self._counters['discarded'] += len(slots)
+            slots.clear()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.refill()
+            except Exception:
+                # 补充失败时 create_license 回退到同步生成，下一个周期重试
+                pass
@@ -0,0 +1,273 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+from datetime import datetime, timedelta
+from .models import License, LicenseType, LicenseStatus
+
+# 文件头：魔数、版本、槽位大小、槽位数、记录数、产品表偏移
+HEADER = struct.Struct('<4sHHQQQ')
+# 槽位：密钥摘要、产品序号、状态、类型、开始时间、结束时间（微秒）
+SLOT = struct.Struct('<16sIBB2xqq')
+# 按两个64位整数原地比较槽位中的密钥摘要
+DIGEST = struct.Struct('<QQ')
+MAGIC = b'LSNP'
+VERSION = 1
+DIGEST_SIZE = 16
+
+# 状态和类型按枚举定义顺序编码，0 表示空槽位
+_STATUSES = list(LicenseStatus)
+_TYPES = list(LicenseType)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def key_digest(license_key: str) -> bytes:
+    """许可证密钥在快照中的定长摘要"""
+    return hashlib.blake2b(license_key.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+def _to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def table_slots(capacity: int) -> int:
+    """容纳 capacity 个许可证的槽位数：取2的幂，装载因子不超过0.5，线性探测的平均探测次数接近1"""
+    slot_count = 8
+    while slot_count < capacity * 2:
+        slot_count *= 2
+    return slot_count
+
+
+def fill_table(buffer, licenses, slot_count: int) -> tuple[int, dict]:
+    """将许可证逐条写入缓冲区中的开放寻址哈希表，返回 (许可证数量, {产品ID: 序号})
+
+    buffer 是已清零、至少 HEADER.size + slot_count * SLOT.size 字节的可写缓冲区
+    （文件映射或共享内存），槽位直接编码到目标位置，不在内存中暂存整张表。
+    """
+    mask = slot_count - 1
+    products = {}
+    count = 0
+    for license in licenses:
+        # 至少保留一个空槽位，查找时的线性探测才能终止
+        if count >= mask:
+            raise ValueError(f"许可证数量超过快照容量 ({mask})")
+        digest = key_digest(license.license_key)
+        slot = int.from_bytes(digest[:8], 'little') & mask
+        while buffer[HEADER.size + slot * SLOT.size + DIGEST_SIZE + 4]:
+            slot = (slot + 1) & mask
+        SLOT.pack_into(
+            buffer,
+            HEADER.size + slot * SLOT.size,
+            digest,
+            products.setdefault(license.product_id, len(products)),
+            _STATUSES.index(license.status) + 1,
+            _TYPES.index(license.license_type) + 1,
+            _to_micros(license.start_date),
+            _to_micros(license.end_date)
+        )
+        count += 1
+    return count, products
+
+
+def encode_products(products: dict) -> bytes:
+    """产品表：产品数量，随后是按序号排列的 (长度, UTF-8 编码)"""
+    product_table = bytearray(struct.pack('<I', len(products)))
+    for product_id in products:
+        encoded = product_id.encode('utf-8')
+        product_table += struct.pack('<H', len(encoded)) + encoded
+    return bytes(product_table)
+
+
+def finish_snapshot(buffer, slot_count: int, count: int, product_table: bytes):
+    """在哈希表之后写入产品表，最后写入文件头"""
+    products_offset = HEADER.size + slot_count * SLOT.size
+    buffer[products_offset:products_offset + len(product_table)] = product_table
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, SLOT.size, slot_count, count, products_offset)
+
+
+def write_snapshot(path: str, licenses, count: int = None) -> int:
+    """将许可证写入快照文件，返回写入的许可证数量
+
+    count 为许可证数量的预估（例如仓库统计的总数），用于预先确定哈希表大小；
+    不传时取 len(licenses)。哈希表直接写入映射的文件，内存占用与许可证数量无关。
+    先写入同目录下的临时文件，再用 os.replace 原子替换，
+    正在读取旧快照的副本不会看到写了一半的文件。
+    """
+    slot_count = table_slots(len(licenses) if count is None else count)
+    products_offset = HEADER.size + slot_count * SLOT.size
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w+b') as f:
+        # 扩展出的部分读出为零，即空槽位
+        f.truncate(products_offset)
+        with mmap.mmap(f.fileno(), products_offset) as buffer:
+            count, products = fill_table(buffer, licenses, slot_count)
+            HEADER.pack_into(buffer, 0, MAGIC, VERSION, SLOT.size, slot_count, count, products_offset)
+            buffer.flush()
+        f.seek(products_offset)
+        f.write(encode_products(products))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class LicenseSnapshot:
+    """通过 mmap 只读访问的许可证快照
+
+    打开时只读取文件头和产品表，槽位数据由操作系统按需换页，
+    因此千万级快照也能在毫秒级完成加载。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load(self._mmap)
+        except ValueError:
+            self._mmap.close()
+            raise ValueError(f"无效的许可证快照文件: {path}")
+
+    @classmethod
+    def from_buffer(cls, buffer) -> 'LicenseSnapshot':
+        """从内存缓冲区（例如共享内存的 buf）读取快照，不复制数据"""
+        snapshot = cls.__new__(cls)
+        snapshot.path = None
+        snapshot._stat = None
+        snapshot._mmap = None
+        snapshot._load(buffer)
+        return snapshot
+
+    def _load(self, buffer):
+        magic, version, slot_size, slot_count, count, products_offset = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT.size:
+            raise ValueError("无效的许可证快照")
+        self._buffer = buffer
+        self.slot_count = slot_count
+        self.count = count
+        self._mask = slot_count - 1
+
+        (product_count,) = struct.unpack_from('<I', buffer, products_offset)
+        offset = products_offset + 4
+        self._products = []
+        for _ in range(product_count):
+            (length,) = struct.unpack_from('<H', buffer, offset)
+            self._products.append(bytes(buffer[offset + 2:offset + 2 + length]).decode('utf-8'))
+            offset += 2 + length
+
+    def lookup(self, license_key: str) -> tuple:
+        """返回 (product_id, status, end_date)，不存在时返回None"""
+        slot = self._find(license_key)
+        if slot is None:
+            return None
+        _, product_index, status, _, _, end = SLOT.unpack_from(self._buffer, HEADER.size + slot * SLOT.size)
+        return self._products[product_index], _STATUSES[status - 1], _from_micros(end)
+
+    def get_license(self, license_key: str) -> License:
+        """按快照内容构造许可证对象，不包含 user_info 和使用记录"""
+        slot = self._find(license_key)
+        if slot is None:
+            return None
+        _, product_index, status, license_type, start, end = SLOT.unpack_from(
+            self._buffer, HEADER.size + slot * SLOT.size
+        )
+        return License(
+            license_key=license_key,
+            license_type=_TYPES[license_type - 1],
+            start_date=_from_micros(start),
+            end_date=_from_micros(end),
+            product_id=self._products[product_index],
+            status=_STATUSES[status - 1]
+        )
+
+    def is_same_file(self, stat: os.stat_result) -> bool:
+        """判断路径当前指向的文件是否就是已映射的文件"""
+        return self._stat is not None and (stat.st_ino, stat.st_dev, stat.st_mtime_ns) == (
+            self._stat.st_ino, self._stat.st_dev, self._stat.st_mtime_ns
+        )
+
+    def close(self):
+        # 从缓冲区读取时由缓冲区的所有者负责释放
+        if self._mmap is not None:
+            self._mmap.close()
+        self._buffer = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, license_key: str) -> bool:
+        return self._find(license_key) is not None
+
+    def _find(self, license_key: str) -> int:
+        """线性探测查找密钥所在槽位，摘要按整数原地比较，探测时不复制槽位"""
+        if not self.count:
+            return None
+        digest = DIGEST.unpack(key_digest(license_key))
+        slot = digest[0] & self._mask
+        view = self._buffer
+        while True:
+            offset = HEADER.size + slot * SLOT.size
+            if not view[offset + DIGEST_SIZE + 4]:
+                return None
+            if DIGEST.unpack_from(view, offset) == digest:
+                return slot
+            slot = (slot + 1) & self._mask
+
+
+class SnapshotRepository:
+    """基于快照文件的只读许可证仓库，供验证副本使用
+
+    提供 LicenseValidator 在线验证所需的 get_license_by_key，
+    验证事件不在副本上记录。发布新快照后调用 reload()（或设置
+    reload_interval 自动检查）即可原子切换到新文件，
+    已取得旧快照引用的查询不受影响。
+    """
+
+    def __init__(self, path: str, reload_interval: float = None):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._snapshot = LicenseSnapshot(path)
+        self._checked_at = time.monotonic()
+
+    @property
+    def snapshot(self) -> LicenseSnapshot:
+        return self._snapshot
+
+    def reload(self) -> bool:
+        """文件已被替换时加载新快照，返回是否发生切换"""
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self._snapshot.is_same_file(stat):
+            return False
+        # 旧快照的映射在最后一个引用释放后由垃圾回收关闭
+        self._snapshot = LicenseSnapshot(self.path)
+        return True
+
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证"""
+        if self.reload_interval is not None and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+        return self._snapshot.get_license(license_key)
+
+    def record_validation(self, license: License, machine_info: dict = None):
+        """只读副本不记录验证事件"""
+
+    def update_license(self, license: License) -> bool:
+        """只读副本不能修改许可证"""
+        return False
+
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """只读副本不写审计日志"""
+
+    def close(self):
+        self._snapshot.close()
@@ -1,23 +1,54 @@
 import hashlib
 import base64
+import json
 from datetime import datetime
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
 from .models import License, LicenseStatus
+from .metrics import timed
+from .crypto_backend import aes_cbc, pkcs7
+from .clock import SYSTEM_CLOCK
+from .license_generator import KEY_ALTCHARS
+
+# 以下两类在线验证失败是暂时性的，不代表许可证无效，调用方应稍后重试或按离线宽限期处理
+RATE_LIMITED_MESSAGE = "验证请求过于频繁，请稍后再试"
+ONLINE_ERROR_PREFIX = "在线验证失败: "
+
+
+def is_transient_failure(message: str) -> bool:
+    """判断在线验证的失败信息是否为限流或服务端错误"""
+    return message == RATE_LIMITED_MESSAGE or message.startswith(ONLINE_ERROR_PREFIX)
+
+
+def machine_fingerprint(machine_info: dict = None) -> str:
+    """根据机器信息计算机器指纹，优先使用 machine_id，不包含 user_id"""
+    machine_info = machine_info or {}
+    if machine_info.get('machine_id'):
+        source = str(machine_info['machine_id'])
+    else:
+        source = json.dumps(
+            {key: value for key, value in machine_info.items() if key != 'user_id'},
+            sort_keys=True, ensure_ascii=False
+        )
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
 
 
 class LicenseValidator:
-    def __init__(self, secret_key: str):
+    def __init__(self, secret_key: str, clock=SYSTEM_CLOCK):
+        self.clock = clock
         # 确保密钥长度为32字节（AES-256需要）
         self.secret_key = hashlib.sha256(secret_key.encode()).digest()
         self.iv = bytes.fromhex('0123456789abcdef0123456789abcdef')  # 初始化向量
         self.license_repository = None  # 用于在线验证
+        self.rate_limiter = None  # 按许可证密钥限制在线验证频率
 
     def set_license_repository(self, repository):
         """设置许可证仓库，用于在线验证"""
         self.license_repository = repository
 
+    def set_rate_limiter(self, rate_limiter):
+        """设置限流器，在线验证在任何解密和数据库操作之前按许可证密钥限流"""
+        self.rate_limiter = rate_limiter
+
+    @timed('validator.validate_license_offline')
     def validate_license_offline(self, license_key: str, product_id: str) -> tuple[bool, str]:
         """离线验证许可证"""
         try:
@@ -32,11 +63,15 @@ class LicenseValidator:
         except Exception as e:
             return False, f"许可证格式错误或已被篡改: {str(e)}"
 
+    @timed('validator.validate_license_online')
     def validate_license_online(self, license_key: str, product_id: str, machine_info: dict = None) -> tuple[bool, str]:
         """在线验证许可证"""
         if not self.license_repository:
             return False, "许可证仓库未配置，无法进行在线验证"
 
+        if self.rate_limiter is not None and not self.rate_limiter.allow(('license', license_key)):
+            return False, RATE_LIMITED_MESSAGE
+
         try:
             # 检查许可证是否存在于仓库中
             license = self.license_repository.get_license_by_key(license_key)
@@ -58,22 +93,33 @@ class LicenseValidator:
             if license.product_id != product_id:
                 return False, "许可证与当前产品不匹配"
 
+            # 检查激活设备数上限
+            register_activation = getattr(self.license_repository, 'register_activation', None)
+            if register_activation is not None:
+                if not register_activation(license_key, machine_fingerprint(machine_info)):
+                    return False, "许可证激活设备数已达上限"
+
             # 更新许可证使用记录
             license.activation_count += 1
-            license.last_used = datetime.now()
-            self.license_repository.update_license(license)
-
-            # 记录审计日志
-            self.license_repository.add_audit_log(
-                action="验证许可证",
-                license_key=license_key,
-                user_id=machine_info.get('user_id', 'unknown'),
-                details={"machine_info": machine_info}
-            )
+            license.last_used = self.clock.now()
+            record_validation = getattr(self.license_repository, 'record_validation', None)
+            if record_validation is not None:
+                # 仓库自行决定如何记录验证事件（例如按天聚合计数）
+                record_validation(license, machine_info)
+            else:
+                self.license_repository.update_license(license)
+
+                # 记录审计日志
+                self.license_repository.add_audit_log(
+                    action="验证许可证",
+                    license_key=license_key,
+                    user_id=machine_info.get('user_id', 'unknown'),
+                    details={"machine_info": machine_info}
+                )
 
             return True, "许可证验证成功"
         except Exception as e:
-            return False, f"在线验证失败: {str(e)}"
+            return False, f"{ONLINE_ERROR_PREFIX}{str(e)}"
 
     def _parse_license_key(self, license_key: str) -> bytes:
         """解析许可证密钥，移除连字符"""
@@ -85,21 +131,22 @@ class LicenseValidator:
         if padding_needed != 4:
             key_without_hyphens += '=' * padding_needed
         
-        # 转换为base64编码的字节数据
+        # 转换为base64编码的字节数据，替换字符与 LicenseGenerator._format_license_key 一致
         try:
-            return base64.b64decode(key_without_hyphens)
+            return base64.b64decode(key_without_hyphens, altchars=KEY_ALTCHARS, validate=True)
         except Exception:
             raise ValueError("许可证密钥格式错误")
 
+    @timed('validator.decrypt_data')
     def _decrypt_data(self, encrypted_data: bytes) -> str:
         """解密许可证数据"""
         # 创建密码器并解密
-        cipher = Cipher(algorithms.AES(self.secret_key), modes.CBC(self.iv), backend=default_backend())
+        cipher = aes_cbc(self.secret_key, self.iv)
         decryptor = cipher.decryptor()
         padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
         
         # 移除填充
-        unpadder = padding.PKCS7(128).unpadder()
+        unpadder = pkcs7().unpadder()
         data = unpadder.update(padded_data) + unpadder.finalize()
         
         return data.decode('utf-8')
@@ -121,7 +168,7 @@ class LicenseValidator:
             # 验证有效期
             start_date = datetime.fromisoformat(start_date_str)
             end_date = datetime.fromisoformat(end_date_str)
-            current_date = datetime.now()
+            current_date = self.clock.now()
             
             if current_date < start_date:
                 return False, "许可证尚未生效"
@@ -134,7 +181,7 @@ class LicenseValidator:
 
     def is_license_expired(self, license: License) -> bool:
         """检查许可证是否已过期"""
-        return datetime.now() > license.end_date
+        return self.clock.now() > license.end_date
 
     def is_license_revoked(self, license: License) -> bool:
         """检查许可证是否已被吊销"""
@@ -0,0 +1,396 @@
+import os
+import copy
+import gzip
+import json
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime
+from .models import License, LicenseStatus, AuditLog
+from .repository import LicenseRepository, SWEEPABLE_STATUSES, CONFLICT_POLICIES
+from .user_info_index import DEFAULT_INDEXED_FIELDS
+from .change_feed import TRACKED_FIELDS
+
+
+class InMemoryLicenseRepository(LicenseRepository):
+    """基于字典索引的内存许可证存储
+
+    不访问磁盘，适用于测试、基准测试和临时的边缘缓存。
+    读取和写入都复制许可证对象，调用方修改返回值不会影响存储内容。
+    """
+
+    def __init__(self, indexed_user_fields: tuple = DEFAULT_INDEXED_FIELDS, audit_retention_months: int = None):
+        self.indexed_user_fields = tuple(indexed_user_fields)
+        self.audit_retention_months = audit_retention_months
+        self._lock = threading.RLock()
+        self._licenses = {}
+        self._by_product = defaultdict(set)
+        self._by_status = defaultdict(set)
+        self._by_user_field = {field: defaultdict(set) for field in self.indexed_user_fields}
+        self._order = {}
+        self._next_id = 1
+        self._audit_logs = defaultdict(list)
+        self._next_log_id = 1
+        self._counters = {}
+        self._machine_infos = {}
+        self._activations = defaultdict(dict)
+        self._changes = []
+        self._superseded_by = {}
+
+    def save_license(self, license: License):
+        """保存新许可证"""
+        self.save_licenses([license])
+
+    def save_licenses(self, licenses: list[License], on_conflict: str = 'error') -> int:
+        """批量保存许可证；on_conflict 为 'error' 时任一密钥重复则整体不生效"""
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突处理方式: {on_conflict}")
+
+        with self._lock:
+            if on_conflict == 'error':
+                keys = [license.license_key for license in licenses]
+                if len(set(keys)) != len(keys) or any(key in self._licenses for key in keys):
+                    raise ValueError("许可证密钥已存在")
+
+            written = 0
+            for license in licenses:
+                if license.license_key in self._licenses:
+                    if on_conflict == 'skip':
+                        continue
+                    self.update_license(license)
+                else:
+                    self._order[license.license_key] = self._next_id
+                    self._next_id += 1
+                    self._index(copy.deepcopy(license))
+                    self._record_change(license, 'create')
+                written += 1
+            return written
+
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证"""
+        with self._lock:
+            license = self._licenses.get(license_key)
+            return copy.deepcopy(license) if license else None
+
+    def update_license(self, license: License) -> bool:
+        """更新许可证"""
+        with self._lock:
+            current = self._licenses.get(license.license_key)
+            if current is None:
+                return False
+            changed = self._tracked(current) != self._tracked(license)
+            self._unindex(current)
+            self._index(copy.deepcopy(license))
+            if changed:
+                self._record_change(license, 'update')
+            return True
+
+    def save_renewals(self, renewals: list[tuple[str, License]], logs: list[AuditLog], now: datetime) -> int:
+        """写入新许可证、吊销旧许可证并登记续期关系，检查与写入在同一把锁内完成"""
+        with self._lock:
+            for old_key, _ in renewals:
+                current = self._licenses.get(old_key)
+                if current is None or current.status == LicenseStatus.REVOKED:
+                    raise ValueError("部分许可证不存在或已被吊销")
+            self.save_licenses([license for _, license in renewals])
+            for old_key, license in renewals:
+                revoked = copy.deepcopy(self._licenses[old_key])
+                revoked.status = LicenseStatus.REVOKED
+                revoked.updated_at = now
+                self.update_license(revoked)
+                self._superseded_by[old_key] = license.license_key
+            self.add_audit_logs(logs)
+            return len(renewals)
+
+    def get_superseded_by(self, license_key: str) -> str:
+        """返回取代该许可证的新密钥"""
+        with self._lock:
+            return self._superseded_by.get(license_key)
+
+    def get_all_licenses(self, product_id: str = None, status: LicenseStatus = None) -> list[License]:
+        """获取所有许可证，可以按产品ID和状态过滤"""
+        return self._select(product_id=product_id, status=status)
+
+    def iter_licenses(self, chunk_size: int = 1000, product_id: str = None, status: LicenseStatus = None):
+        """按插入顺序逐条产出许可证副本"""
+        with self._lock:
+            keys = sorted(self._licenses, key=self._order.__getitem__)
+        for key in keys:
+            license = self.get_license_by_key(key)
+            if license is None:
+                continue
+            if (product_id and license.product_id != product_id) or (status and license.status != status):
+                continue
+            yield license
+
+    def get_statistics(self) -> dict:
+        """统计许可证数量"""
+        with self._lock:
+            by_status = {status.value: len(keys) for status, keys in self._by_status.items() if keys}
+            by_type = defaultdict(int)
+            total_activations = 0
+            for license in self._licenses.values():
+                by_type[license.license_type.value] += 1
+                total_activations += license.activation_count
+
+        return {
+            'total': len(self._licenses),
+            'by_status': by_status,
+            'by_type': dict(by_type),
+            'total_activations': total_activations
+        }
+
+    def search_licenses(self, text: str = None, product_id: str = None, status: LicenseStatus = None,
+                        limit: int = None, **fields) -> list[License]:
+        """按已建立索引的 user_info 字段或文本包含关系查找许可证"""
+        for field in fields:
+            if field not in self.indexed_user_fields:
+                raise ValueError(f"字段未建立索引: {field}")
+        return self._select(product_id=product_id, status=status, fields=fields, text=text, limit=limit)
+
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> list[dict]:
+        """按序号升序返回大于 seq 的许可证变更"""
+        with self._lock:
+            # 序号从1开始连续分配，第 seq 条之后即列表下标 seq 之后
+            return [dict(change) for change in self._changes[max(seq, 0):max(seq, 0) + limit]]
+
+    def expire_licenses(self, now: datetime, chunk_size: int = 500) -> int:
+        """将已到期的激活/待激活许可证标记为过期"""
+        with self._lock:
+            due = [
+                key for status in SWEEPABLE_STATUSES for key in self._by_status[status]
+                if self._licenses[key].end_date < now
+            ]
+            for key in due:
+                license = self._licenses[key]
+                self._unindex(license)
+                license.status = LicenseStatus.EXPIRED
+                license.updated_at = now
+                self._index(license)
+                self._record_change(license, 'update')
+            return len(due)
+
+    def get_next_expiration(self) -> datetime:
+        """获取下一个待过期许可证的到期时间"""
+        with self._lock:
+            end_dates = [
+                self._licenses[key].end_date
+                for status in SWEEPABLE_STATUSES for key in self._by_status[status]
+            ]
+            return min(end_dates) if end_dates else None
+
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """添加审计日志"""
+        self.add_audit_logs([AuditLog(action=action, license_key=license_key, user_id=user_id, details=details)])
+
+    def add_audit_logs(self, logs: list[AuditLog]):
+        """批量写入审计日志"""
+        with self._lock:
+            for log in logs:
+                log = copy.deepcopy(log)
+                log.id = self._next_log_id
+                self._next_log_id += 1
+                self._audit_logs[log.license_key].append(log)
+
+    def iter_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                           actions: list[str] = None, limit: int = None, cursor: str = None):
+        """按时间倒序逐条产出许可证的审计日志"""
+        after = None
+        if cursor:
+            cursor_timestamp, cursor_id = cursor.rsplit('|', 1)
+            after = (datetime.fromisoformat(cursor_timestamp), int(cursor_id))
+
+        with self._lock:
+            logs = sorted(self._audit_logs.get(license_key, []), key=lambda log: (log.timestamp, log.id),
+                          reverse=True)
+
+        count = 0
+        for log in logs:
+            if limit is not None and count >= limit:
+                return
+            if since and log.timestamp < since:
+                continue
+            if until and log.timestamp > until:
+                continue
+            if after and (log.timestamp, log.id) >= after:
+                continue
+            if actions and log.action not in actions:
+                continue
+            count += 1
+            yield copy.deepcopy(log)
+
+    def archive_audit_logs(self, archive_dir: str, now: datetime = None) -> list[str]:
+        """将超过保留期的审计日志按月归档为 gzip 压缩的 JSONL 文件"""
+        if self.audit_retention_months is None:
+            return []
+        now = now or datetime.now()
+        oldest_kept = now.year * 12 + now.month - 1 - self.audit_retention_months + 1
+
+        with self._lock:
+            expired = defaultdict(list)
+            for license_key, logs in self._audit_logs.items():
+                kept = []
+                for log in logs:
+                    if log.timestamp.year * 12 + log.timestamp.month - 1 < oldest_kept:
+                        expired[log.timestamp.strftime('%Y%m')].append(log)
+                    else:
+                        kept.append(log)
+                logs[:] = kept
+
+        os.makedirs(archive_dir, exist_ok=True)
+        archived = []
+        for month in sorted(expired):
+            path = os.path.join(archive_dir, f"audit_logs_{month}.jsonl.gz")
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                for log in sorted(expired[month], key=lambda log: log.id):
+                    f.write(json.dumps(log.to_dict(), ensure_ascii=False))
+                    f.write('\n')
+            archived.append(path)
+        return archived
+
+    def record_usage(self, license_key: str, machine_info: dict, timestamp: datetime, log: AuditLog = None):
+        """累加使用次数和按天聚合的验证计数；传入 log 时写入审计日志而不累加计数"""
+        payload = json.dumps(machine_info or {}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        with self._lock:
+            license = self._licenses.get(license_key)
+            if license is not None:
+                license.activation_count += 1
+                license.last_used = timestamp
+                license.updated_at = timestamp
+
+            if log is not None:
+                self.add_audit_logs([log])
+                return
+
+            self._machine_infos.setdefault(digest, payload)
+            counter_key = (license_key, timestamp.date().isoformat(), digest)
+            counter = self._counters.get(counter_key)
+            if counter is None:
+                self._counters[counter_key] = {'count': 1, 'first_seen': timestamp, 'last_seen': timestamp}
+            else:
+                counter['count'] += 1
+                counter['last_seen'] = timestamp
+
+    def get_validation_counters(self, license_key: str, since: datetime = None,
+                                until: datetime = None) -> list[dict]:
+        """获取许可证按天、按机器聚合的验证次数，按日期倒序"""
+        with self._lock:
+            counters = [
+                {
+                    'day': day,
+                    'count': counter['count'],
+                    'first_seen': counter['first_seen'],
+                    'last_seen': counter['last_seen'],
+                    'machine_info': json.loads(self._machine_infos[digest])
+                }
+                for (key, day, digest), counter in self._counters.items()
+                if key == license_key
+                and (since is None or day >= since.date().isoformat())
+                and (until is None or day <= until.date().isoformat())
+            ]
+        counters.sort(key=lambda counter: (counter['day'], counter['last_seen']), reverse=True)
+        return counters
+
+    def add_activation(self, license_key: str, fingerprint: str, max_count: int, now: datetime) -> bool:
+        """登记设备激活，检查与登记在同一把锁内完成"""
+        with self._lock:
+            machines = self._activations[license_key]
+            activation = machines.get(fingerprint)
+            if activation is None:
+                if len(machines) >= max_count:
+                    return False
+                machines[fingerprint] = {
+                    'fingerprint': fingerprint, 'first_seen': now, 'last_seen': now, 'validation_count': 1
+                }
+            else:
+                activation['last_seen'] = now
+                activation['validation_count'] += 1
+            return True
+
+    def get_activations(self, license_key: str) -> list[dict]:
+        """获取许可证已激活的设备列表"""
+        with self._lock:
+            return [dict(activation) for activation in self._activations.get(license_key, {}).values()]
+
+    def remove_activation(self, license_key: str, fingerprint: str) -> bool:
+        """移除一台设备的激活记录"""
+        with self._lock:
+            return self._activations.get(license_key, {}).pop(fingerprint, None) is not None
+
+    def _record_change(self, license: License, operation: str):
+        """追加一条变更日志"""
+        self._changes.append({
+            'seq': len(self._changes) + 1,
+            'license_key': license.license_key,
+            'operation': operation,
+            'status': license.status,
+            'end_date': license.end_date,
+            'changed_at': license.updated_at
+        })
+
+    @staticmethod
+    def _tracked(license: License) -> dict:
+        """参与变更判断的字段"""
+        data = license.to_dict()
+        return {field: data[field] for field in TRACKED_FIELDS}
+
+    def _select(self, product_id: str = None, status: LicenseStatus = None, fields: dict = None,
+                text: str = None, limit: int = None) -> list[License]:
+        """利用字典索引求交集后按插入顺序返回许可证副本"""
+        with self._lock:
+            candidates = None
+            index_sets = []
+            if product_id:
+                index_sets.append(self._by_product.get(product_id, set()))
+            if status:
+                index_sets.append(self._by_status.get(status, set()))
+            for field, value in (fields or {}).items():
+                index_sets.append(self._by_user_field[field].get(self._index_value(value), set()))
+
+            if index_sets:
+                candidates = set.intersection(*sorted(index_sets, key=len))
+            else:
+                candidates = self._licenses.keys()
+
+            keys = sorted(candidates, key=self._order.__getitem__)
+            if text:
+                # 与SQLite后端一致：按空白拆分，每段都需出现
+                needles = text.lower().split()
+                keys = [key for key in keys if self._contains_all(self._licenses[key], needles)]
+            if limit is not None:
+                keys = keys[:limit]
+            return [copy.deepcopy(self._licenses[key]) for key in keys]
+
+    @staticmethod
+    def _contains_all(license: License, needles: list[str]) -> bool:
+        haystack = json.dumps(license.user_info, ensure_ascii=False).lower()
+        return all(needle in haystack for needle in needles)
+
+    def _index(self, license: License):
+        """将许可证加入各个索引"""
+        key = license.license_key
+        self._licenses[key] = license
+        self._by_product[license.product_id].add(key)
+        self._by_status[license.status].add(key)
+        for field, index in self._by_user_field.items():
+            if field in license.user_info:
+                index[self._index_value(license.user_info[field])].add(key)
+
+    def _unindex(self, license: License):
+        """将许可证从各个索引中移除"""
+        key = license.license_key
+        self._by_product[license.product_id].discard(key)
+        self._by_status[license.status].discard(key)
+        for field, index in self._by_user_field.items():
+            if field in license.user_info:
+                index[self._index_value(license.user_info[field])].discard(key)
+
+    @staticmethod
+    def _index_value(value):
+        """索引键：不可哈希的值按JSON文本索引"""
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return json.dumps(value, sort_keys=True)
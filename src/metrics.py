@@ -0,0 +1,166 @@
+import time
+import bisect
+import functools
+import threading
+
+# 延迟直方图的桶上限（秒），从10微秒到10秒按约2.5倍递增
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """按桶估算分位数，返回所在桶的上限"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class Metrics:
+    """进程内的操作计数、延迟直方图和缓存命中率
+
+    默认关闭；关闭时被 timed 装饰的函数只多一次属性判断。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """清空所有统计"""
+        with self._lock:
+            self._errors = {}
+            self._histograms = {}
+            self._cache_hits = {}
+            self._cache_misses = {}
+
+    def observe(self, operation: str, seconds: float, error: bool = False):
+        """记录一次操作耗时"""
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def record_cache(self, cache: str, hit: bool):
+        """记录一次缓存查找"""
+        if not self.enabled:
+            return
+        counters = self._cache_hits if hit else self._cache_misses
+        with self._lock:
+            counters[cache] = counters.get(cache, 0) + 1
+
+    def snapshot(self) -> dict:
+        """返回当前统计的快照"""
+        with self._lock:
+            operations = {
+                name: {
+                    'count': histogram.count,
+                    'errors': self._errors.get(name, 0),
+                    'total_seconds': histogram.sum,
+                    'p50_seconds': histogram.quantile(0.5),
+                    'p99_seconds': histogram.quantile(0.99)
+                }
+                for name, histogram in self._histograms.items()
+            }
+            caches = {}
+            for name in set(self._cache_hits) | set(self._cache_misses):
+                hits = self._cache_hits.get(name, 0)
+                misses = self._cache_misses.get(name, 0)
+                caches[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+        return {'enabled': self.enabled, 'operations': operations, 'caches': caches}
+
+    def prometheus(self) -> str:
+        """以 Prometheus 文本格式导出"""
+        lines = [
+            "# HELP license_operation_duration_seconds 操作耗时",
+            "# TYPE license_operation_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            errors = dict(self._errors)
+            cache_hits = dict(self._cache_hits)
+            cache_misses = dict(self._cache_misses)
+            for name, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'license_operation_duration_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'license_operation_duration_seconds_bucket{{operation="{name}",le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f'license_operation_duration_seconds_sum{{operation="{name}"}} {histogram.sum}')
+                lines.append(f'license_operation_duration_seconds_count{{operation="{name}"}} {histogram.count}')
+
+        lines.append("# HELP license_operation_errors_total 抛出异常的操作次数")
+        lines.append("# TYPE license_operation_errors_total counter")
+        for name, _ in histograms:
+            lines.append(f'license_operation_errors_total{{operation="{name}"}} {errors.get(name, 0)}')
+
+        lines.append("# HELP license_cache_requests_total 缓存查找次数")
+        lines.append("# TYPE license_cache_requests_total counter")
+        for name in sorted(set(cache_hits) | set(cache_misses)):
+            lines.append(f'license_cache_requests_total{{cache="{name}",result="hit"}} {cache_hits.get(name, 0)}')
+            lines.append(f'license_cache_requests_total{{cache="{name}",result="miss"}} {cache_misses.get(name, 0)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 全局统计实例
+METRICS = Metrics()
+
+
+def timed(operation: str):
+    """记录被装饰函数的调用次数、耗时和异常次数"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                METRICS.observe(operation, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+
+def metrics() -> dict:
+    """全局统计的快照"""
+    return METRICS.snapshot()
@@ -18,7 +18,8 @@ class LicenseStatus(Enum):
 
 class License:
     def __init__(self, license_key: str, license_type: LicenseType, start_date: datetime, end_date: datetime, 
-                 product_id: str, user_info: dict = None, status: LicenseStatus = LicenseStatus.PENDING):
+                 product_id: str, user_info: dict = None, status: LicenseStatus = LicenseStatus.PENDING,
+                 created_at: datetime = None):
         self.license_key = license_key
         self.license_type = license_type
         self.start_date = start_date
@@ -26,8 +27,7 @@ class License:
         self.product_id = product_id
         self.user_info = user_info or {}
         self.status = status
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        self.created_at = self.updated_at = created_at or datetime.now()
         self.activation_count = 0
         self.last_used = None
 
@@ -54,23 +54,31 @@ class License:
             start_date=datetime.fromisoformat(data['start_date']),
             end_date=datetime.fromisoformat(data['end_date']),
             product_id=data['product_id'],
-            user_info=data.get('user_info', {})
+            user_info=data.get('user_info', {}),
+            created_at=datetime.fromisoformat(data['created_at']) if data.get('created_at') else None
         )
         license.status = LicenseStatus(data.get('status', LicenseStatus.PENDING.value))
-        license.created_at = datetime.fromisoformat(data.get('created_at', datetime.now().isoformat()))
-        license.updated_at = datetime.fromisoformat(data.get('updated_at', datetime.now().isoformat()))
+        if data.get('updated_at'):
+            license.updated_at = datetime.fromisoformat(data['updated_at'])
         license.activation_count = data.get('activation_count', 0)
         license.last_used = datetime.fromisoformat(data['last_used']) if data.get('last_used') else None
         return license
 
 
 class AuditLog:
-    def __init__(self, action: str, license_key: str, user_id: str, details: dict = None):
+    def __init__(self, action: str, license_key: str, user_id: str, details: dict = None,
+                 timestamp: datetime = None):
         self.action = action
         self.license_key = license_key
         self.user_id = user_id
         self.details = details or {}
-        self.timestamp = datetime.now()
+        self.timestamp = timestamp or datetime.now()
+        self.id = None  # 所在分区表中的行ID，用于分页游标
+
+    @property
+    def cursor(self) -> str:
+        """分页游标，传给 get_license_usage_history 的 cursor 参数获取下一页"""
+        return f"{self.timestamp.isoformat()}|{self.id}"
 
     def to_dict(self) -> dict:
         return {
@@ -87,7 +95,8 @@ class AuditLog:
             action=data['action'],
             license_key=data['license_key'],
             user_id=data['user_id'],
-            details=data.get('details', {})
+            details=data.get('details', {}),
+            timestamp=datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None
         )
-        log.timestamp = datetime.fromisoformat(data.get('timestamp', datetime.now().isoformat()))
+        log.id = data.get('id')
         return log
\ No newline at end of file
@@ -0,0 +1,21 @@
+import multiprocessing
+from collections import deque
+
+
+def parallel_map(func, items, workers: int):
+    """按顺序返回 func(item) 的结果；workers > 1 时在多个进程中执行
+
+    最多同时提交 2 * workers 个任务，主进程处理较慢时不会积压大量结果。
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    with multiprocessing.get_context().Pool(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
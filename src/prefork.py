@@ -0,0 +1,529 @@
+import os
+import sys
+import time
+import socket
+import struct
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from .models import License, LicenseStatus, AuditLog
+from .license_snapshot import (LicenseSnapshot, HEADER, SLOT, DIGEST_SIZE, key_digest, table_slots, fill_table,
+                               encode_products, finish_snapshot)
+from .license_validator import LicenseValidator
+from .rate_limiter import RateLimiter
+from .server import LicenseServer
+from .sqlite_repository import SQLiteLicenseRepository
+from .sharded_repository import ShardedSQLiteRepository
+from .clock import CoarseClock, SYSTEM_CLOCK
+
+# 控制块：代数（奇数表示正在发布）、快照共享内存名、吊销集合共享内存名
+STATE = struct.Struct('<Q32s32s')
+# 吊销集合头部：槽位数、已登记数量
+REVOCATION_HEADER = struct.Struct('<QQ')
+_EMPTY_DIGEST = bytes(DIGEST_SIZE)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """按名称打开已存在的共享内存；由创建者负责删除，打开方不登记到资源跟踪器"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+class RevocationSet:
+    """共享内存中的吊销密钥集合
+
+    开放寻址哈希表，每个槽位保存密钥摘要，全零表示空槽位。
+    只有监督进程写入，工作进程只读：写了一半的槽位与任何完整摘要都不相等，
+    读方最多暂时看不到正在登记的密钥，不会误判。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.capacity, _ = REVOCATION_HEADER.unpack_from(shm.buf, 0)
+        self._mask = self.capacity - 1
+
+    @classmethod
+    def create(cls, capacity: int = 65536) -> 'RevocationSet':
+        """创建空集合，capacity 向上取整为2的幂"""
+        slots = 1
+        while slots < capacity:
+            slots *= 2
+        shm = shared_memory.SharedMemory(create=True, size=REVOCATION_HEADER.size + slots * DIGEST_SIZE)
+        REVOCATION_HEADER.pack_into(shm.buf, 0, slots, 0)
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> 'RevocationSet':
+        return cls(_attach(name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def full(self) -> bool:
+        """装载因子达到0.5时应重建快照并换用新的集合"""
+        return len(self) * 2 >= self.capacity
+
+    def add(self, license_key: str) -> bool:
+        """登记一个吊销的密钥，已存在时返回False"""
+        digest = key_digest(license_key)
+        slot = self._find(digest)
+        offset = REVOCATION_HEADER.size + slot * DIGEST_SIZE
+        if self.shm.buf[offset:offset + DIGEST_SIZE] == digest:
+            return False
+        self.shm.buf[offset:offset + DIGEST_SIZE] = digest
+        REVOCATION_HEADER.pack_into(self.shm.buf, 0, self.capacity, len(self) + 1)
+        return True
+
+    def __contains__(self, license_key: str) -> bool:
+        digest = key_digest(license_key)
+        offset = REVOCATION_HEADER.size + self._find(digest) * DIGEST_SIZE
+        return self.shm.buf[offset:offset + DIGEST_SIZE] == digest
+
+    def __len__(self) -> int:
+        return REVOCATION_HEADER.unpack_from(self.shm.buf, 0)[1]
+
+    def _find(self, digest: bytes) -> int:
+        """返回摘要所在的槽位，不存在时返回探测到的第一个空槽位"""
+        view = self.shm.buf
+        slot = int.from_bytes(digest[:8], 'little') & self._mask
+        while True:
+            offset = REVOCATION_HEADER.size + slot * DIGEST_SIZE
+            current = view[offset:offset + DIGEST_SIZE]
+            if current == digest or current == _EMPTY_DIGEST:
+                return slot
+            slot = (slot + 1) & self._mask
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedState:
+    """发布当前快照和吊销集合的控制块
+
+    发布时先把代数改为奇数，写入共享内存名后再改为偶数；
+    读方在前后两次读到相同的偶数代数时才采用读到的名称。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+
+    @classmethod
+    def create(cls) -> 'SharedState':
+        shm = shared_memory.SharedMemory(create=True, size=STATE.size)
+        STATE.pack_into(shm.buf, 0, 0, b'', b'')
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedState':
+        return cls(_attach(name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def generation(self) -> int:
+        return struct.unpack_from('<Q', self.shm.buf, 0)[0]
+
+    def publish(self, snapshot_name: str, revocations_name: str) -> int:
+        """发布新的共享内存名，返回新的代数"""
+        generation = self.generation()
+        struct.pack_into('<Q', self.shm.buf, 0, generation + 1)
+        STATE.pack_into(self.shm.buf, 0, generation + 1, snapshot_name.encode(), revocations_name.encode())
+        struct.pack_into('<Q', self.shm.buf, 0, generation + 2)
+        return generation + 2
+
+    def read(self) -> tuple[int, str, str]:
+        """返回 (代数, 快照共享内存名, 吊销集合共享内存名)；尚未发布时名称为空"""
+        while True:
+            generation, snapshot_name, revocations_name = STATE.unpack_from(self.shm.buf, 0)
+            if generation % 2 == 0 and self.generation() == generation:
+                return generation, snapshot_name.rstrip(b'\0').decode(), revocations_name.rstrip(b'\0').decode()
+            time.sleep(0)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedStateRepository:
+    """工作进程使用的许可证仓库，读取监督进程发布的共享内存
+
+    每次查询只比较一次控制块的代数，代数变化时切换到新的快照和吊销集合。
+    设置 writer（工作进程自己打开的数据库）后，设备激活在数据库中登记并检查上限，
+    验证事件与 LicenseManager 一样按 aggregate_validations 按天聚合计数或逐条写入审计日志；
+    快照中的许可证不含 user_info 和使用记录，不能整条写回，因此使用次数在数据库中原子累加。
+    未设置 writer 时是只读副本，不记录也不检查。
+    """
+
+    def __init__(self, state_name: str, writer=None, max_activation_count: int = None,
+                 aggregate_validations: bool = True, clock=SYSTEM_CLOCK):
+        self.state = SharedState.attach(state_name)
+        self.writer = writer
+        self.max_activation_count = max_activation_count
+        self.aggregate_validations = aggregate_validations
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._generation = None
+        self._current = None
+        # 上一代的共享内存可能仍有查询在使用，下次切换时再关闭
+        self._retired = []
+
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证，吊销集合中的密钥视为已吊销"""
+        snapshot, revocations, _ = self._refresh()
+        if snapshot is None:
+            return None
+        license = snapshot.get_license(license_key)
+        if license is not None and license_key in revocations:
+            license.status = LicenseStatus.REVOKED
+        return license
+
+    def register_activation(self, license_key: str, fingerprint: str) -> bool:
+        """在数据库中登记设备激活，已达到上限时返回False"""
+        if self.writer is None or self.max_activation_count is None:
+            return True
+        return self.writer.add_activation(license_key, fingerprint, self.max_activation_count, self.clock.now())
+
+    def record_validation(self, license: License, machine_info: dict = None):
+        """累加使用次数，并累加按天的验证计数或写入一条验证审计日志"""
+        if self.writer is None:
+            return
+        machine_info = machine_info or {}
+        timestamp = license.last_used or self.clock.now()
+        log = None
+        if not self.aggregate_validations:
+            log = AuditLog(action="验证许可证", license_key=license.license_key,
+                           user_id=machine_info.get('user_id', 'unknown'),
+                           details={"machine_info": machine_info}, timestamp=timestamp)
+        self.writer.record_usage(license.license_key, machine_info, timestamp, log)
+
+    def update_license(self, license: License) -> bool:
+        """只读副本不能修改许可证"""
+        return False
+
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """通过 writer 写入审计日志，只读副本不写"""
+        if self.writer is not None:
+            self.writer.add_audit_logs([AuditLog(action=action, license_key=license_key, user_id=user_id,
+                                                 details=details, timestamp=self.clock.now())])
+
+    def close(self):
+        with self._lock:
+            self._close_retired()
+            if self._current is not None:
+                self._close(self._current)
+                self._current = None
+        self.state.close()
+        if self.writer is not None:
+            self.writer.close()
+
+    def _refresh(self) -> tuple:
+        if self.state.generation() == self._generation:
+            return self._current
+        with self._lock:
+            while True:
+                generation, snapshot_name, revocations_name = self.state.read()
+                if generation == self._generation:
+                    return self._current
+                if not snapshot_name:
+                    return None, None, None
+                try:
+                    snapshot_shm = _attach(snapshot_name)
+                except FileNotFoundError:
+                    # 读到名称后监督进程又发布了新的一代，旧的已被删除
+                    continue
+                try:
+                    revocations = RevocationSet.attach(revocations_name)
+                except FileNotFoundError:
+                    snapshot_shm.close()
+                    continue
+                break
+
+            self._close_retired()
+            if self._current is not None:
+                self._retired.append(self._current)
+            self._current = (LicenseSnapshot.from_buffer(snapshot_shm.buf), revocations, snapshot_shm)
+            self._generation = generation
+            return self._current
+
+    def _close_retired(self):
+        for state in self._retired:
+            self._close(state)
+        self._retired = []
+
+    @staticmethod
+    def _close(state: tuple):
+        snapshot, revocations, snapshot_shm = state
+        snapshot.close()
+        try:
+            revocations.close()
+            snapshot_shm.close()
+        except BufferError:
+            # 仍有查询持有切片，由垃圾回收释放
+            pass
+
+
+# 共享内存快照中为产品表预留的空间，超出时才换用更大的共享内存并复制一次
+PRODUCT_TABLE_RESERVE = 64 * 1024
+
+
+def _build_shared_snapshot(licenses, capacity: int) -> tuple:
+    """在新建的共享内存中直接构建快照，返回 (共享内存, 许可证数量)
+
+    哈希表大小按 capacity 预先确定，槽位逐条写入共享内存，不在监督进程中暂存整张表。
+    新建的共享内存内容为零，即全部是空槽位。
+    """
+    slot_count = table_slots(capacity)
+    products_offset = HEADER.size + slot_count * SLOT.size
+    snapshot_shm = shared_memory.SharedMemory(create=True, size=products_offset + PRODUCT_TABLE_RESERVE)
+    try:
+        count, products = fill_table(snapshot_shm.buf, licenses, slot_count)
+        product_table = encode_products(products)
+        if len(product_table) > PRODUCT_TABLE_RESERVE:
+            larger = shared_memory.SharedMemory(create=True, size=products_offset + len(product_table))
+            larger.buf[:products_offset] = snapshot_shm.buf[:products_offset]
+            snapshot_shm.close()
+            snapshot_shm.unlink()
+            snapshot_shm = larger
+        finish_snapshot(snapshot_shm.buf, slot_count, count, product_table)
+    except BaseException:
+        snapshot_shm.close()
+        snapshot_shm.unlink()
+        raise
+    return snapshot_shm, count
+
+
+def _writer_spec(manager) -> dict:
+    """工作进程打开自己的数据库连接所需的参数；无法跨进程共享的后端（如内存后端）返回None"""
+    repository = manager.repository
+    if isinstance(repository, ShardedSQLiteRepository):
+        shards = repository.shards
+    elif isinstance(repository, SQLiteLicenseRepository):
+        shards = [repository]
+    else:
+        return None
+    limited = manager.machine_fingerprint_enabled and manager.max_activation_count is not None
+    return {
+        'paths': [shard.db_path for shard in shards],
+        # 与监督进程相同的表结构配置，工作进程打开数据库时不会改动表结构版本
+        'options': {
+            'audit_retention_months': shards[0].audit_store.retention_months,
+            'indexed_user_fields': shards[0].user_info_index.fields,
+            'full_text_search': shards[0].user_info_index.full_text,
+        },
+        'max_activation_count': manager.max_activation_count if limited else None,
+        'aggregate_validations': manager.aggregate_validations,
+    }
+
+
+def _open_writer(spec: dict, pool_size: int):
+    paths = spec['paths']
+    if len(paths) == 1:
+        return SQLiteLicenseRepository(paths[0], pool_size=pool_size, **spec['options'])
+    return ShardedSQLiteRepository(paths, pool_size=pool_size, **spec['options'])
+
+
+def _worker_main(sock: socket.socket, state_name: str, secret_key: str, threads: int, rate_limit: int,
+                 server_options: dict, writer_spec: dict = None):
+    """工作进程入口：在共享的监听套接字上运行验证服务"""
+    clock = CoarseClock(resolution=1.0)
+    if writer_spec is None:
+        repository = SharedStateRepository(state_name, clock=clock)
+    else:
+        repository = SharedStateRepository(state_name, writer=_open_writer(writer_spec, threads),
+                                           max_activation_count=writer_spec['max_activation_count'],
+                                           aggregate_validations=writer_spec['aggregate_validations'], clock=clock)
+    validator = LicenseValidator(secret_key, clock=clock)
+    validator.set_license_repository(repository)
+    rate_limiter = RateLimiter(rate=rate_limit, period=60) if rate_limit > 0 else None
+    if rate_limiter is not None:
+        validator.set_rate_limiter(rate_limiter)
+    server = LicenseServer(validator, sock=sock, max_workers=threads, rate_limiter=rate_limiter, **server_options)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        repository.close()
+
+
+class PreforkSupervisor:
+    """预派生多个验证服务进程，并向它们发布共享的许可证状态
+
+    监督进程创建监听套接字，启动 processes 个工作进程共同接受连接，
+    每个进程拥有独立的解释器和 GIL，验证吞吐量随 CPU 核数增长。
+    许可证以 LicenseSnapshot 格式放在一块共享内存中，所有工作进程共用一份；
+    sync() 读取变更日志，新吊销的密钥立即写入共享的吊销集合，
+    其他变更（新建、续期、过期等）最多每 snapshot_interval 秒重建一次快照。
+    run() 定期执行 sync() 并重启意外退出的工作进程。
+
+    SQLite 和分片后端下，每个工作进程另外打开自己的数据库连接，
+    在数据库中登记设备激活并检查上限，验证事件按管理器的 aggregate_validations
+    设置聚合计数或逐条写入审计日志；其他后端无法跨进程写入，开启设备激活上限
+    或逐条审计时拒绝启动。
+    限流和 /metrics 指标按进程分别统计。
+    """
+
+    def __init__(self, manager, secret_key: str, processes: int = None, host: str = '127.0.0.1',
+                 port: int = 8080, threads: int = 2, rate_limit: int = 0, poll_interval: float = 1.0,
+                 snapshot_interval: float = 60.0, revocation_capacity: int = 65536, server_options: dict = None,
+                 clock=time.monotonic):
+        self.manager = manager
+        self.secret_key = secret_key
+        self.writer_spec = _writer_spec(manager)
+        if self.writer_spec is None and manager.machine_fingerprint_enabled and manager.max_activation_count is not None:
+            raise ValueError("当前存储后端无法由工作进程写入，预派生模式下无法检查设备激活上限")
+        if self.writer_spec is None and not manager.aggregate_validations:
+            raise ValueError("当前存储后端无法由工作进程写入，预派生模式下无法记录验证审计日志")
+        self.processes = processes or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.rate_limit = rate_limit
+        self.poll_interval = poll_interval
+        self.snapshot_interval = snapshot_interval
+        self.revocation_capacity = revocation_capacity
+        self.server_options = server_options or {}
+        self.restarts = 0
+        self._clock = clock
+        self._context = multiprocessing.get_context()
+        self._state = SharedState.create()
+        self._snapshot_shm = None
+        self._revocations = None
+        self._published_at = None
+        self._dirty = False
+        self._seq = 0
+        self._sock = None
+        self._workers = []
+        self._stopping = threading.Event()
+
+    @property
+    def state_name(self) -> str:
+        """控制块的共享内存名，工作进程据此打开 SharedStateRepository"""
+        return self._state.name
+
+    def publish_snapshot(self) -> int:
+        """从仓库重建快照并换用新的空吊销集合，返回快照中的许可证数量"""
+        # 快照反映读取时的状态，之前的变更无需再处理
+        self._read_changes(collect=False)
+        repository = self.manager.repository
+        snapshot_shm, count = _build_shared_snapshot(repository.iter_licenses(), repository.get_statistics()['total'])
+        revocations = RevocationSet.create(self.revocation_capacity)
+        self._state.publish(snapshot_shm.name, revocations.name)
+
+        # 已打开旧共享内存的工作进程仍可继续读取，删除的只是名称
+        if self._snapshot_shm is not None:
+            self._release(self._snapshot_shm, self._revocations)
+        self._snapshot_shm = snapshot_shm
+        self._revocations = revocations
+        self._published_at = self._clock()
+        self._dirty = False
+        return count
+
+    def sync(self) -> dict:
+        """处理变更日志，返回本次登记的吊销数量以及是否重建了快照"""
+        if self._snapshot_shm is None:
+            self.publish_snapshot()
+            return {'revoked': 0, 'republished': True}
+
+        revoked = 0
+        rebuild = False
+        for change in self._read_changes():
+            if change['status'] == LicenseStatus.REVOKED:
+                revoked += self._revocations.add(change['license_key'])
+                rebuild = rebuild or self._revocations.full
+            elif change['license_key'] in self._revocations:
+                # 吊销被撤销，只有重建快照才能移除
+                rebuild = True
+            else:
+                self._dirty = True
+
+        if rebuild or (self._dirty and self._clock() - self._published_at >= self.snapshot_interval):
+            self.publish_snapshot()
+            return {'revoked': revoked, 'republished': True}
+        return {'revoked': revoked, 'republished': False}
+
+    def start(self) -> int:
+        """发布初始状态、创建监听套接字并启动工作进程，返回实际端口"""
+        self.publish_snapshot()
+        self._sock = socket.create_server((self.host, self.port), backlog=1024)
+        self.port = self._sock.getsockname()[1]
+        self._workers = [self._spawn() for _ in range(self.processes)]
+        return self.port
+
+    def check_workers(self) -> int:
+        """重启已退出的工作进程，返回重启的数量"""
+        restarted = 0
+        for i, worker in enumerate(self._workers):
+            if not worker.is_alive() and not self._stopping.is_set():
+                worker.join()
+                self._workers[i] = self._spawn()
+                restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def run(self):
+        """启动后持续监督，直到调用 stop()"""
+        if not self._workers:
+            self.start()
+        while not self._stopping.wait(self.poll_interval):
+            self.check_workers()
+            self.sync()
+
+    def stop(self, timeout: float = 5.0):
+        """停止工作进程并删除共享内存"""
+        self._stopping.set()
+        for worker in self._workers:
+            worker.terminate()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._snapshot_shm is not None:
+            self._release(self._snapshot_shm, self._revocations)
+            self._snapshot_shm = self._revocations = None
+        self._state.close()
+        self._state.unlink()
+
+    def worker_pids(self) -> list[int]:
+        return [worker.pid for worker in self._workers]
+
+    def _spawn(self):
+        worker = self._context.Process(
+            target=_worker_main,
+            args=(self._sock, self.state_name, self.secret_key, self.threads, self.rate_limit, self.server_options,
+                  self.writer_spec),
+            name="license-worker",
+            daemon=True
+        )
+        worker.start()
+        return worker
+
+    def _read_changes(self, collect: bool = True) -> list[dict]:
+        """读取上次处理之后的全部变更；collect 为False时只推进序号"""
+        changes = []
+        while True:
+            page = self.manager.changes_since(self._seq, limit=10000)
+            if not page:
+                return changes
+            if collect:
+                changes.extend(page)
+            self._seq = page[-1]['seq']
+
+    @staticmethod
+    def _release(snapshot_shm: shared_memory.SharedMemory, revocations: RevocationSet):
+        snapshot_shm.close()
+        snapshot_shm.unlink()
+        revocations.close()
+        revocations.unlink()
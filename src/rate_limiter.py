@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """按键限流的令牌桶
+
+    每个键（API密钥、客户端IP、许可证密钥等）一个令牌桶，每 period 秒补充
+    rate 个令牌，最多积累 burst 个。桶按最近访问顺序保存在 OrderedDict 中，
+    每次检查只触及相关的桶和最久未访问的桶，开销为 O(1)。
+    空闲到足以补满的桶与新桶等价，会被顺带清除；桶的总数不超过 max_keys。
+    """
+
+    def __init__(self, rate: int = 100, period: float = 60.0, burst: int = None, max_keys: int = 100000,
+                 clock=time.monotonic):
+        if rate <= 0 or period <= 0:
+            raise ValueError("rate 和 period 必须大于0")
+        self.rate = rate
+        self.period = period
+        self.burst = burst if burst is not None else rate
+        self.max_keys = max_keys
+        self._clock = clock
+        self._refill_per_second = rate / period
+        # 空闲超过该时长的桶一定已补满
+        self._idle_after = self.burst / self._refill_per_second
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, *keys, cost: float = 1) -> bool:
+        """所有键都有足够令牌时扣除并返回True，否则不扣除并返回False"""
+        now = self._clock()
+        with self._lock:
+            self._evict_idle(now)
+            levels = []
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    tokens = self.burst
+                else:
+                    tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self._refill_per_second)
+                if tokens < cost:
+                    return False
+                levels.append(tokens)
+
+            for key, tokens in zip(keys, levels):
+                self._buckets[key] = [tokens - cost, now]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict_idle(self, now: float):
+        """从最久未访问的一端清除已补满的桶，每次最多清除两个以保持 O(1)"""
+        for _ in range(2):
+            if not self._buckets:
+                return
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < self._idle_after:
+                return
+            del self._buckets[key]
@@ -0,0 +1,83 @@
+import sqlite3
+from datetime import datetime, timedelta
+from .models import License, LicenseType, LicenseStatus
+from .license_generator import LicenseGenerator
+
+
+class RenewalStore:
+    """许可证续期关系
+
+    续期签发新的密钥，旧密钥被吊销；每个旧密钥一行，记录取代它的新密钥，
+    客户端凭旧密钥即可查到续期后的密钥。
+    """
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """创建续期关系表"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS license_renewals (
+                old_key TEXT PRIMARY KEY,
+                new_key TEXT NOT NULL,
+                renewed_at TEXT NOT NULL
+            )
+        ''')
+
+    def insert(self, conn: sqlite3.Connection, links: list[tuple[str, str]], now: datetime):
+        """批量登记 (旧密钥, 新密钥)"""
+        renewed_at = now.isoformat()
+        conn.executemany(
+            "INSERT INTO license_renewals (old_key, new_key, renewed_at) VALUES (?, ?, ?)",
+            [(old_key, new_key, renewed_at) for old_key, new_key in links]
+        )
+
+    def lookup(self, conn: sqlite3.Connection, license_key: str) -> str:
+        """返回取代该密钥的新密钥，没有续期过则返回None"""
+        row = conn.execute(
+            "SELECT new_key FROM license_renewals WHERE old_key = ?", (license_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+def renewed_end_date(license: License, now: datetime, extend_by: timedelta) -> datetime:
+    """续期后的到期时间：从原到期时间顺延；已过期的从 now 起算"""
+    return max(license.end_date, now) + extend_by
+
+
+_generators = {}
+
+
+def encrypt_renewals(spec: tuple) -> list[str]:
+    """在工作进程中为一批续期签发新密钥
+
+    spec 为 (secret_key, [(类型名称, 开始时间, 新的到期时间, 产品ID), ...])，
+    只传递加密所需的字段，进程间序列化的数据量与密钥数量成正比。
+    """
+    secret_key, terms = spec
+    generator = _generators.get(secret_key)
+    if generator is None:
+        generator = _generators[secret_key] = LicenseGenerator(secret_key)
+    return [
+        generator.generate_license_key(
+            license_type=LicenseType[license_type],
+            start_date=start_date,
+            end_date=end_date,
+            product_id=product_id
+        ).license_key
+        for license_type, start_date, end_date, product_id in terms
+    ]
+
+
+def renewed_license(license: License, license_key: str, end_date: datetime, now: datetime) -> License:
+    """续期后的新许可证：沿用原有的类型、产品、开始时间和用户信息
+
+    待激活的保持待激活，其余状态恢复为激活。
+    """
+    return License(
+        license_key=license_key,
+        license_type=license.license_type,
+        start_date=license.start_date,
+        end_date=end_date,
+        product_id=license.product_id,
+        user_info=license.user_info,
+        status=LicenseStatus.PENDING if license.status == LicenseStatus.PENDING else LicenseStatus.ACTIVE,
+        created_at=now
+    )
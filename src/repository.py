@@ -0,0 +1,129 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from .models import License, LicenseStatus, AuditLog
+
+# 可被过期清理标记为过期的状态
+SWEEPABLE_STATUSES = (LicenseStatus.ACTIVE, LicenseStatus.PENDING)
+
+# 批量保存时密钥已存在的处理方式：报错、跳过、覆盖
+CONFLICT_POLICIES = ('error', 'skip', 'replace')
+
+
+class LicenseRepository(ABC):
+    """许可证存储后端接口
+
+    LicenseManager 通过该接口访问存储，不关心具体实现。
+    get_license_by_key / update_license / add_audit_log 与 LicenseValidator
+    所需的仓库接口一致，因此任何实现都可以直接用于在线验证。
+    """
+
+    # 许可证
+
+    @abstractmethod
+    def save_license(self, license: License):
+        """保存新许可证"""
+
+    @abstractmethod
+    def save_licenses(self, licenses: list[License], on_conflict: str = 'error') -> int:
+        """在一个事务中批量保存许可证，返回写入的数量
+
+        on_conflict 为 'error' 时任一密钥已存在则整批不生效，
+        'skip' 跳过已存在的密钥，'replace' 用新数据覆盖已存在的许可证。
+        """
+
+    @abstractmethod
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证，不存在时返回None"""
+
+    @abstractmethod
+    def update_license(self, license: License) -> bool:
+        """更新许可证，返回是否找到该许可证"""
+
+    @abstractmethod
+    def get_all_licenses(self, product_id: str = None, status: LicenseStatus = None) -> list[License]:
+        """获取所有许可证，可以按产品ID和状态过滤"""
+
+    @abstractmethod
+    def iter_licenses(self, chunk_size: int = 1000, product_id: str = None, status: LicenseStatus = None):
+        """按插入顺序逐条产出许可证，每次只从存储读取一个分块，可以按产品ID和状态过滤"""
+
+    @abstractmethod
+    def get_statistics(self) -> dict:
+        """许可证统计：总数、按状态和按类型的数量、累计使用次数"""
+
+    @abstractmethod
+    def search_licenses(self, text: str = None, product_id: str = None, status: LicenseStatus = None,
+                        limit: int = None, **fields) -> list[License]:
+        """按 user_info 中已建立索引的字段或全文检索查找许可证"""
+
+    @abstractmethod
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> list[dict]:
+        """按序号升序返回大于 seq 的许可证变更，用于增量同步"""
+
+    # 续期
+
+    @abstractmethod
+    def save_renewals(self, renewals: list[tuple[str, License]], logs: list[AuditLog], now: datetime) -> int:
+        """写入续期后的新许可证，吊销被取代的旧许可证并登记续期关系和审计日志，返回续期数量"""
+
+    @abstractmethod
+    def get_superseded_by(self, license_key: str) -> str:
+        """返回取代该许可证的新密钥，没有续期过则返回None"""
+
+    # 过期清理
+
+    @abstractmethod
+    def expire_licenses(self, now: datetime, chunk_size: int = 500) -> int:
+        """将已到期的激活/待激活许可证标记为过期，返回标记数量"""
+
+    @abstractmethod
+    def get_next_expiration(self) -> datetime:
+        """获取下一个待过期许可证的到期时间，没有则返回None"""
+
+    # 审计日志
+
+    @abstractmethod
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """添加审计日志"""
+
+    @abstractmethod
+    def add_audit_logs(self, logs: list[AuditLog]):
+        """批量写入已构造好的审计日志"""
+
+    @abstractmethod
+    def iter_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                           actions: list[str] = None, limit: int = None, cursor: str = None):
+        """按时间倒序逐条产出许可证的审计日志"""
+
+    @abstractmethod
+    def archive_audit_logs(self, archive_dir: str, now: datetime = None) -> list[str]:
+        """归档超过保留期的审计日志，返回归档文件路径"""
+
+    # 验证计数与设备激活
+
+    @abstractmethod
+    def record_usage(self, license_key: str, machine_info: dict, timestamp: datetime, log: AuditLog = None):
+        """累加许可证使用次数并记录按天聚合的验证计数
+
+        传入 log 时改为在同一事务中写入这条审计日志，不累加按天计数。
+        """
+
+    @abstractmethod
+    def get_validation_counters(self, license_key: str, since: datetime = None,
+                                until: datetime = None) -> list[dict]:
+        """获取许可证按天、按机器聚合的验证次数"""
+
+    @abstractmethod
+    def add_activation(self, license_key: str, fingerprint: str, max_count: int, now: datetime) -> bool:
+        """登记设备激活，超过上限时返回False"""
+
+    @abstractmethod
+    def get_activations(self, license_key: str) -> list[dict]:
+        """获取许可证已激活的设备列表"""
+
+    @abstractmethod
+    def remove_activation(self, license_key: str, fingerprint: str) -> bool:
+        """移除一台设备的激活记录"""
+
+    def close(self):
+        """释放存储占用的资源"""
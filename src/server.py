@@ -0,0 +1,350 @@
+import json
+import signal
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+from .models import LicenseStatus
+from .license_manager import LicenseManager
+from .license_validator import RATE_LIMITED_MESSAGE, ONLINE_ERROR_PREFIX
+from .rate_limiter import RateLimiter
+from .metrics import METRICS
+from .clock import CoarseClock
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """请求无法处理，携带HTTP状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LicenseServer:
+    """基于 asyncio 的许可证在线验证服务
+
+    使用 HTTP/1.1 长连接，同一连接上流水线发送的多个请求按顺序处理和响应。
+    验证和查询都会访问数据库，统一交给容量有限的线程池执行，
+    事件循环本身只负责网络读写。
+
+    接口：
+    - POST /validate          {"license_key", "product_id", "machine_info"}
+    - POST /validate/batch    {"requests": [...]}，最多 max_batch_size 个
+    - GET  /revocation/{key}  许可证是否已被吊销
+    - GET  /health            健康检查
+    - GET  /metrics           Prometheus 文本格式的运行指标
+
+    设置 rate_limiter 后，每个请求先按客户端IP和 X-API-Key 请求头限流，
+    超限时直接返回429，不占用线程池。
+
+    验证器按许可证限流时返回429，数据库等服务端错误返回503，
+    不以 valid=false 回应，避免客户端把暂时性故障当作许可证无效；
+    批量验证中对应的条目带有 status 字段。
+    """
+
+    def __init__(self, validator, host: str = '127.0.0.1', port: int = 8080, max_workers: int = 8,
+                 max_batch_size: int = 100, max_body_size: int = 1024 * 1024, idle_timeout: float = 60,
+                 rate_limiter=None, sock=None):
+        self.validator = validator
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_body_size = max_body_size
+        self.idle_timeout = idle_timeout
+        self.rate_limiter = rate_limiter
+        # 预派生模式下由监督进程创建监听套接字，多个工作进程共享
+        self.sock = sock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="license-server")
+        self._server = None
+
+    async def start(self) -> int:
+        """开始监听，返回实际端口（port 为0时由系统分配）"""
+        if self.sock is not None:
+            self._server = await asyncio.start_server(self._handle_connection, sock=self.sock)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        """启动并持续提供服务"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """停止监听并关闭线程池"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的所有请求，直到对方关闭或要求关闭"""
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else None
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                if isinstance(request, HTTPError):
+                    # 请求格式错误时无法确定下一个请求的起点，响应后关闭连接
+                    self._write_response(writer, request.status, {"error": request.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+
+                method, path, headers, body, keep_alive = request
+                try:
+                    self._check_rate_limit(client_ip, headers.get('x-api-key'))
+                    status, payload = 200, await self._dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception:
+                    # 异常信息可能包含SQL语句或文件路径，只写入日志，不返回给客户端
+                    logger.exception("处理请求 %s %s 时出错", method, path)
+                    status, payload = 500, {"error": "服务器内部错误"}
+
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """读取一个请求，返回 (method, path, headers, body, keep_alive)；连接关闭时返回None"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            return HTTPError(400, "请求不完整")
+        except asyncio.LimitOverrunError:
+            return HTTPError(431, "请求头过大")
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            return HTTPError(400, "请求行格式错误")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = connection != 'close'
+        else:
+            keep_alive = connection == 'keep-alive'
+
+        if 'transfer-encoding' in headers:
+            return HTTPError(411, "不支持分块传输，请提供 Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return HTTPError(400, "Content-Length 无效")
+        if length < 0:
+            return HTTPError(400, "Content-Length 无效")
+        if length > self.max_body_size:
+            return HTTPError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), unquote(target.split('?', 1)[0]), headers, body, keep_alive
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        """按路径分发请求，返回JSON对象或纯文本"""
+        if path == '/health':
+            self._require_method(method, 'GET')
+            return {"status": "ok"}
+        if path == '/metrics':
+            self._require_method(method, 'GET')
+            return METRICS.prometheus()
+        if path == '/validate':
+            self._require_method(method, 'POST')
+            return await self._run(self._validate, self._parse_json(body))
+        if path == '/validate/batch':
+            self._require_method(method, 'POST')
+            requests = self._parse_json(body).get('requests')
+            if not isinstance(requests, list):
+                raise HTTPError(400, "requests 必须是数组")
+            if len(requests) > self.max_batch_size:
+                raise HTTPError(413, f"单次最多验证 {self.max_batch_size} 个许可证")
+            return {"results": await self._run(lambda: [self._validate_item(item) for item in requests])}
+        if path.startswith('/revocation/'):
+            self._require_method(method, 'GET')
+            return await self._run(self._revocation_status, path[len('/revocation/'):])
+        raise HTTPError(404, "接口不存在")
+
+    def _check_rate_limit(self, client_ip: str, api_key: str):
+        """按客户端IP和API密钥限流"""
+        if self.rate_limiter is None:
+            return
+        keys = [('ip', client_ip)]
+        if api_key:
+            keys.append(('api_key', api_key))
+        if not self.rate_limiter.allow(*keys):
+            raise HTTPError(429, "请求过于频繁，请稍后再试")
+
+    async def _run(self, func, *args):
+        """在线程池中执行阻塞的数据库调用"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _validate(self, request: dict) -> dict:
+        """验证单个许可证"""
+        if not isinstance(request, dict) or not request.get('license_key') or not request.get('product_id'):
+            return {"valid": False, "message": "缺少 license_key 或 product_id"}
+        valid, message = self.validator.validate_license_online(
+            request['license_key'], request['product_id'], request.get('machine_info') or {}
+        )
+        if not valid:
+            if message == RATE_LIMITED_MESSAGE:
+                raise HTTPError(429, message)
+            if message.startswith(ONLINE_ERROR_PREFIX):
+                logger.warning("验证许可证 %s 时出错: %s", request['license_key'], message)
+                raise HTTPError(503, "验证服务暂时不可用，请稍后重试")
+        return {"license_key": request['license_key'], "valid": valid, "message": message}
+
+    def _validate_item(self, request: dict) -> dict:
+        """批量验证中的单个条目，暂时性失败不影响其他条目"""
+        try:
+            return self._validate(request)
+        except HTTPError as e:
+            return {"license_key": request['license_key'], "valid": False, "message": e.message, "status": e.status}
+
+    def _revocation_status(self, license_key: str) -> dict:
+        """查询许可证的吊销状态"""
+        license = self.validator.license_repository.get_license_by_key(license_key)
+        if license is None:
+            raise HTTPError(404, "许可证不存在")
+        return {
+            "license_key": license_key,
+            "revoked": license.status == LicenseStatus.REVOKED,
+            "status": license.status.value
+        }
+
+    @staticmethod
+    def _require_method(method: str, expected: str):
+        if method != expected:
+            raise HTTPError(405, f"仅支持 {expected} 请求")
+
+    @staticmethod
+    def _parse_json(body: bytes) -> dict:
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        return data
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            content_type = "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+
+
+def main():
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="许可证在线验证服务")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="SQLite数据库路径")
+    parser.add_argument('--secret-key', required=True, help="许可证加密密钥")
+    parser.add_argument('--host', default=settings.SERVER_HOST, help="监听地址")
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT, help="监听端口")
+    parser.add_argument('--workers', type=int, default=settings.SERVER_WORKERS, help="执行数据库操作的线程数")
+    parser.add_argument('--processes', type=int, default=settings.SERVER_PROCESSES,
+                        help="验证服务进程数，大于1时由监督进程预派生工作进程并通过共享内存发布许可证状态")
+    parser.add_argument('--snapshot-interval', type=float, default=settings.SERVER_SNAPSHOT_INTERVAL,
+                        help="预派生模式下两次重建共享快照之间的最短间隔（秒），吊销不受此限制")
+    parser.add_argument('--rate-limit', type=int, default=settings.API_RATE_LIMIT,
+                        help="每个客户端/API密钥/许可证每分钟最多请求数，0表示不限流")
+    parser.add_argument('--max-batch-size', type=int, default=settings.SERVER_MAX_BATCH_SIZE,
+                        help="批量验证接口单次最多验证的许可证数")
+    parser.add_argument('--metrics', action='store_true', default=settings.METRICS_ENABLED,
+                        help="开启运行指标统计，通过 /metrics 导出")
+    args = parser.parse_args()
+
+    if args.metrics:
+        METRICS.enable()
+    # 验证热路径使用按秒缓存的时钟
+    manager = LicenseManager.from_settings(settings, start_reservoir=False, db_path=args.db,
+                                           secret_key=args.secret_key, clock=CoarseClock(resolution=1.0))
+    if args.processes > 1:
+        _run_prefork(manager, args)
+        return
+    rate_limiter = RateLimiter(rate=args.rate_limit, period=60) if args.rate_limit > 0 else None
+    if rate_limiter is not None:
+        manager.validator.set_rate_limiter(rate_limiter)
+    server = LicenseServer(manager.validator, host=args.host, port=args.port, max_workers=args.workers,
+                           max_batch_size=args.max_batch_size, rate_limiter=rate_limiter)
+    print(f"许可证验证服务监听于 http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+def _run_prefork(manager: LicenseManager, args):
+    """多进程模式：每个工作进程运行一个 LicenseServer，监督进程负责重启和发布状态"""
+    from .prefork import PreforkSupervisor
+
+    supervisor = PreforkSupervisor(
+        manager, args.secret_key, processes=args.processes, host=args.host, port=args.port,
+        threads=args.workers, rate_limit=args.rate_limit, snapshot_interval=args.snapshot_interval,
+        server_options={'max_batch_size': args.max_batch_size}
+    )
+    port = supervisor.start()
+    # 工作进程启动后再设置：监督进程收到 SIGTERM 时与 Ctrl-C 一样清理工作进程和共享内存
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"许可证验证服务监听于 http://{args.host}:{port}（{args.processes} 个工作进程）")
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import os
+import json
+import heapq
+import hashlib
+import sqlite3
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from .models import License, LicenseStatus, AuditLog
+from .repository import LicenseRepository
+from .sqlite_repository import SQLiteLicenseRepository, row_to_license
+from .audit_store import PARTITION_PREFIX, row_to_audit_log
+
+
+def shard_index(license_key: str, shard_count: int) -> int:
+    """根据许可证密钥的哈希计算分片序号，跨进程稳定"""
+    digest = hashlib.blake2b(license_key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def shard_paths(base_path: str, shard_count: int) -> list[str]:
+    """由基础路径生成分片文件路径，例如 licenses.db -> licenses.shard0.db"""
+    root, ext = os.path.splitext(base_path)
+    return [f"{root}.shard{i}{ext or '.db'}" for i in range(shard_count)]
+
+
+class ShardedSQLiteRepository(LicenseRepository):
+    """按许可证密钥哈希分片的SQLite存储
+
+    许可证及其审计日志、计数和激活记录存放在同一个分片中；
+    单个密钥的操作直接路由到对应分片，每个分片拥有独立的连接池和写锁，
+    全量查询和统计在所有分片上并行执行后合并。
+    """
+
+    def __init__(self, paths: list[str], pool_size: int = 4, **repository_options):
+        if not paths:
+            raise ValueError("至少需要一个分片")
+        self.shards = [
+            SQLiteLicenseRepository(path, pool_size=pool_size, **repository_options) for path in paths
+        ]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="license-shard")
+
+    @classmethod
+    def from_base_path(cls, base_path: str, shard_count: int, **options) -> 'ShardedSQLiteRepository':
+        """按基础路径创建 shard_count 个分片"""
+        return cls(shard_paths(base_path, shard_count), **options)
+
+    def shard_for(self, license_key: str) -> SQLiteLicenseRepository:
+        """返回许可证密钥所在的分片"""
+        return self.shards[shard_index(license_key, len(self.shards))]
+
+    def save_license(self, license: License):
+        """保存新许可证"""
+        self.shard_for(license.license_key).save_license(license)
+
+    def save_licenses(self, licenses: list[License], on_conflict: str = 'error') -> int:
+        """按分片分组后并行写入，每个分片各自一个事务"""
+        groups = defaultdict(list)
+        for license in licenses:
+            groups[shard_index(license.license_key, len(self.shards))].append(license)
+        return sum(self._gather(lambda shard, group: shard.save_licenses(group, on_conflict),
+                                [(self.shards[i], group) for i, group in groups.items()]))
+
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证"""
+        return self.shard_for(license_key).get_license_by_key(license_key)
+
+    def update_license(self, license: License) -> bool:
+        """更新许可证"""
+        return self.shard_for(license.license_key).update_license(license)
+
+    def get_all_licenses(self, product_id: str = None, status: LicenseStatus = None) -> list[License]:
+        """在所有分片上并行查询后合并，按分片顺序返回"""
+        results = self._gather(lambda shard: shard.get_all_licenses(product_id=product_id, status=status))
+        return [license for result in results for license in result]
+
+    def iter_licenses(self, chunk_size: int = 1000, product_id: str = None, status: LicenseStatus = None):
+        """依次遍历各分片的许可证"""
+        for shard in self.shards:
+            yield from shard.iter_licenses(chunk_size, product_id=product_id, status=status)
+
+    def get_statistics(self) -> dict:
+        """汇总各分片的统计结果"""
+        merged = {'total': 0, 'by_status': defaultdict(int), 'by_type': defaultdict(int), 'total_activations': 0}
+        for stats in self._gather(lambda shard: shard.get_statistics()):
+            merged['total'] += stats['total']
+            merged['total_activations'] += stats['total_activations']
+            for status, count in stats['by_status'].items():
+                merged['by_status'][status] += count
+            for license_type, count in stats['by_type'].items():
+                merged['by_type'][license_type] += count
+        merged['by_status'] = dict(merged['by_status'])
+        merged['by_type'] = dict(merged['by_type'])
+        return merged
+
+    def search_licenses(self, text: str = None, product_id: str = None, status: LicenseStatus = None,
+                        limit: int = None, **fields) -> list[License]:
+        """在所有分片上并行检索后合并"""
+        results = self._gather(lambda shard: shard.search_licenses(
+            text=text, product_id=product_id, status=status, limit=limit, **fields
+        ))
+        licenses = [license for result in results for license in result]
+        return licenses[:limit] if limit is not None else licenses
+
+    def save_renewals(self, renewals: list[tuple[str, License]], logs: list[AuditLog], now: datetime) -> int:
+        """按旧密钥所在分片分组续期
+
+        新许可证可能落在另一个分片：先在各自分片写入新许可证，
+        再在旧密钥所在分片的事务中吊销旧许可证、登记续期关系和审计日志。
+        跨分片不是原子的：某个分片登记失败时，删除该分片对应的新许可证后抛出第一个错误，
+        其余分片的续期照常生效，不会留下可用却无人引用的新密钥。
+        """
+        shard_count = len(self.shards)
+        self.save_licenses([license for _, license in renewals])
+
+        groups = defaultdict(lambda: ([], []))
+        for old_key, license in renewals:
+            groups[shard_index(old_key, shard_count)][0].append((old_key, license))
+        for log in logs:
+            groups[shard_index(log.license_key, shard_count)][1].append(log)
+
+        def link(shard, group):
+            try:
+                shard.link_renewals(*group, now)
+            except Exception as e:
+                return e
+            return None
+
+        errors = self._gather(link, [(self.shards[i], group) for i, group in groups.items()])
+        failed = [license.license_key for group, error in zip(groups.values(), errors) if error
+                  for _, license in group[0]]
+        if failed:
+            self.discard_licenses(failed)
+            raise next(error for error in errors if error)
+        return len(renewals)
+
+    def discard_licenses(self, license_keys: list[str]) -> int:
+        """按密钥所在分片删除尚未被引用的许可证"""
+        groups = defaultdict(list)
+        for license_key in license_keys:
+            groups[shard_index(license_key, len(self.shards))].append(license_key)
+        return sum(self._gather(lambda shard, group: shard.discard_licenses(group),
+                                [(self.shards[i], group) for i, group in groups.items()]))
+
+    def get_superseded_by(self, license_key: str) -> str:
+        """续期关系与旧许可证存放在同一分片"""
+        return self.shard_for(license_key).get_superseded_by(license_key)
+
+    def changes_since(self, seq=0, limit: int = 1000) -> list[dict]:
+        """合并各分片的变更日志
+
+        各分片的序号相互独立，游标是每个分片已读到的序号组成的元组，0 表示从头读取。
+        每条变更的 seq 是包含该条在内的游标，将最后一条的 seq 传回即可继续；
+        另带 shard 字段标明来源分片。同一分片内严格保持序号顺序，跨分片每次取各分片
+        下一条变更中 changed_at 最早的一条。changed_at 来自写入时的 updated_at，
+        导入或多进程并发写入时并不单调，因此跨分片只是大致按时间交错，不保证有序。
+        """
+        cursor = list(seq) if seq else [0] * len(self.shards)
+        if len(cursor) != len(self.shards):
+            raise ValueError(f"游标包含 {len(cursor)} 个序号，与分片数 {len(self.shards)} 不一致")
+        pages = self._gather(lambda shard, after: shard.changes_since(after, limit),
+                             list(zip(self.shards, cursor)))
+        # 各分片的下一条变更按 (changed_at, 分片) 放入堆中，取出一条后再放入该分片的下一条
+        heads = [(page[0]['changed_at'], i, 0) for i, page in enumerate(pages) if page]
+        heapq.heapify(heads)
+        changes = []
+        while heads and len(changes) < limit:
+            _, i, position = heapq.heappop(heads)
+            change = pages[i][position]
+            cursor[i] = change['seq']
+            changes.append(dict(change, seq=tuple(cursor), shard=i))
+            if position + 1 < len(pages[i]):
+                heapq.heappush(heads, (pages[i][position + 1]['changed_at'], i, position + 1))
+        return changes
+
+    def expire_licenses(self, now: datetime, chunk_size: int = 500) -> int:
+        """各分片并行执行过期清理"""
+        return sum(self._gather(lambda shard: shard.expire_licenses(now, chunk_size)))
+
+    def get_next_expiration(self) -> datetime:
+        """所有分片中最早的到期时间"""
+        candidates = [due for due in self._gather(lambda shard: shard.get_next_expiration()) if due]
+        return min(candidates) if candidates else None
+
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """审计日志与许可证写入同一分片"""
+        self.shard_for(license_key).add_audit_log(action, license_key, user_id, details)
+
+    def add_audit_logs(self, logs: list[AuditLog]):
+        """按许可证密钥分组后写入各分片"""
+        groups = defaultdict(list)
+        for log in logs:
+            groups[shard_index(log.license_key, len(self.shards))].append(log)
+        self._gather(lambda shard, group: shard.add_audit_logs(group),
+                     [(self.shards[i], group) for i, group in groups.items()])
+
+    def iter_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                           actions: list[str] = None, limit: int = None, cursor: str = None):
+        """许可证的审计日志只存在于其所在分片"""
+        return self.shard_for(license_key).iter_usage_history(
+            license_key, since=since, until=until, actions=actions, limit=limit, cursor=cursor
+        )
+
+    def archive_audit_logs(self, archive_dir: str, now: datetime = None) -> list[str]:
+        """各分片分别归档到 archive_dir/shardN 目录"""
+        archived = []
+        for i, shard in enumerate(self.shards):
+            archived.extend(shard.archive_audit_logs(os.path.join(archive_dir, f"shard{i}"), now))
+        return archived
+
+    def record_usage(self, license_key: str, machine_info: dict, timestamp: datetime, log: AuditLog = None):
+        """累加使用次数和验证计数"""
+        self.shard_for(license_key).record_usage(license_key, machine_info, timestamp, log)
+
+    def get_validation_counters(self, license_key: str, since: datetime = None,
+                                until: datetime = None) -> list[dict]:
+        """获取许可证按天、按机器聚合的验证次数"""
+        return self.shard_for(license_key).get_validation_counters(license_key, since, until)
+
+    def add_activation(self, license_key: str, fingerprint: str, max_count: int, now: datetime) -> bool:
+        """登记设备激活"""
+        return self.shard_for(license_key).add_activation(license_key, fingerprint, max_count, now)
+
+    def get_activations(self, license_key: str) -> list[dict]:
+        """获取许可证已激活的设备列表"""
+        return self.shard_for(license_key).get_activations(license_key)
+
+    def remove_activation(self, license_key: str, fingerprint: str) -> bool:
+        """移除一台设备的激活记录"""
+        return self.shard_for(license_key).remove_activation(license_key, fingerprint)
+
+    def close(self):
+        """关闭所有分片的连接池"""
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+    def _gather(self, func, args_list: list = None) -> list:
+        """在各分片上并行执行 func 并按分片顺序返回结果"""
+        if args_list is None:
+            args_list = [(shard,) for shard in self.shards]
+        futures = [self._executor.submit(func, *args) for args in args_list]
+        return [future.result() for future in futures]
+
+
+def reshard_database(source_paths: list[str], target_paths: list[str], chunk_size: int = 1000,
+                     progress=None) -> dict:
+    """将一个或多个SQLite数据库按密钥哈希重新分布到目标分片
+
+    复制许可证、审计日志分区、设备激活记录、验证计数和续期关系，目标文件应为空。
+    progress(table, copied) 在每个分块写入后调用。
+    """
+    target = ShardedSQLiteRepository(target_paths)
+    copied = defaultdict(int)
+    try:
+        for source_path in source_paths:
+            source = sqlite3.connect(source_path)
+            source.row_factory = sqlite3.Row
+            try:
+                _reshard_licenses(source, target, chunk_size, copied, progress)
+                _reshard_audit_logs(source, target, chunk_size, copied, progress)
+                _reshard_activations(source, target, chunk_size, copied, progress)
+                _reshard_validation_counters(source, target, chunk_size, copied, progress)
+                _reshard_renewals(source, target, chunk_size, copied, progress)
+            finally:
+                source.close()
+    finally:
+        target.close()
+    return dict(copied)
+
+
+def _copy_in_chunks(source: sqlite3.Connection, query: str, target: ShardedSQLiteRepository,
+                    write_chunk, chunk_size: int, name: str, copied: dict, progress):
+    """分块读取源数据，按分片分组后写入"""
+    cursor = source.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        groups = defaultdict(list)
+        for row in rows:
+            groups[shard_index(row['license_key'], len(target.shards))].append(row)
+        for i, group in groups.items():
+            write_chunk(target.shards[i], group)
+        copied[name] += len(rows)
+        if progress:
+            progress(name, copied[name])
+
+
+def _reshard_licenses(source, target, chunk_size, copied, progress):
+    def write(shard, rows):
+        shard.save_licenses([row_to_license(row) for row in rows])
+
+    _copy_in_chunks(source, "SELECT * FROM licenses ORDER BY id", target, write, chunk_size,
+                    'licenses', copied, progress)
+
+
+def _reshard_audit_logs(source, target, chunk_size, copied, progress):
+    def write(shard, rows):
+        shard.add_audit_logs([row_to_audit_log(row) for row in rows])
+
+    tables = [row[0] for row in source.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND (name = 'audit_logs' OR name GLOB ?) ORDER BY name",
+        (PARTITION_PREFIX + '[0-9][0-9][0-9][0-9][0-9][0-9]',)
+    )]
+    for table in tables:
+        _copy_in_chunks(source, f"SELECT * FROM {table} ORDER BY id", target, write, chunk_size,
+                        'audit_logs', copied, progress)
+
+
+def _reshard_activations(source, target, chunk_size, copied, progress):
+    if not _has_table(source, 'activations'):
+        return
+
+    def write(shard, rows):
+        with shard.connection() as conn:
+            conn.executemany(
+                '''
+                INSERT OR IGNORE INTO activations (license_key, fingerprint, first_seen, last_seen, validation_count)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                [(row['license_key'], row['fingerprint'], row['first_seen'], row['last_seen'],
+                  row['validation_count']) for row in rows]
+            )
+            conn.commit()
+
+    _copy_in_chunks(source, "SELECT * FROM activations ORDER BY id", target, write, chunk_size,
+                    'activations', copied, progress)
+
+
+def _reshard_validation_counters(source, target, chunk_size, copied, progress):
+    if not _has_table(source, 'validation_counters'):
+        return
+
+    def write(shard, rows):
+        with shard.connection() as conn:
+            for row in rows:
+                machine_info = json.loads(row['machine_info']) if row['machine_info'] else {}
+                machine_info_id = shard.validation_counters.intern_machine_info(conn, machine_info)
+                conn.execute(
+                    '''
+                    INSERT INTO validation_counters (license_key, day, machine_info_id, count, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (license_key, day, machine_info_id)
+                    DO UPDATE SET count = count + excluded.count, last_seen = max(last_seen, excluded.last_seen)
+                    ''',
+                    (row['license_key'], row['day'], machine_info_id, row['count'], row['first_seen'],
+                     row['last_seen'])
+                )
+            conn.commit()
+
+    _copy_in_chunks(
+        source,
+        '''
+        SELECT c.license_key, c.day, c.count, c.first_seen, c.last_seen, m.machine_info
+        FROM validation_counters c JOIN machine_infos m ON m.id = c.machine_info_id
+        ''',
+        target, write, chunk_size, 'validation_counters', copied, progress
+    )
+
+
+def _reshard_renewals(source, target, chunk_size, copied, progress):
+    if not _has_table(source, 'license_renewals'):
+        return
+
+    def write(shard, rows):
+        with shard.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO license_renewals (old_key, new_key, renewed_at) VALUES (?, ?, ?)",
+                [(row['license_key'], row['new_key'], row['renewed_at']) for row in rows]
+            )
+            conn.commit()
+
+    # 续期关系与旧许可证存放在同一分片，按旧密钥路由
+    _copy_in_chunks(
+        source, "SELECT old_key AS license_key, new_key, renewed_at FROM license_renewals ORDER BY old_key",
+        target, write, chunk_size, 'license_renewals', copied, progress
+    )
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    """判断数据库中是否存在指定表"""
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return conn.execute(query, (name,)).fetchone() is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将许可证数据库重新分片")
+    parser.add_argument('sources', nargs='+', help="源数据库文件（单库或旧的分片文件）")
+    parser.add_argument('--target', required=True, help="目标基础路径，例如 data/licenses.db")
+    parser.add_argument('--shards', type=int, required=True, help="目标分片数")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="每批复制的行数")
+    args = parser.parse_args()
+
+    targets = shard_paths(args.target, args.shards)
+    existing = [path for path in targets if os.path.exists(path)]
+    if existing:
+        parser.error(f"目标分片文件已存在: {', '.join(existing)}")
+
+    copied = reshard_database(
+        args.sources, targets, chunk_size=args.chunk_size,
+        progress=lambda table, count: print(f"\r{table}: {count}", end='', flush=True)
+    )
+    print()
+    for table, count in copied.items():
+        print(f"{table}: 已复制 {count} 行")
+    for path in targets:
+        print(f"- {path}")
+
+
+if __name__ == "__main__":
+    main()
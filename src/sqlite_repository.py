@@ -0,0 +1,469 @@
+import zlib
+import sqlite3
+import json
+from datetime import datetime
+from .models import License, LicenseStatus, AuditLog
+from .repository import LicenseRepository, SWEEPABLE_STATUSES, CONFLICT_POLICIES
+from .audit_store import AuditLogStore
+from .validation_counters import ValidationCounterStore
+from .user_info_index import UserInfoIndex, DEFAULT_INDEXED_FIELDS
+from .activations import ActivationStore
+from .change_feed import ChangeFeedStore
+from .renewals import RenewalStore
+from .connection_pool import ConnectionPool
+from .metrics import timed
+
+# 表结构变化时递增；已是当前版本的数据库启动时跳过建表语句
+SCHEMA_VERSION = 4
+
+
+def row_to_license(row: sqlite3.Row) -> License:
+    """将数据库行转换为许可证对象"""
+    data = dict(row)
+    data['user_info'] = json.loads(data['user_info']) if data['user_info'] else {}
+    return License.from_dict(data)
+
+
+_LICENSE_COLUMNS = (
+    'license_key', 'license_type', 'start_date', 'end_date', 'product_id', 'user_info',
+    'status', 'created_at', 'updated_at', 'activation_count', 'last_used'
+)
+
+
+def _license_params(license: License) -> tuple:
+    """按 _LICENSE_COLUMNS 的顺序生成插入参数"""
+    return (
+        license.license_key,
+        license.license_type.value,
+        license.start_date.isoformat(),
+        license.end_date.isoformat(),
+        license.product_id,
+        json.dumps(license.user_info),
+        license.status.value,
+        license.created_at.isoformat(),
+        license.updated_at.isoformat(),
+        license.activation_count,
+        license.last_used.isoformat() if license.last_used else None
+    )
+
+
+class SQLiteLicenseRepository(LicenseRepository):
+    """基于SQLite的许可证存储"""
+
+    def __init__(self, db_path: str = 'licenses.db', audit_retention_months: int = None,
+                 indexed_user_fields: tuple = DEFAULT_INDEXED_FIELDS, full_text_search: bool = False,
+                 pool_size: int = 4):
+        self.db_path = db_path
+        self._pool = ConnectionPool(db_path, size=pool_size)
+        self.audit_store = AuditLogStore(retention_months=audit_retention_months)
+        self.validation_counters = ValidationCounterStore()
+        self.user_info_index = UserInfoIndex(indexed_user_fields, full_text=full_text_search)
+        self.activation_store = ActivationStore()
+        self.change_feed = ChangeFeedStore()
+        self.renewal_store = RenewalStore()
+        self._init_database()
+
+    def schema_version(self) -> int:
+        """当前配置对应的表结构版本，写入 PRAGMA user_version
+
+        生成列和全文索引取决于 indexed_user_fields 和 full_text_search，
+        因此版本号由 SCHEMA_VERSION 和这些配置共同计算。
+        """
+        layout = f"{SCHEMA_VERSION}|{','.join(self.user_info_index.fields)}|{int(self.user_info_index.full_text)}"
+        return zlib.crc32(layout.encode('utf-8')) & 0x7fffffff
+
+    def _init_database(self):
+        """初始化数据库"""
+        version = self.schema_version()
+        with self._pool.connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == version:
+                # 表结构已是当前版本，只需加载审计日志分区
+                self.audit_store.load_partitions(conn)
+                return
+
+            cursor = conn.cursor()
+
+            # 创建许可证表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS licenses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    license_key TEXT UNIQUE NOT NULL,
+                    license_type TEXT NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    user_info TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    activation_count INTEGER DEFAULT 0,
+                    last_used TEXT
+                )
+            ''')
+
+            # 审计日志按月分区存储
+            self.audit_store.init_schema(conn)
+
+            # 验证事件聚合计数
+            self.validation_counters.init_schema(conn)
+
+            # 设备激活记录
+            self.activation_store.init_schema(conn)
+
+            # 许可证变更日志
+            self.change_feed.init_schema(conn)
+
+            # 续期关系
+            self.renewal_store.init_schema(conn)
+
+            # user_info 字段索引
+            self.user_info_index.init_schema(conn)
+
+            # 过期清理按 (status, end_date) 范围扫描
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_licenses_status_end_date ON licenses (status, end_date)"
+            )
+
+            cursor.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+
+    def save_license(self, license: License):
+        """保存许可证到数据库"""
+        self.save_licenses([license])
+
+    @timed('db.save_licenses')
+    def save_licenses(self, licenses: list[License], on_conflict: str = 'error') -> int:
+        """在一个事务中用 executemany 批量保存许可证"""
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突处理方式: {on_conflict}")
+
+        placeholders = ', '.join('?' for _ in _LICENSE_COLUMNS)
+        query = f"INSERT INTO licenses ({', '.join(_LICENSE_COLUMNS)}) VALUES ({placeholders})"
+        if on_conflict == 'skip':
+            query += " ON CONFLICT (license_key) DO NOTHING"
+        elif on_conflict == 'replace':
+            # 保留原有行ID，触发器把覆盖记为一次更新
+            assignments = ', '.join(f"{column} = excluded.{column}" for column in _LICENSE_COLUMNS[1:])
+            query += f" ON CONFLICT (license_key) DO UPDATE SET {assignments}"
+
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, [_license_params(license) for license in licenses])
+            conn.commit()
+            return cursor.rowcount
+
+    @timed('db.get_license_by_key')
+    def get_license_by_key(self, license_key: str) -> License:
+        """根据许可证密钥获取许可证"""
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM licenses WHERE license_key = ?", (license_key,))
+            row = cursor.fetchone()
+
+            if row:
+                return row_to_license(row)
+            return None
+
+    @timed('db.update_license')
+    def update_license(self, license: License) -> bool:
+        """更新许可证信息"""
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                '''
+                UPDATE licenses
+                SET license_type = ?, start_date = ?, end_date = ?, product_id = ?, user_info = ?,
+                    status = ?, updated_at = ?, activation_count = ?, last_used = ?
+                WHERE license_key = ?
+                ''',
+                (
+                    license.license_type.value,
+                    license.start_date.isoformat(),
+                    license.end_date.isoformat(),
+                    license.product_id,
+                    json.dumps(license.user_info),
+                    license.status.value,
+                    license.updated_at.isoformat(),
+                    license.activation_count,
+                    license.last_used.isoformat() if license.last_used else None,
+                    license.license_key
+                )
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    @timed('db.get_all_licenses')
+    def get_all_licenses(self, product_id: str = None, status: LicenseStatus = None) -> list[License]:
+        """获取所有许可证，可以按产品ID和状态过滤"""
+        query = "SELECT * FROM licenses"
+        params = []
+
+        if product_id or status:
+            query += " WHERE"
+            conditions = []
+
+            if product_id:
+                conditions.append(" product_id = ?")
+                params.append(product_id)
+
+            if status:
+                if conditions:
+                    conditions.append(" AND")
+                conditions.append(" status = ?")
+                params.append(status.value)
+
+            query += ''.join(conditions)
+
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+            return [row_to_license(row) for row in rows]
+
+    def iter_licenses(self, chunk_size: int = 1000, product_id: str = None, status: LicenseStatus = None):
+        """按ID分块读取许可证，分块之间不占用连接"""
+        conditions = ["id > ?"]
+        filters = []
+        if product_id:
+            conditions.append("product_id = ?")
+            filters.append(product_id)
+        if status:
+            conditions.append("status = ?")
+            filters.append(status.value)
+        query = f"SELECT * FROM licenses WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+
+        last_id = 0
+        while True:
+            with self._pool.connection() as conn:
+                rows = conn.execute(query, [last_id, *filters, chunk_size]).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]['id']
+            for row in rows:
+                yield row_to_license(row)
+
+    @timed('db.get_statistics')
+    def get_statistics(self) -> dict:
+        """使用分组聚合统计许可证"""
+        with self._pool.connection() as conn:
+            by_status = dict(conn.execute("SELECT status, COUNT(*) FROM licenses GROUP BY status").fetchall())
+            by_type = dict(conn.execute("SELECT license_type, COUNT(*) FROM licenses GROUP BY license_type").fetchall())
+            total_activations = conn.execute("SELECT COALESCE(SUM(activation_count), 0) FROM licenses").fetchone()[0]
+
+        return {
+            'total': sum(by_status.values()),
+            'by_status': by_status,
+            'by_type': by_type,
+            'total_activations': total_activations
+        }
+
+    @timed('db.search_licenses')
+    def search_licenses(self, text: str = None, product_id: str = None, status: LicenseStatus = None,
+                        limit: int = None, **fields) -> list[License]:
+        """按 user_info 中已建立索引的字段或全文检索查找许可证"""
+        conditions, params = self.user_info_index.build_conditions(text, **fields)
+        if product_id:
+            conditions.append("product_id = ?")
+            params.append(product_id)
+        if status:
+            conditions.append("status = ?")
+            params.append(status.value)
+
+        query = "SELECT * FROM licenses"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [row_to_license(row) for row in cursor.fetchall()]
+
+    @timed('db.save_renewals')
+    def save_renewals(self, renewals: list[tuple[str, License]], logs: list[AuditLog], now: datetime) -> int:
+        """在一个事务中写入新许可证、吊销旧许可证、登记续期关系和审计日志
+
+        任一旧密钥不存在或已被吊销（包括已续期）时整体回滚，同一许可证不会被续期两次。
+        """
+        placeholders = ', '.join('?' for _ in _LICENSE_COLUMNS)
+        # 连接池在异常时回滚，整批要么全部生效要么全部不生效
+        with self._pool.connection() as conn:
+            conn.executemany(
+                f"INSERT INTO licenses ({', '.join(_LICENSE_COLUMNS)}) VALUES ({placeholders})",
+                [_license_params(license) for _, license in renewals]
+            )
+            self._supersede(conn, renewals, logs, now)
+            conn.commit()
+            return len(renewals)
+
+    def link_renewals(self, renewals: list[tuple[str, License]], logs: list[AuditLog], now: datetime) -> int:
+        """新许可证已写入其他分片时，只在本库中吊销旧许可证并登记续期关系和审计日志"""
+        with self._pool.connection() as conn:
+            self._supersede(conn, renewals, logs, now)
+            conn.commit()
+            return len(renewals)
+
+    def discard_licenses(self, license_keys: list[str]) -> int:
+        """删除尚未被引用的新许可证，用于撤销跨分片续期中已写入的一侧"""
+        with self._pool.connection() as conn:
+            cursor = conn.executemany("DELETE FROM licenses WHERE license_key = ?",
+                                      [(license_key,) for license_key in license_keys])
+            conn.commit()
+            return cursor.rowcount
+
+    def _supersede(self, conn: sqlite3.Connection, renewals: list[tuple[str, License]], logs: list[AuditLog],
+                   now: datetime):
+        cursor = conn.executemany(
+            "UPDATE licenses SET status = ?, updated_at = ? WHERE license_key = ? AND status != ?",
+            [(LicenseStatus.REVOKED.value, now.isoformat(), old_key, LicenseStatus.REVOKED.value)
+             for old_key, _ in renewals]
+        )
+        if cursor.rowcount != len(renewals):
+            raise ValueError("部分许可证不存在或已被吊销")
+        self.renewal_store.insert(conn, [(old_key, license.license_key) for old_key, license in renewals], now)
+        for log in logs:
+            self.audit_store.insert(conn, log)
+
+    def get_superseded_by(self, license_key: str) -> str:
+        """返回取代该许可证的新密钥"""
+        with self._pool.connection() as conn:
+            return self.renewal_store.lookup(conn, license_key)
+
+    @timed('db.changes_since')
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> list[dict]:
+        """按序号升序返回大于 seq 的许可证变更"""
+        with self._pool.connection() as conn:
+            return self.change_feed.since(conn, seq, limit)
+
+    @timed('db.expire_licenses')
+    def expire_licenses(self, now: datetime, chunk_size: int = 500) -> int:
+        """将已到期的激活/待激活许可证分块标记为过期"""
+        now_str = now.isoformat()
+        statuses = [status.value for status in SWEEPABLE_STATUSES]
+        placeholders = ', '.join('?' for _ in statuses)
+        total = 0
+
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            while True:
+                # 每个分块一条集合更新语句，避免长时间持有写锁
+                cursor.execute(
+                    f'''
+                    UPDATE licenses SET status = ?, updated_at = ?
+                    WHERE id IN (
+                        SELECT id FROM licenses
+                        WHERE status IN ({placeholders}) AND end_date < ?
+                        LIMIT ?
+                    )
+                    ''',
+                    [LicenseStatus.EXPIRED.value, now_str, *statuses, now_str, chunk_size]
+                )
+                conn.commit()
+                total += cursor.rowcount
+                if cursor.rowcount < chunk_size:
+                    break
+
+        return total
+
+    @timed('db.get_next_expiration')
+    def get_next_expiration(self) -> datetime:
+        """获取下一个待过期许可证的到期时间"""
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            # 按状态分别取最小值，使每次查询都能命中 (status, end_date) 索引
+            candidates = []
+            for status in SWEEPABLE_STATUSES:
+                cursor.execute("SELECT MIN(end_date) FROM licenses WHERE status = ?", (status.value,))
+                value = cursor.fetchone()[0]
+                if value:
+                    candidates.append(value)
+
+        return datetime.fromisoformat(min(candidates)) if candidates else None
+
+    @timed('db.add_audit_log')
+    def add_audit_log(self, action: str, license_key: str, user_id: str, details: dict = None):
+        """添加审计日志"""
+        log = AuditLog(action=action, license_key=license_key, user_id=user_id, details=details)
+
+        with self._pool.connection() as conn:
+            self.audit_store.insert(conn, log)
+            conn.commit()
+
+    @timed('db.add_audit_logs')
+    def add_audit_logs(self, logs: list[AuditLog]):
+        """在一个事务中批量写入审计日志"""
+        with self._pool.connection() as conn:
+            for log in logs:
+                self.audit_store.insert(conn, log)
+            conn.commit()
+
+    def iter_usage_history(self, license_key: str, since: datetime = None, until: datetime = None,
+                           actions: list[str] = None, limit: int = None, cursor: str = None):
+        """流式遍历许可证的审计日志"""
+        with self._pool.connection() as conn:
+            yield from self.audit_store.iter_history(
+                conn, license_key, since=since, until=until, actions=actions, limit=limit, cursor=cursor
+            )
+
+    def archive_audit_logs(self, archive_dir: str, now: datetime = None) -> list[str]:
+        """归档超过保留期的审计日志分区"""
+        with self._pool.connection() as conn:
+            return self.audit_store.archive_expired_partitions(conn, archive_dir, now)
+
+    @timed('db.record_usage')
+    def record_usage(self, license_key: str, machine_info: dict, timestamp: datetime, log: AuditLog = None):
+        """使用记录更新与计数 upsert（或审计日志）在同一事务中完成"""
+        with self._pool.connection() as conn:
+            conn.execute(
+                '''
+                UPDATE licenses SET activation_count = activation_count + 1, last_used = ?, updated_at = ?
+                WHERE license_key = ?
+                ''',
+                (timestamp.isoformat(), timestamp.isoformat(), license_key)
+            )
+            if log is not None:
+                self.audit_store.insert(conn, log)
+            else:
+                self.validation_counters.record(conn, license_key, machine_info, timestamp)
+            conn.commit()
+
+    @timed('db.get_validation_counters')
+    def get_validation_counters(self, license_key: str, since: datetime = None,
+                                until: datetime = None) -> list[dict]:
+        """获取许可证按天、按机器聚合的验证次数"""
+        with self._pool.connection() as conn:
+            return self.validation_counters.query(conn, license_key, since, until)
+
+    @timed('db.add_activation')
+    def add_activation(self, license_key: str, fingerprint: str, max_count: int, now: datetime) -> bool:
+        """登记设备激活"""
+        with self._pool.connection() as conn:
+            registered = self.activation_store.register(conn, license_key, fingerprint, max_count, now)
+            conn.commit()
+            return registered
+
+    @timed('db.get_activations')
+    def get_activations(self, license_key: str) -> list[dict]:
+        """获取许可证已激活的设备列表"""
+        with self._pool.connection() as conn:
+            return self.activation_store.list(conn, license_key)
+
+    @timed('db.remove_activation')
+    def remove_activation(self, license_key: str, fingerprint: str) -> bool:
+        """移除一台设备的激活记录"""
+        with self._pool.connection() as conn:
+            removed = self.activation_store.remove(conn, license_key, fingerprint)
+            conn.commit()
+            return removed
+
+    def connection(self):
+        """从连接池借出一个连接，供迁移等工具直接执行SQL"""
+        return self._pool.connection()
+
+    def close(self):
+        """关闭连接池中的连接"""
+        self._pool.close()
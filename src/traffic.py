@@ -0,0 +1,227 @@
+import os
+import sys
+import hmac
+import json
+import time
+import hashlib
+import secrets
+import argparse
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from .models import LicenseType
+from .license_io import open_text
+from .license_manager import LicenseManager
+
+# 记录的操作：(对象属性, 轨迹中的操作名)
+VALIDATOR_OPERATIONS = (
+    ('validate_license_online', 'validate_online'),
+    ('validate_license_offline', 'validate_offline'),
+)
+MANAGER_OPERATIONS = (
+    ('create_license', 'create'),
+    ('revoke_license', 'revoke'),
+)
+
+
+class TrafficRecorder:
+    """记录验证和管理操作的匿名化轨迹
+
+    每行一个JSON对象：t 为相对开始时间的秒数，op 为操作名，
+    k / p / m 分别为许可证密钥、产品ID和机器信息的 HMAC 摘要，ok 为调用结果。
+    摘要使用每次录制随机生成的盐，轨迹中不包含任何原始密钥，
+    但同一密钥在同一轨迹中始终对应同一摘要，保留了访问分布。
+    """
+
+    def __init__(self, path: str, salt: bytes = None, clock=time.monotonic):
+        self.path = path
+        self._salt = salt or secrets.token_bytes(16)
+        self._clock = clock
+        self._started = clock()
+        self._file = open_text(path, 'w')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patched = []
+
+    def attach(self, validator=None, manager=None):
+        """在给定对象上记录操作，只影响这些实例"""
+        if validator is not None:
+            for attribute, operation in VALIDATOR_OPERATIONS:
+                self._patch(validator, attribute, operation)
+        if manager is not None:
+            for attribute, operation in MANAGER_OPERATIONS:
+                self._patch(manager, attribute, operation)
+
+    def detach(self):
+        """恢复被包装的方法"""
+        for target, attribute in reversed(self._patched):
+            del target.__dict__[attribute]
+        self._patched = []
+
+    def close(self):
+        self.detach()
+        with self._lock:
+            self._file.close()
+
+    def record(self, operation: str, license_key: str = None, product_id: str = None,
+               machine_info: dict = None, ok: bool = True):
+        """写入一条记录"""
+        entry = {'t': round(self._clock() - self._started, 6), 'op': operation, 'ok': ok}
+        if license_key is not None:
+            entry['k'] = self._anonymize(license_key)
+        if product_id is not None:
+            entry['p'] = self._anonymize(product_id)
+        if machine_info:
+            entry['m'] = self._anonymize(json.dumps(machine_info, sort_keys=True))
+        line = json.dumps(entry, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def _patch(self, target, attribute: str, operation: str):
+        original = getattr(target, attribute)
+
+        def wrapper(*args, **kwargs):
+            # 在线验证内部会调用离线验证，只记录最外层的调用
+            if getattr(self._local, 'active', False):
+                return original(*args, **kwargs)
+            self._local.active = True
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                self._local.active = False
+            self._record_call(operation, args, kwargs, result)
+            return result
+
+        setattr(target, attribute, wrapper)
+        self._patched.append((target, attribute))
+
+    def _record_call(self, operation: str, args: tuple, kwargs: dict, result):
+        """从调用参数中取出需要记录的字段"""
+        if operation in ('validate_online', 'validate_offline'):
+            names = ('license_key', 'product_id', 'machine_info')
+            values = dict(zip(names, args), **kwargs)
+            self.record(operation, values.get('license_key'), values.get('product_id'),
+                        values.get('machine_info'), ok=bool(result[0]))
+        elif operation == 'create':
+            names = ('license_type', 'start_date', 'end_date', 'product_id')
+            values = dict(zip(names, args), **kwargs)
+            self.record(operation, result.license_key, values.get('product_id'), ok=True)
+        else:
+            license_key = args[0] if args else kwargs.get('license_key')
+            self.record(operation, license_key, ok=bool(result))
+
+    def _anonymize(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+def read_trace(path: str):
+    """逐条读取轨迹记录"""
+    with open_text(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TrafficReplayer:
+    """在新的数据库上按原始节奏或加速重放轨迹
+
+    轨迹中出现的每个匿名密钥在重放前创建一个对应的许可证，
+    录制期间新建的许可证在重放到 create 记录时才创建。
+    speed 为重放倍速，0 表示不等待、尽快执行；clock 和 sleep 可注入以便测试。
+    """
+
+    def __init__(self, manager, speed: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self.manager = manager
+        self.speed = speed
+        self._clock = clock
+        self._sleep = sleep
+        self._keys = {}
+
+    def prepare(self, path: str) -> int:
+        """为轨迹中已存在的密钥创建许可证，返回创建的数量"""
+        products = {}
+        created_during_trace = set()
+        for entry in read_trace(path):
+            key = entry.get('k')
+            if key is None:
+                continue
+            if entry['op'] == 'create':
+                created_during_trace.add(key)
+            elif key not in created_during_trace:
+                products.setdefault(key, entry.get('p', 'replay'))
+
+        for key, product_id in products.items():
+            if key not in self._keys:
+                self._keys[key] = self._create(product_id).license_key
+        return len(products)
+
+    def replay(self, path: str) -> dict:
+        """重放轨迹，返回各操作的次数、与录制结果不一致的次数和耗时"""
+        self.prepare(path)
+        counts = defaultdict(int)
+        mismatches = defaultdict(int)
+        started = self._clock()
+        for entry in read_trace(path):
+            if self.speed:
+                delay = entry['t'] / self.speed - (self._clock() - started)
+                if delay > 0:
+                    self._sleep(delay)
+            ok = self._execute(entry)
+            counts[entry['op']] += 1
+            if ok != entry.get('ok', ok):
+                mismatches[entry['op']] += 1
+        return {
+            'operations': dict(counts),
+            'mismatches': dict(mismatches),
+            'elapsed_seconds': self._clock() - started,
+        }
+
+    def _execute(self, entry: dict) -> bool:
+        operation = entry['op']
+        product_id = entry.get('p', 'replay')
+        if operation == 'create':
+            self._keys[entry['k']] = self._create(product_id).license_key
+            return True
+
+        license_key = self._keys.get(entry.get('k'), entry.get('k'))
+        validator = self.manager.validator
+        if operation == 'validate_online':
+            machine_info = {'machine_id': entry['m']} if 'm' in entry else {}
+            return validator.validate_license_online(license_key, product_id, machine_info)[0]
+        if operation == 'validate_offline':
+            return validator.validate_license_offline(license_key, product_id)[0]
+        if operation == 'revoke':
+            return self.manager.revoke_license(license_key)
+        raise ValueError(f"未知的操作: {operation}")
+
+    def _create(self, product_id: str):
+        now = self.manager.clock.now()
+        return self.manager.create_license(LicenseType.STANDARD, now - timedelta(days=1),
+                                           now + timedelta(days=365), product_id)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="在新数据库上重放流量轨迹")
+    parser.add_argument('trace', help="轨迹文件路径（.gz 为gzip压缩）")
+    parser.add_argument('--db', default='replay.db', help="重放使用的数据库路径（会被覆盖）")
+    parser.add_argument('--secret-key', default='replay_secret_key', help="加密密钥")
+    parser.add_argument('--speed', type=float, default=1.0, help="重放倍速，0 表示尽快执行")
+    parser.add_argument('--aggregate', action='store_true', help="按天聚合验证计数")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    manager = LicenseManager(db_path=args.db, secret_key=args.secret_key, aggregate_validations=args.aggregate)
+    try:
+        report = TrafficReplayer(manager, speed=args.speed).replay(args.trace)
+    finally:
+        manager.repository.close()
+
+    print(f"耗时: {report['elapsed_seconds']:.3f} 秒")
+    for operation, count in sorted(report['operations'].items()):
+        print(f"{operation:18s} {count:8d} 次  结果不一致 {report['mismatches'].get(operation, 0)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
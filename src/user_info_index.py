@@ -0,0 +1,114 @@
+import re
+import sqlite3
+
+DEFAULT_INDEXED_FIELDS = ('company', 'email', 'batch_id')
+
+_FIELD_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def column_name(field: str) -> str:
+    """user_info 字段对应的生成列名"""
+    return f"user_{field}"
+
+
+class UserInfoIndex:
+    """user_info 字段索引
+
+    为配置的字段创建 json_extract 虚拟生成列及其索引，
+    可选地维护一张 FTS5 全文索引表用于自由文本搜索；搜索文本按短语匹配，不支持 FTS5 查询语法。
+    """
+
+    def __init__(self, fields: tuple = DEFAULT_INDEXED_FIELDS, full_text: bool = False):
+        for field in fields:
+            if not _FIELD_PATTERN.match(field):
+                raise ValueError(f"无效的索引字段名: {field}")
+        self.fields = tuple(fields)
+        self.full_text = full_text
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """为 licenses 表添加生成列、索引以及全文索引"""
+        existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(licenses)")}
+        for field in self.fields:
+            column = column_name(field)
+            if column not in existing:
+                conn.execute(
+                    f"ALTER TABLE licenses ADD COLUMN {column} "
+                    f"GENERATED ALWAYS AS (json_extract(user_info, '$.{field}')) VIRTUAL"
+                )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_licenses_{column} ON licenses ({column})")
+
+        if self.full_text:
+            self._init_full_text(conn)
+
+    def build_conditions(self, text: str = None, **fields) -> tuple[list[str], list]:
+        """构造搜索条件，返回 (条件列表, 参数列表)"""
+        conditions = []
+        params = []
+        for field, value in fields.items():
+            if field not in self.fields:
+                raise ValueError(f"字段未建立索引: {field}")
+            conditions.append(f"{column_name(field)} = ?")
+            params.append(value)
+
+        if text:
+            if not self.full_text:
+                raise ValueError("未启用全文索引，无法进行文本搜索")
+            query = match_phrases(text)
+            if query:
+                conditions.append("id IN (SELECT rowid FROM licenses_fts WHERE licenses_fts MATCH ?)")
+                params.append(query)
+        return conditions, params
+
+    def _init_full_text(self, conn: sqlite3.Connection):
+        """创建由触发器同步的无内容 FTS5 表
+
+        只索引 user_info 中各个值解码后的文本，不含JSON键名和 \\uXXXX 转义，
+        中文等非ASCII内容可以直接搜索。早期版本直接索引 user_info 列的JSON原文，发现时重建。
+        """
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'licenses_fts'"
+        ).fetchone()
+        if row and "content=''" in row[0]:
+            return
+        for trigger in ('licenses_fts_ai', 'licenses_fts_ad', 'licenses_fts_au'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS licenses_fts")
+
+        conn.execute("CREATE VIRTUAL TABLE licenses_fts USING fts5(user_info, content='')")
+        conn.execute(f'''
+            CREATE TRIGGER licenses_fts_ai AFTER INSERT ON licenses BEGIN
+                INSERT INTO licenses_fts (rowid, user_info) VALUES (new.id, {_searchable_text('new')});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER licenses_fts_ad AFTER DELETE ON licenses BEGIN
+                INSERT INTO licenses_fts (licenses_fts, rowid, user_info)
+                VALUES ('delete', old.id, {_searchable_text('old')});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER licenses_fts_au AFTER UPDATE OF user_info ON licenses BEGIN
+                INSERT INTO licenses_fts (licenses_fts, rowid, user_info)
+                VALUES ('delete', old.id, {_searchable_text('old')});
+                INSERT INTO licenses_fts (rowid, user_info) VALUES (new.id, {_searchable_text('new')});
+            END
+        ''')
+        # 为已有数据建立全文索引
+        conn.execute(f"INSERT INTO licenses_fts (rowid, user_info) SELECT id, {_searchable_text('licenses')} FROM licenses")
+
+
+def _searchable_text(row: str) -> str:
+    """拼接 user_info 中全部标量值的SQL表达式，row 为触发器中的 new/old 或表名"""
+    return (
+        f"(SELECT group_concat(value, ' ') FROM json_tree({row}.user_info) "
+        f"WHERE type NOT IN ('object', 'array'))"
+    )
+
+
+def match_phrases(text: str) -> str:
+    """将用户输入转换为 FTS5 查询：按空白拆分，每段作为一个带引号的短语，全部匹配
+
+    避免 '@'、'-'、'"' 等字符被当作 FTS5 查询语法；短语内部仍按分词器切分，
+    例如 zhangsan@example.com 匹配连续的 zhangsan、example、com 三个词。
+    """
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in text.split())
@@ -0,0 +1,99 @@
+import json
+import hashlib
+import sqlite3
+from datetime import datetime
+from .metrics import METRICS
+
+
+class ValidationCounterStore:
+    """按 (许可证, 机器信息, 日期) 聚合的验证计数
+
+    相同的 machine_info 只保存一份到 machine_infos 表，
+    每次验证只对计数行执行一次 upsert，而不是写入完整的审计记录。
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        self.cache_size = cache_size
+        self._machine_info_ids = {}
+
+    def init_schema(self, conn: sqlite3.Connection):
+        """创建机器信息表和计数表"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS machine_infos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                digest TEXT UNIQUE NOT NULL,
+                machine_info TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS validation_counters (
+                license_key TEXT NOT NULL,
+                day TEXT NOT NULL,
+                machine_info_id INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (license_key, day, machine_info_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def record(self, conn: sqlite3.Connection, license_key: str, machine_info: dict, timestamp: datetime):
+        """累加一次验证计数"""
+        machine_info_id = self.intern_machine_info(conn, machine_info)
+        seen = timestamp.isoformat()
+        conn.execute(
+            '''
+            INSERT INTO validation_counters (license_key, day, machine_info_id, count, first_seen, last_seen)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT (license_key, day, machine_info_id)
+            DO UPDATE SET count = count + 1, last_seen = excluded.last_seen
+            ''',
+            (license_key, timestamp.date().isoformat(), machine_info_id, seen, seen)
+        )
+
+    def intern_machine_info(self, conn: sqlite3.Connection, machine_info: dict) -> int:
+        """返回机器信息的ID，相同内容只存储一次"""
+        payload = json.dumps(machine_info or {}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        machine_info_id = self._machine_info_ids.get(digest)
+        METRICS.record_cache('machine_info_ids', machine_info_id is not None)
+        if machine_info_id is not None:
+            return machine_info_id
+
+        conn.execute(
+            "INSERT OR IGNORE INTO machine_infos (digest, machine_info) VALUES (?, ?)",
+            (digest, payload)
+        )
+        machine_info_id = conn.execute("SELECT id FROM machine_infos WHERE digest = ?", (digest,)).fetchone()[0]
+        if len(self._machine_info_ids) >= self.cache_size:
+            self._machine_info_ids.clear()
+        self._machine_info_ids[digest] = machine_info_id
+        return machine_info_id
+
+    def query(self, conn: sqlite3.Connection, license_key: str, since: datetime = None,
+              until: datetime = None) -> list[dict]:
+        """查询许可证的验证计数，按日期倒序"""
+        query = '''
+            SELECT c.day, c.count, c.first_seen, c.last_seen, m.machine_info
+            FROM validation_counters c JOIN machine_infos m ON m.id = c.machine_info_id
+            WHERE c.license_key = ?
+        '''
+        params = [license_key]
+        if since:
+            query += " AND c.day >= ?"
+            params.append(since.date().isoformat())
+        if until:
+            query += " AND c.day <= ?"
+            params.append(until.date().isoformat())
+        query += " ORDER BY c.day DESC, c.last_seen DESC"
+
+        return [
+            {
+                'day': day,
+                'count': count,
+                'first_seen': datetime.fromisoformat(first_seen),
+                'last_seen': datetime.fromisoformat(last_seen),
+                'machine_info': json.loads(machine_info)
+            }
+            for day, count, first_seen, last_seen, machine_info in conn.execute(query, params)
+        ]
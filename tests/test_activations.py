@@ -0,0 +1,91 @@
+import unittest
+import os
+import threading
+from datetime import datetime, timedelta
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.license_validator import machine_fingerprint
+
+
+class TestActivations(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_activations.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                      max_activation_count=2)
+        self.product_id = "TEST-PROD-001"
+        self.license = self.manager.create_license(
+            license_type=LicenseType.PROFESSIONAL,
+            start_date=datetime.now(),
+            end_date=datetime.now() + timedelta(days=30),
+            product_id=self.product_id
+        )
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _validate(self, machine_id):
+        return self.manager.validator.validate_license_online(
+            license_key=self.license.license_key,
+            product_id=self.product_id,
+            machine_info={"user_id": "user1", "machine_id": machine_id}
+        )
+
+    def test_activation_limit(self):
+        self.assertTrue(self._validate("machine-a")[0])
+        self.assertTrue(self._validate("machine-b")[0])
+        self.assertEqual(self._validate("machine-c"), (False, "许可证激活设备数已达上限"))
+
+        # 已激活的设备可以继续验证
+        self.assertTrue(self._validate("machine-a")[0])
+
+        activations = self.manager.get_activations(self.license.license_key)
+        self.assertEqual([a['fingerprint'] for a in activations],
+                         [machine_fingerprint({"machine_id": "machine-a"}), machine_fingerprint({"machine_id": "machine-b"})])
+        self.assertEqual(activations[0]['validation_count'], 2)
+
+    def test_deactivate_machine(self):
+        self._validate("machine-a")
+        self._validate("machine-b")
+
+        fingerprint = machine_fingerprint({"machine_id": "machine-a"})
+        self.assertTrue(self.manager.deactivate_machine(self.license.license_key, fingerprint))
+        self.assertFalse(self.manager.deactivate_machine(self.license.license_key, fingerprint))
+        self.assertTrue(self._validate("machine-c")[0])
+
+    def test_concurrent_activations_respect_limit(self):
+        results = []
+        lock = threading.Lock()
+
+        def activate(i):
+            manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                     max_activation_count=2)
+            registered = manager.register_activation(self.license.license_key, f"fingerprint-{i}")
+            with lock:
+                results.append(registered)
+
+        threads = [threading.Thread(target=activate, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 2)
+        self.assertEqual(len(self.manager.get_activations(self.license.license_key)), 2)
+
+    def test_fingerprint_disabled(self):
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                 max_activation_count=1, machine_fingerprint_enabled=False)
+        self.assertTrue(manager.register_activation(self.license.license_key, "fingerprint-1"))
+        self.assertTrue(manager.register_activation(self.license.license_key, "fingerprint-2"))
+        self.assertEqual(manager.get_activations(self.license.license_key), [])
+
+    def test_machine_fingerprint(self):
+        self.assertEqual(machine_fingerprint({"user_id": "a", "machine_id": "m1"}),
+                         machine_fingerprint({"user_id": "b", "machine_id": "m1"}))
+        self.assertNotEqual(machine_fingerprint({"machine_id": "m1"}), machine_fingerprint({"machine_id": "m2"}))
+        self.assertEqual(machine_fingerprint(None), machine_fingerprint({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.memory_repository import InMemoryLicenseRepository
+from src.analytics import np, LicenseColumns
+
+
+@unittest.skipIf(np is None, "需要安装 numpy")
+class TestAnalytics(unittest.TestCase):
+    test_db_path = "test_analytics.db"
+
+    def setUp(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.start = datetime(2026, 1, 5)
+        self.licenses = []
+        for i in range(40):
+            license = License(
+                license_key=f"KEY-{i:03d}",
+                license_type=LicenseType.PROFESSIONAL if i % 2 else LicenseType.STANDARD,
+                start_date=self.start - timedelta(days=365),
+                end_date=self.start + timedelta(days=i * 3, hours=1),
+                product_id="PROD-X" if i < 30 else "PROD-Y",
+                status=LicenseStatus.REVOKED if i % 10 == 0 else LicenseStatus.ACTIVE
+            )
+            license.activation_count = i % 4
+            self.licenses.append(license)
+        self.manager.repository.save_licenses(self.licenses)
+
+    def tearDown(self):
+        self.manager.repository.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _expected_weekly(self, licenses, weeks=12):
+        counts = [0] * weeks
+        for license in licenses:
+            week = (license.end_date - self.start) // timedelta(weeks=1)
+            if 0 <= week < weeks:
+                counts[week] += 1
+        return counts
+
+    def test_expiring_by_week(self):
+        columns = self.manager.license_columns(chunk_size=7)
+        self.assertEqual(len(columns), 40)
+
+        mask = columns.filter(product_id="PROD-X", license_type=LicenseType.PROFESSIONAL)
+        expected = [license for license in self.licenses
+                    if license.product_id == "PROD-X" and license.license_type == LicenseType.PROFESSIONAL]
+        self.assertEqual(columns.count(mask), len(expected))
+        self.assertEqual(columns.expiring_by_period(self.start, periods=12, mask=mask),
+                         self._expected_weekly(expected))
+
+        # 未知产品匹配为空
+        self.assertEqual(columns.count(columns.filter(product_id="PROD-Z")), 0)
+        window = columns.filter(end_after=self.start + timedelta(days=30), end_before=self.start + timedelta(days=60))
+        self.assertEqual(columns.count(window), 10)
+
+    def test_group_by_and_histogram(self):
+        columns = self.manager.license_columns()
+        self.assertEqual(columns.group_by('status'), {LicenseStatus.ACTIVE: 36, LicenseStatus.REVOKED: 4})
+        self.assertEqual(columns.group_by('product_id', 'activation_count', 'sum'),
+                         {"PROD-X": sum(i % 4 for i in range(30)), "PROD-Y": sum(i % 4 for i in range(30, 40))})
+        means = columns.group_by('license_type', 'activation_count', 'mean')
+        self.assertAlmostEqual(means[LicenseType.PROFESSIONAL], 2.0)
+        self.assertAlmostEqual(means[LicenseType.STANDARD], 1.0)
+
+        counts, edges = columns.histogram('activation_count', bins=[0, 1, 2, 3, 4])
+        self.assertEqual(counts, [10, 10, 10, 10])
+        by_type = columns.histogram('activation_count', bins=[0, 1, 2, 3, 4], by='license_type')
+        self.assertEqual(by_type[LicenseType.STANDARD][0], [10, 0, 10, 0])
+
+        with self.assertRaises(ValueError):
+            columns.group_by('end_date')
+
+    def test_memory_backend_matches_sqlite(self):
+        repository = InMemoryLicenseRepository()
+        repository.save_licenses(self.licenses)
+        memory = LicenseColumns.load(repository, chunk_size=9)
+        sqlite = self.manager.license_columns()
+        self.assertEqual(memory.group_by('license_type'), sqlite.group_by('license_type'))
+        self.assertTrue(np.array_equal(np.sort(memory.end_dates), np.sort(sqlite.end_dates)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from src.models import AuditLog
+from src.audit_store import AuditLogStore
+from src.license_manager import LicenseManager
+
+
+class TestAuditLogStore(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_audit_store.db"
+        self.archive_dir = tempfile.mkdtemp()
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                      audit_retention_months=3)
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def _insert(self, action, license_key, timestamp):
+        log = AuditLog(action=action, license_key=license_key, user_id="user1", details={"n": action})
+        log.timestamp = timestamp
+        with sqlite3.connect(self.test_db_path) as conn:
+            self.manager.repository.audit_store.insert(conn, log)
+            conn.commit()
+
+    def _partitions(self):
+        with sqlite3.connect(self.test_db_path) as conn:
+            return self.manager.repository.audit_store.list_partitions(conn)
+
+    def test_monthly_partitions(self):
+        self._insert("一月", "KEY-1", datetime(2026, 1, 15))
+        self._insert("三月", "KEY-1", datetime(2026, 3, 2))
+        self._insert("三月其他", "KEY-2", datetime(2026, 3, 3))
+
+        self.assertEqual(self._partitions(), ["audit_logs_202601", "audit_logs_202603"])
+
+        history = self.manager.get_license_usage_history("KEY-1")
+        self.assertEqual([log.action for log in history], ["三月", "一月"])
+
+        with sqlite3.connect(self.test_db_path) as conn:
+            store = self.manager.repository.audit_store
+            self.assertEqual(store.list_partitions(conn, since=datetime(2026, 2, 1)), ["audit_logs_202603"])
+            self.assertEqual(store.list_partitions(conn, until=datetime(2026, 2, 1)), ["audit_logs_202601"])
+
+    def test_paged_history(self):
+        # 跨越两个分区、时间戳相同的记录也能稳定分页
+        timestamps = [datetime(2026, 1, 31, 23, 59), datetime(2026, 2, 1), datetime(2026, 2, 1),
+                      datetime(2026, 2, 2), datetime(2026, 2, 3)]
+        for i, timestamp in enumerate(timestamps):
+            self._insert(f"验证{i}", "KEY-1", timestamp)
+        self._insert("其他许可证", "KEY-2", datetime(2026, 2, 2))
+
+        first_page = self.manager.get_license_usage_history("KEY-1", limit=2)
+        self.assertEqual([log.action for log in first_page], ["验证4", "验证3"])
+
+        second_page = self.manager.get_license_usage_history("KEY-1", limit=2, cursor=first_page[-1].cursor)
+        self.assertEqual([log.action for log in second_page], ["验证2", "验证1"])
+
+        last_page = self.manager.get_license_usage_history("KEY-1", limit=2, cursor=second_page[-1].cursor)
+        self.assertEqual([log.action for log in last_page], ["验证0"])
+
+        self.assertEqual(self.manager.get_license_usage_history("KEY-1", cursor=last_page[-1].cursor), [])
+
+    def test_history_uses_covering_index(self):
+        self._insert("验证", "KEY-1", datetime(2026, 2, 1))
+        query = ("SELECT * FROM audit_logs_202602 WHERE license_key = ? AND (timestamp, id) < (?, ?) "
+                 "ORDER BY timestamp DESC, id DESC LIMIT ?")
+        with sqlite3.connect(self.test_db_path) as conn:
+            plan = ' '.join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", ("KEY-1", "2026-03", 1, 10)))
+        self.assertIn("COVERING INDEX idx_audit_logs_202602_history", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_existing_partitions_get_covering_index(self):
+        self._insert("验证", "KEY-1", datetime(2026, 2, 1))
+        with sqlite3.connect(self.test_db_path) as conn:
+            conn.execute("DROP INDEX idx_audit_logs_202602_history")
+            conn.execute("CREATE INDEX idx_audit_logs_202602_license_key_timestamp ON audit_logs_202602 "
+                         "(license_key, timestamp)")
+            # 模拟旧版本的数据库，打开时执行建表和索引升级
+            conn.execute("PRAGMA user_version = 0")
+        self.manager.repository.close()
+
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        with sqlite3.connect(self.test_db_path) as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("idx_audit_logs_202602_history", indexes)
+        self.assertNotIn("idx_audit_logs_202602_license_key_timestamp", indexes)
+
+    def test_history_filters(self):
+        self._insert("创建许可证", "KEY-1", datetime(2026, 1, 10))
+        self._insert("验证许可证", "KEY-1", datetime(2026, 2, 10))
+        self._insert("吊销许可证", "KEY-1", datetime(2026, 3, 10))
+
+        history = self.manager.get_license_usage_history(
+            "KEY-1", since=datetime(2026, 2, 1), until=datetime(2026, 3, 31)
+        )
+        self.assertEqual([log.action for log in history], ["吊销许可证", "验证许可证"])
+
+        history = self.manager.get_license_usage_history("KEY-1", actions=["创建许可证", "吊销许可证"])
+        self.assertEqual([log.action for log in history], ["吊销许可证", "创建许可证"])
+
+        streamed = self.manager.iter_license_usage_history("KEY-1", until=datetime(2026, 2, 28))
+        self.assertEqual([log.action for log in streamed], ["验证许可证", "创建许可证"])
+
+    def test_archive_expired_partitions(self):
+        self._insert("旧记录", "KEY-1", datetime(2026, 1, 15))
+        self._insert("新记录", "KEY-1", datetime(2026, 5, 1))
+
+        archived = self.manager.archive_audit_logs(self.archive_dir, now=datetime(2026, 5, 20))
+
+        self.assertEqual(archived, [os.path.join(self.archive_dir, "audit_logs_202601.jsonl.gz")])
+        self.assertEqual(self._partitions(), ["audit_logs_202605"])
+        self.assertEqual([log.action for log in self.manager.get_license_usage_history("KEY-1")], ["新记录"])
+
+        logs = AuditLogStore.read_archive(archived[0])
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(logs[0].action, "旧记录")
+        self.assertEqual(logs[0].details, {"n": "旧记录"})
+        self.assertEqual(logs[0].timestamp, datetime(2026, 1, 15))
+
+    def test_no_retention_keeps_all_partitions(self):
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self._insert("旧记录", "KEY-1", datetime(2020, 1, 1))
+        self.assertEqual(manager.archive_audit_logs(self.archive_dir), [])
+        self.assertEqual(self._partitions(), ["audit_logs_202001"])
+
+    def test_migrate_legacy_table(self):
+        os.remove(self.test_db_path)
+        with sqlite3.connect(self.test_db_path) as conn:
+            conn.execute('''
+                CREATE TABLE audit_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action TEXT NOT NULL,
+                    license_key TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    details TEXT,
+                    timestamp TEXT NOT NULL
+                )
+            ''')
+            conn.execute(
+                "INSERT INTO audit_logs (action, license_key, user_id, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+                ("旧版记录", "KEY-1", "user1", "{}", datetime(2025, 12, 1).isoformat())
+            )
+
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+
+        self.assertEqual(self._partitions(), ["audit_logs_202512"])
+        self.assertEqual([log.action for log in manager.get_license_usage_history("KEY-1")], ["旧版记录"])
+
+
+if __name__ == "__main__":
+    unittest.main()
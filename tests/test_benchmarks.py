@@ -0,0 +1,58 @@
+import unittest
+import tempfile
+import shutil
+from benchmarks.datasets import generate_licenses
+from benchmarks.run import run, compare, check_cold_start, issued_keys, SECRET_KEY
+from src.license_validator import LicenseValidator
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_dataset_is_reproducible(self):
+        first = [license.to_dict() for license in generate_licenses(50, seed=7)]
+        second = [license.to_dict() for license in generate_licenses(50, seed=7)]
+        other = [license.to_dict() for license in generate_licenses(50, seed=8)]
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len({data['license_key'] for data in first}), 50)
+
+    def test_offline_benchmark_keys_validate(self):
+        validator = LicenseValidator(SECRET_KEY)
+        for key in issued_keys(3, "PROD-000"):
+            self.assertEqual(validator.validate_license_offline(key, "PROD-000"), (True, "许可证验证成功"))
+        self.assertFalse(validator.validate_license_offline(key, "PROD-001")[0])
+
+    def test_small_run(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            results = run([200], iterations=20, work_dir=work_dir, cold_start_iterations=2)
+        finally:
+            shutil.rmtree(work_dir)
+
+        self.assertEqual(results['meta']['sizes'], [200])
+        for name in ("generate_license_key", "validate_license_offline", "get_license_by_key[200]",
+                     "validate_license_online[200]", "batch_create_licenses[200]", "get_all_licenses[200]",
+                     "renew_licenses[200]", "cold_start_fresh_db", "cold_start_existing_db"):
+            result = results['results'][name]
+            self.assertGreater(result['ops_per_sec'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare_threshold(self):
+        baseline = {'results': {'a': {'ops_per_sec': 100.0}, 'b': {'ops_per_sec': 100.0}, 'c': {'ops_per_sec': 1.0}}}
+        current = {'results': {'a': {'ops_per_sec': 85.0}, 'b': {'ops_per_sec': 70.0}}}
+        regressions = compare(current, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("b:"))
+
+    def test_cold_start_budget(self):
+        results = {'results': {
+            'cold_start_fresh_db': {'p50_ms': 250.0},
+            'cold_start_existing_db': {'p50_ms': 120.0},
+            'get_license_by_key[200]': {'p50_ms': 500.0},
+        }}
+        over_budget = check_cold_start(results, budget_ms=200.0)
+        self.assertEqual(len(over_budget), 1)
+        self.assertTrue(over_budget[0].startswith("cold_start_fresh_db:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+
+
+class TestChangeFeed(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_change_feed.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.now = datetime.now()
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _create(self, product_id):
+        return self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=self.now,
+            end_date=self.now + timedelta(days=30),
+            product_id=product_id
+        )
+
+    def test_incremental_sync(self):
+        license1 = self._create("PROD-A")
+        license2 = self._create("PROD-B")
+
+        # 下游缓存先做一次全量同步，记住最后的序号
+        changes = self.manager.changes_since(0)
+        self.assertEqual([c['license_key'] for c in changes], [license1.license_key, license2.license_key])
+        last_seq = changes[-1]['seq']
+
+        self.manager.revoke_license(license2.license_key)
+        changes = self.manager.changes_since(last_seq)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['license_key'], license2.license_key)
+        self.assertEqual(changes[0]['operation'], "update")
+        self.assertEqual(changes[0]['status'], LicenseStatus.REVOKED)
+        self.assertEqual(changes[0]['end_date'], license2.end_date)
+
+    def test_usage_updates_are_not_logged(self):
+        license = self._create("PROD-A")
+        last_seq = self.manager.changes_since(0)[-1]['seq']
+
+        # 只有使用次数等统计字段变化时不产生变更
+        stored = self.manager.get_license_by_key(license.license_key)
+        stored.activation_count += 1
+        stored.last_used = self.now
+        self.assertTrue(self.manager.update_license(stored))
+        self.assertEqual(self.manager.changes_since(last_seq), [])
+
+    def test_change_written_in_same_transaction(self):
+        license = self._create("PROD-A")
+        with self.manager.repository.connection() as conn:
+            conn.execute("UPDATE licenses SET status = ? WHERE license_key = ?",
+                         (LicenseStatus.REVOKED.value, license.license_key))
+            conn.rollback()
+        self.assertEqual(len(self.manager.changes_since(0)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import os
+import io
+import json
+import tempfile
+import shutil
+from contextlib import redirect_stdout, redirect_stderr
+from src.models import LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.cli import Checkpoint, Progress, generate, revoke_from_file, parallel_map, main
+
+
+class Interrupt:
+    """在第 n 次进度报告时模拟 Ctrl+C"""
+
+    def __init__(self, after: int):
+        self.after = after
+        self.calls = 0
+
+    def update(self, done):
+        self.calls += 1
+        if self.calls == self.after:
+            raise KeyboardInterrupt
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.db_path = self._path("licenses.db")
+        self.manager = LicenseManager(db_path=self.db_path, secret_key="test_secret_key")
+
+    def tearDown(self):
+        self.manager.repository.close()
+        shutil.rmtree(self.work_dir)
+
+    def _path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def _main(self, *argv):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = main(['--db', self.db_path, '--secret-key', 'test_secret_key', '--quiet', *argv])
+        return status, output.getvalue()
+
+    def test_generate_resumes_from_checkpoint(self):
+        keys_path = self._path("keys.txt")
+        checkpoint = Checkpoint(self._path("generate.json"), {'command': 'generate'})
+        args = (self.manager, "test_secret_key", 25, 'STANDARD', 1, "PROD-A", {"company": "Acme"}, keys_path)
+
+        with self.assertRaises(KeyboardInterrupt):
+            generate(*args, chunk_size=10, checkpoint=checkpoint, progress=Interrupt(after=2))
+        self.assertEqual(checkpoint.load(), 20)
+        self.assertEqual(len(self.manager.get_all_licenses()), 20)
+
+        # 继续时使用新的断点对象，起止时间从断点文件恢复
+        checkpoint = Checkpoint(self._path("generate.json"), {'command': 'generate'})
+        self.assertEqual(generate(*args, chunk_size=10, checkpoint=checkpoint), 5)
+        licenses = self.manager.get_all_licenses()
+        self.assertEqual(len(licenses), 25)
+        self.assertEqual(len({(license.start_date, license.end_date) for license in licenses}), 1)
+        self.assertEqual(sorted(license.user_info['batch_id'] for license in licenses), list(range(1, 26)))
+        with open(keys_path, encoding='utf-8') as f:
+            self.assertEqual(sorted(f.read().split()), sorted(license.license_key for license in licenses))
+
+    def test_revoke_resumes_from_checkpoint(self):
+        licenses = self.manager.batch_create_licenses(5, LicenseType.STANDARD, 1, "PROD-A")
+        keys_path = self._path("revoke.txt")
+        with open(keys_path, 'w', encoding='utf-8') as f:
+            f.write("# 待吊销\n")
+            f.writelines(f"{license.license_key}\n" for license in licenses)
+            f.write("MISSING-KEY\n")
+        checkpoint = Checkpoint(self._path("revoke.json"), {'command': 'revoke'})
+
+        with self.assertRaises(KeyboardInterrupt):
+            revoke_from_file(self.manager, keys_path, chunk_size=2, checkpoint=checkpoint, progress=Interrupt(after=1))
+        self.assertEqual(checkpoint.load(), 2)
+
+        result = revoke_from_file(self.manager, keys_path, chunk_size=2, checkpoint=checkpoint)
+        self.assertEqual(result, {'revoked': 3, 'failed': 1})
+        revoked = self.manager.get_all_licenses(status=LicenseStatus.REVOKED)
+        self.assertEqual(len(revoked), 5)
+
+    def test_import_resumes_from_checkpoint(self):
+        self.manager.batch_create_licenses(7, LicenseType.STANDARD, 1, "PROD-A")
+        export_path = self._path("licenses.jsonl")
+        self.manager.export_licenses(export_path)
+        target = LicenseManager(db_path=self._path("import.db"), secret_key="test_secret_key")
+        try:
+            saved = []
+            with self.assertRaises(KeyboardInterrupt):
+                target.import_licenses(export_path, chunk_size=3, checkpoint=saved.append,
+                                       progress=Interrupt(after=2).update)
+            self.assertEqual(saved, [3, 6])
+            self.assertEqual(target.import_licenses(export_path, chunk_size=3, skip=saved[-1]), 1)
+            self.assertEqual(len(target.get_all_licenses()), 7)
+        finally:
+            target.repository.close()
+
+    def test_checkpoint_rejects_other_task(self):
+        path = self._path("checkpoint.json")
+        Checkpoint(path, {'command': 'import', 'path': 'a.jsonl'}).save(100)
+        with self.assertRaises(ValueError):
+            Checkpoint(path, {'command': 'import', 'path': 'b.jsonl'}).load()
+        self.assertEqual(Checkpoint(None, {}).load(), 0)
+
+    def test_parallel_map_keeps_order(self):
+        self.assertEqual(list(parallel_map(abs, range(-20, 0), workers=2)), list(range(20, 0, -1)))
+        self.assertEqual(list(parallel_map(abs, [-1, -2], workers=1)), [1, 2])
+
+    def test_progress_reports_throughput(self):
+        now = [0.0]
+        stream = io.StringIO()
+        progress = Progress("导入", total=100, stream=stream, initial=40, clock=lambda: now[0])
+        now[0] = 2.0
+        progress.update(60)
+        progress.finish(100)
+        self.assertIn("60/100  10.0 条/秒", stream.getvalue())
+        self.assertIn("100 条，用时 2.0 秒，30.0 条/秒", stream.getvalue())
+
+    def test_commands(self):
+        status, output = self._main('generate', '--count', '12', '--product', 'PROD-A', '--workers', '1',
+                                    '--chunk-size', '5', '--output', self._path("keys.txt"))
+        self.assertEqual(status, 0)
+        self.assertIn("已生成 12 个许可证", output)
+
+        export_path = self._path("licenses.jsonl.gz")
+        self.assertEqual(self._main('export', export_path)[0], 0)
+
+        import_db = self._path("import.db")
+        checkpoint_path = self._path("import.json")
+        with redirect_stdout(io.StringIO()):
+            status = main(['--db', import_db, '--quiet', 'import', export_path, '--chunk-size', '5',
+                           '--checkpoint', checkpoint_path])
+        self.assertEqual(status, 0)
+        # 任务完成后删除断点文件
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+        # 默认 --on-conflict error，重复导入报错而不是抛出异常
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()) as errors:
+            status = main(['--db', import_db, '--quiet', 'import', export_path])
+        self.assertEqual(status, 1)
+        self.assertIn("许可证已存在", errors.getvalue())
+
+        self.assertEqual(self._main('revoke', self._path("keys.txt"))[0], 0)
+        status, output = self._main('stats')
+        self.assertEqual(status, 0)
+        stats = json.loads(output)
+        self.assertEqual(stats['total'], 12)
+        self.assertEqual(stats['by_status'], {LicenseStatus.REVOKED.value: 12})
+
+        status, output = self._main('sweep-expired', '--now', '2100-01-01T00:00:00')
+        self.assertIn("已将 0 个许可证标记为过期", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.clock import CoarseClock, FakeClock
+
+
+class TestClock(unittest.TestCase):
+    test_db_path = "test_clock.db"
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_coarse_clock_refreshes_after_resolution(self):
+        monotonic = [0.0]
+        calls = []
+
+        def source():
+            calls.append(1)
+            return datetime(2026, 1, 1) + timedelta(seconds=monotonic[0])
+
+        clock = CoarseClock(resolution=1.0, source=source, monotonic=lambda: monotonic[0])
+        for _ in range(100):
+            self.assertEqual(clock.now(), datetime(2026, 1, 1))
+        self.assertEqual(len(calls), 1)
+
+        monotonic[0] = 1.5
+        self.assertEqual(clock.now(), datetime(2026, 1, 1, 0, 0, 1, 500000))
+        self.assertEqual(len(calls), 2)
+
+    def test_fake_clock(self):
+        clock = FakeClock(datetime(2026, 1, 1))
+        self.assertEqual(clock.advance(days=1, seconds=30), datetime(2026, 1, 2, 0, 0, 30))
+        clock.set(datetime(2030, 1, 1))
+        self.assertEqual(clock.now(), datetime(2030, 1, 1))
+
+    def test_fake_clock_monotonic(self):
+        clock = FakeClock(datetime(2026, 1, 1))
+        self.assertEqual(clock.monotonic(), 0.0)
+        clock.sleep(1.5)
+        self.assertEqual(clock.monotonic(), 1.5)
+        self.assertEqual(clock.now(), datetime(2026, 1, 1, 0, 0, 1, 500000))
+
+    def test_manager_uses_injected_clock(self):
+        clock = FakeClock(datetime(2026, 1, 1, 12, 0))
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key", clock=clock)
+        try:
+            license = manager.create_license(LicenseType.STANDARD, datetime(2026, 1, 1), datetime(2026, 2, 1), "PROD-A")
+            self.assertEqual(license.created_at, datetime(2026, 1, 1, 12, 0))
+            history = manager.get_license_usage_history(license.license_key)
+            self.assertEqual(history[0].timestamp, datetime(2026, 1, 1, 12, 0))
+
+            batch = manager.batch_create_licenses(3, LicenseType.TRIAL, 1, "PROD-A")
+            self.assertEqual({item.start_date for item in batch}, {datetime(2026, 1, 1, 12, 0)})
+
+            self.assertFalse(manager.validator.is_license_expired(license))
+            self.assertEqual(manager.sweep_expired_licenses(), 0)
+
+            # 推进时钟即可确定性地测试过期
+            clock.advance(days=31)
+            self.assertTrue(manager.validator.is_license_expired(license))
+            self.assertEqual(manager.sweep_expired_licenses(), 1)
+            self.assertEqual(manager.get_license_by_key(license.license_key).status, LicenseStatus.EXPIRED)
+        finally:
+            manager.repository.close()
+
+    def test_model_timestamps(self):
+        created_at = datetime(2026, 1, 1)
+        license = License("KEY-1", LicenseType.TRIAL, created_at, created_at, "PROD-A", created_at=created_at)
+        self.assertEqual((license.created_at, license.updated_at), (created_at, created_at))
+        data = license.to_dict()
+        del data['updated_at']
+        self.assertEqual(License.from_dict(data).updated_at, created_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import os
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.expiration_sweeper import ExpirationSweeper
+from src.clock import FakeClock
+
+
+class TestExpirationSweeper(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_expiration_sweeper.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.now = datetime.now()
+
+    def tearDown(self):
+        self.manager.stop_expiration_sweeper()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _create(self, product_id, end_date, status=LicenseStatus.ACTIVE):
+        # 不同的产品ID保证生成的许可证密钥互不相同
+        license = self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=end_date - timedelta(days=30),
+            end_date=end_date,
+            product_id=product_id
+        )
+        if status != license.status:
+            license.status = status
+            self.manager.update_license(license)
+        return license
+
+    def test_sweep_expired_licenses(self):
+        expired = self._create("SWEEP-1", self.now - timedelta(days=1))
+        pending = self._create("SWEEP-2", self.now - timedelta(hours=1), status=LicenseStatus.PENDING)
+        revoked = self._create("SWEEP-3", self.now - timedelta(days=1), status=LicenseStatus.REVOKED)
+        valid = self._create("SWEEP-4", self.now + timedelta(days=1))
+
+        count = self.manager.sweep_expired_licenses(now=self.now, chunk_size=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.manager.get_license_by_key(expired.license_key).status, LicenseStatus.EXPIRED)
+        self.assertEqual(self.manager.get_license_by_key(pending.license_key).status, LicenseStatus.EXPIRED)
+        self.assertEqual(self.manager.get_license_by_key(revoked.license_key).status, LicenseStatus.REVOKED)
+        self.assertEqual(self.manager.get_license_by_key(valid.license_key).status, LicenseStatus.ACTIVE)
+        self.assertEqual(len(self.manager.get_all_licenses(status=LicenseStatus.EXPIRED)), 2)
+
+        # 每次清理只记录一条汇总审计日志
+        history = self.manager.get_license_usage_history("batch")
+        sweeps = [log for log in history if log.action == "过期清理"]
+        self.assertEqual(len(sweeps), 1)
+        self.assertEqual(sweeps[0].details["count"], 2)
+
+    def test_get_next_expiration(self):
+        self.assertIsNone(self.manager.get_next_expiration())
+
+        first = self._create("SWEEP-1", self.now + timedelta(days=2))
+        self._create("SWEEP-2", self.now + timedelta(days=5))
+        self._create("SWEEP-3", self.now + timedelta(days=1), status=LicenseStatus.REVOKED)
+
+        self.assertEqual(self.manager.get_next_expiration(), first.end_date)
+
+    def test_run_pending(self):
+        license = self._create("SWEEP-1", self.now + timedelta(days=1))
+        self._create("SWEEP-2", self.now + timedelta(days=3))
+        sweeper = ExpirationSweeper(self.manager)
+        sweeper.schedule(self.manager.get_next_expiration())
+
+        # 尚未到期时不执行清理
+        self.assertEqual(sweeper.run_pending(now=self.now), 0)
+        self.assertEqual(sweeper.sweep_count, 0)
+
+        count = sweeper.run_pending(now=self.now + timedelta(days=2))
+        self.assertEqual(count, 1)
+        self.assertEqual(self.manager.get_license_by_key(license.license_key).status, LicenseStatus.EXPIRED)
+        self.assertEqual(sweeper.next_due(), self.now + timedelta(days=3))
+
+    def test_background_sweeper(self):
+        license = self._create("SWEEP-1", self.now + timedelta(days=1))
+        sweeper = self.manager.start_expiration_sweeper(max_interval=0.05)
+        self.assertEqual(sweeper.next_due(), license.end_date)
+
+        # 新建更早到期的许可证会唤醒调度线程
+        expired = self._create("SWEEP-2", self.now - timedelta(seconds=1))
+        for _ in range(100):
+            if self.manager.get_license_by_key(expired.license_key).status == LicenseStatus.EXPIRED:
+                break
+            time.sleep(0.02)
+
+        self.assertEqual(self.manager.get_license_by_key(expired.license_key).status, LicenseStatus.EXPIRED)
+        self.assertEqual(self.manager.get_license_by_key(license.license_key).status, LicenseStatus.ACTIVE)
+
+    def test_sweep_failure_is_logged(self):
+        # 调度线程按管理器的时钟计算等待时间：模拟时钟下许可证已到期，实际时间下尚未到期
+        clock = FakeClock(self.now + timedelta(days=2))
+        self.manager.repository.close()
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key", clock=clock)
+        self._create("SWEEP-1", self.now + timedelta(days=1))
+        with patch.object(self.manager, 'sweep_expired_licenses', side_effect=RuntimeError("disk full")), \
+                self.assertLogs('src.expiration_sweeper', level='ERROR') as logs:
+            self.manager.start_expiration_sweeper(max_interval=3600)
+            for _ in range(100):
+                if logs.records:
+                    break
+                time.sleep(0.02)
+            self.manager.stop_expiration_sweeper()
+        self.assertIn("disk full", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import json
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+from src.models import LicenseType
+from src.license_generator import LicenseGenerator
+from src.license_validator import LicenseValidator
+from src.license_client import LicenseClient, remote_online_check
+from src.clock import FakeClock
+
+
+class TestLicenseClient(unittest.TestCase):
+    cache_path = "test_license_cache.json"
+    day = 24 * 3600
+
+    def setUp(self):
+        self.validator = LicenseValidator("test_secret_key")
+        self.generator = LicenseGenerator("test_secret_key")
+        self.license_key = self._license_key(end_days=365)
+
+        self.clock = FakeClock()
+        self.online = Mock(return_value=(True, "许可证验证成功"))
+        self.client = self._client()
+
+    def tearDown(self):
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def _license_key(self, end_days):
+        now = datetime.now()
+        return self.generator.generate_license_key(
+            LicenseType.STANDARD, now - timedelta(days=30), now + timedelta(days=end_days), "PROD-A"
+        ).license_key
+
+    def _client(self, **options):
+        options.setdefault('license_key', self.license_key)
+        return LicenseClient(
+            self.validator, product_id="PROD-A", cache_path=self.cache_path, machine_info={"machine_id": "m1"},
+            online_check=self.online, revalidate_interval=self.day, grace_period=7 * self.day,
+            jitter=0.1, clock=self.clock.monotonic, rng=lambda: 1.0, **options
+        )
+
+    def test_cached_result_skips_online_check(self):
+        self.assertEqual(self.client.check(), (True, "许可证验证成功"))
+        self.assertEqual(self.client.check(), (True, "许可证验证成功（本地缓存）"))
+        self.assertEqual(self.online.call_count, 1)
+
+        # rng 为1时检查间隔拉长10%
+        self.clock.advance(self.day * 1.05)
+        self.client.check()
+        self.assertEqual(self.online.call_count, 1)
+        self.clock.advance(self.day * 0.1)
+        self.client.check()
+        self.assertEqual(self.online.call_count, 2)
+
+    def test_offline_failure_short_circuits(self):
+        client = self._client(license_key=self._license_key(end_days=-1))
+        self.assertEqual(client.check(), (False, "许可证已过期"))
+        self.online.assert_not_called()
+
+    def test_grace_period(self):
+        self.client.check()
+        self.online.side_effect = ConnectionError("timeout")
+
+        self.clock.advance(3 * self.day)
+        valid, message = self.client.check()
+        self.assertTrue(valid)
+        self.assertIn("宽限期", message)
+
+        self.clock.advance(5 * self.day)
+        self.assertFalse(self.client.check()[0])
+
+    def test_transient_failure_uses_grace_period(self):
+        self.client.check()
+        self.clock.advance(2 * self.day)
+        for message in ("验证请求过于频繁，请稍后再试", "在线验证失败: database is locked"):
+            self.online.return_value = (False, message)
+            valid, message = self.client.check()
+            self.assertTrue(valid)
+            self.assertIn("宽限期", message)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+    def test_revoked_clears_cache(self):
+        self.client.check()
+        self.clock.advance(2 * self.day)
+        self.online.return_value = (False, "许可证已被吊销")
+        self.assertEqual(self.client.check(), (False, "许可证已被吊销"))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_tampered_cache_ignored(self):
+        self.client.check()
+        with open(self.cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['payload']['next_check_at'] += 365 * self.day
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        self.clock.advance(2 * self.day)
+        self.client.check()
+        self.assertEqual(self.online.call_count, 2)
+
+    def test_malformed_cache_ignored(self):
+        for data in ([], {"payload": [], "signature": "x"}, {"payload": {}, "signature": 1}):
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            self.assertIsNone(self.client._load_cache())
+        self.client.check()
+        self.assertEqual(self.online.call_count, 1)
+
+    def test_cache_bound_to_machine(self):
+        self.client.check()
+        other = LicenseClient(self.validator, self.license_key, "PROD-A", self.cache_path,
+                              machine_info={"machine_id": "m2"}, online_check=self.online, clock=self.clock.monotonic)
+        other.check()
+        self.assertEqual(self.online.call_count, 2)
+
+    def test_remote_check_unreachable(self):
+        check = remote_online_check("http://127.0.0.1:9", timeout=0.5)
+        with self.assertRaises(ConnectionError):
+            check("KEY-1", "PROD-A", {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
 import unittest
+import os
+import sys
+import subprocess
 from datetime import datetime, timedelta
 from src.models import LicenseType
 from src.license_generator import LicenseGenerator
@@ -103,5 +106,17 @@ class TestLicenseGenerator(unittest.TestCase):
             self.assertNotIn(license.license_key, other_keys)
 
 
+    def test_crypto_imported_lazily(self):
+        # 只构造管理器不做加解密时不应导入 cryptography
+        script = (
+            "import sys\n"
+            "from src.license_manager import LicenseManager\n"
+            "LicenseManager(db_path=':memory:')\n"
+            "print(any(name.startswith('cryptography') for name in sys.modules))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "False")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import unittest
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+
+
+class TestLicenseImportExport(unittest.TestCase):
+    def setUp(self):
+        self.paths = ["test_export_source.db", "test_export_target.db", "test_export.jsonl.gz", "test_export.csv"]
+        self.source = LicenseManager(db_path=self.paths[0], secret_key="test_secret_key")
+        self.target = LicenseManager(db_path=self.paths[1], secret_key="test_secret_key")
+        self.now = datetime.now()
+        self.licenses = [
+            License(
+                license_key=f"KEY-{i}",
+                license_type=LicenseType.STANDARD,
+                start_date=self.now,
+                end_date=self.now + timedelta(days=30),
+                product_id="PROD-A" if i % 2 else "PROD-B",
+                user_info={"company": "示例公司", "note": "含有,逗号和\"引号\""},
+                status=LicenseStatus.ACTIVE
+            )
+            for i in range(25)
+        ]
+        self.source.repository.save_licenses(self.licenses)
+
+    def tearDown(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _dicts(self, manager):
+        return sorted((license.to_dict() for license in manager.get_all_licenses()),
+                      key=lambda data: data['license_key'])
+
+    def test_round_trip(self):
+        for path in self.paths[2:]:
+            with self.subTest(path=path):
+                progress = []
+                self.assertEqual(self.source.export_licenses(path, chunk_size=10, progress=progress.append), 25)
+                self.assertEqual(progress, [10, 20, 25])
+
+                self.assertEqual(self.target.import_licenses(path, on_conflict='replace', chunk_size=10), 25)
+                self.assertEqual(self._dicts(self.target), self._dicts(self.source))
+
+    def test_gzip_detected_by_extension(self):
+        self.source.export_licenses(self.paths[2])
+        with open(self.paths[2], 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+
+    def test_export_filter(self):
+        count = self.source.export_licenses(self.paths[3], product_id="PROD-A")
+        self.assertEqual(count, 12)
+        self.target.import_licenses(self.paths[3])
+        self.assertEqual({lic.product_id for lic in self.target.get_all_licenses()}, {"PROD-A"})
+
+    def test_conflict_policies(self):
+        self.source.export_licenses(self.paths[3])
+        self.target.repository.save_license(self.licenses[0])
+        changed = self.target.get_license_by_key("KEY-0")
+        changed.status = LicenseStatus.REVOKED
+        self.target.repository.update_license(changed)
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.target.import_licenses(self.paths[3], chunk_size=100)
+        self.assertEqual(len(self.target.get_all_licenses()), 1)
+
+        self.assertEqual(self.target.import_licenses(self.paths[3], on_conflict='skip'), 24)
+        self.assertEqual(self.target.get_license_by_key("KEY-0").status, LicenseStatus.REVOKED)
+
+        self.assertEqual(self.target.import_licenses(self.paths[3], on_conflict='replace'), 25)
+        self.assertEqual(self.target.get_license_by_key("KEY-0").status, LicenseStatus.ACTIVE)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.source.export_licenses("licenses.xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,11 @@
 import unittest
 import os
 import sqlite3
+import types
 from datetime import datetime, timedelta
 from src.models import LicenseType, LicenseStatus
 from src.license_manager import LicenseManager
+from src.metrics import METRICS
 
 
 class TestLicenseManager(unittest.TestCase):
@@ -194,6 +196,39 @@ class TestLicenseManager(unittest.TestCase):
         self.assertIn("首次验证", actions)
         self.assertIn("再次验证", actions)
 
+    def test_from_settings(self):
+        settings = types.SimpleNamespace(
+            DATABASE_PATH="test_settings.db", SECRET_KEY="settings_secret_key", AUDIT_RETENTION_MONTHS=6,
+            AGGREGATE_VALIDATIONS=True, INDEXED_USER_INFO_FIELDS=["company"], FULL_TEXT_SEARCH_ENABLED=True,
+            MAX_ACTIVATION_COUNT=2, MACHINE_FINGERPRINT_ENABLED=False, METRICS_ENABLED=False,
+            RESERVOIR_SKUS=[("PROD-A", "STANDARD", 30)], RESERVOIR_TARGET_SIZE=4, RESERVOIR_LOW_WATER=1
+        )
+        manager = LicenseManager.from_settings(settings, db_path=self.test_db_path)
+        try:
+            # 关键字参数优先于配置
+            self.assertEqual(manager.db_path, self.test_db_path)
+            self.assertEqual(manager.secret_key, "settings_secret_key")
+            self.assertTrue(manager.aggregate_validations)
+            self.assertEqual(manager.max_activation_count, 2)
+            self.assertFalse(manager.machine_fingerprint_enabled)
+            self.assertEqual(manager.repository.audit_store.retention_months, 6)
+            self.assertEqual(manager.repository.user_info_index.fields, ("company",))
+            self.assertTrue(manager.repository.user_info_index.full_text)
+            self.assertEqual(manager.reservoir.target_size, 4)
+            self.assertEqual(manager.reservoir.low_water, 1)
+        finally:
+            manager.stop_license_reservoir()
+            manager.repository.close()
+
+        settings.METRICS_ENABLED = True
+        manager = LicenseManager.from_settings(settings, start_reservoir=False, db_path=self.test_db_path)
+        try:
+            self.assertIsNone(manager.reservoir)
+            self.assertTrue(METRICS.enabled)
+        finally:
+            METRICS.disable()
+            manager.repository.close()
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import unittest
+import os
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.license_reservoir import LicenseReservoir, issue_period
+
+
+class TestLicenseReservoir(unittest.TestCase):
+    test_db_path = "test_reservoir.db"
+
+    def setUp(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.now = datetime(2026, 3, 1, 15, 30)
+        self.reservoir = LicenseReservoir(
+            self.manager.generator, [("PROD-A", LicenseType.STANDARD, 365)],
+            target_size=4, low_water=2, clock=lambda: self.now
+        )
+
+    def tearDown(self):
+        self.manager.stop_license_reservoir()
+        self.manager.repository.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_issue_period(self):
+        start_date, end_date = issue_period(self.now, 30)
+        self.assertEqual(start_date, datetime(2026, 3, 1))
+        self.assertEqual(end_date, datetime(2026, 3, 31))
+
+    def test_create_license_uses_reservoir(self):
+        self.assertEqual(self.reservoir.refill(), 4)
+        self.manager.reservoir = self.reservoir
+        start_date, end_date = issue_period(self.now, 365)
+
+        with patch.object(self.manager.generator, 'generate_license_key') as generate:
+            license = self.manager.create_license(LicenseType.STANDARD, start_date, end_date, "PROD-A",
+                                                  user_info={"company": "Acme"})
+        generate.assert_not_called()
+
+        stored = self.manager.get_license_by_key(license.license_key)
+        self.assertEqual(stored.user_info, {"company": "Acme"})
+        self.assertEqual(stored.start_date, start_date)
+        self.assertEqual(self.reservoir.stats()['hits'], 1)
+        self.assertEqual(self.reservoir.stats()['sizes'], {"PROD-A/STANDARD/365": 3})
+
+    def test_fallback_when_not_matching(self):
+        self.reservoir.refill()
+        self.manager.reservoir = self.reservoir
+        start_date = datetime.now()
+
+        # 有效期与预生成的不同、商品未配置时都同步生成
+        self.manager.create_license(LicenseType.STANDARD, start_date, start_date + timedelta(days=365), "PROD-A")
+        self.manager.create_license(LicenseType.STANDARD, start_date, start_date + timedelta(days=365), "PROD-B")
+        stats = self.reservoir.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 1))
+        self.assertEqual(stats['sizes'], {"PROD-A/STANDARD/365": 4})
+        self.assertEqual(len(self.manager.get_all_licenses()), 2)
+
+    def test_low_water_and_day_change(self):
+        self.reservoir.refill()
+        start_date, end_date = issue_period(self.now, 365)
+        keys = {self.reservoir.take("PROD-A", LicenseType.STANDARD, start_date, end_date).license_key
+                for _ in range(2)}
+        self.assertEqual(len(keys), 2)
+        self.assertFalse(self.reservoir._wakeup.is_set())
+        self.reservoir.take("PROD-A", LicenseType.STANDARD, start_date, end_date)
+        self.assertTrue(self.reservoir._wakeup.is_set())
+
+        # 日期变化后旧密钥被丢弃
+        self.now += timedelta(days=1)
+        self.assertIsNone(self.reservoir.take("PROD-A", LicenseType.STANDARD, start_date, end_date))
+        self.assertEqual(self.reservoir.stats()['discarded'], 1)
+        self.assertEqual(self.reservoir.refill(), 4)
+        start_date, end_date = issue_period(self.now, 365)
+        self.assertIsNotNone(self.reservoir.take("PROD-A", LicenseType.STANDARD, start_date, end_date))
+
+    def test_background_refill(self):
+        reservoir = self.manager.start_license_reservoir(
+            [("PROD-A", LicenseType.TRIAL, 30)], target_size=3, low_water=3, interval=0.01
+        )
+        self.assertEqual(reservoir.stats()['sizes'], {"PROD-A/TRIAL/30": 3})
+        license = self.manager.issue_license("PROD-A", LicenseType.TRIAL, 30)
+        self.assertEqual(reservoir.stats()['hits'], 1)
+        self.assertEqual((license.end_date - license.start_date).days, 30)
+
+        for _ in range(100):
+            if reservoir.stats()['sizes']["PROD-A/TRIAL/30"] == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(reservoir.stats()['sizes'], {"PROD-A/TRIAL/30": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.license_validator import LicenseValidator
+from src.memory_repository import InMemoryLicenseRepository
+from src.license_snapshot import LicenseSnapshot, SnapshotRepository, write_snapshot
+
+
+class TestLicenseSnapshot(unittest.TestCase):
+    snapshot_path = "test_licenses.snapshot"
+
+    def setUp(self):
+        self.now = datetime.now()
+
+    def tearDown(self):
+        for path in (self.snapshot_path, self.snapshot_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _license(self, key, product_id="PROD-A", status=LicenseStatus.ACTIVE):
+        return License(
+            license_key=key,
+            license_type=LicenseType.ENTERPRISE,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + timedelta(days=30),
+            product_id=product_id,
+            status=status
+        )
+
+    def test_lookup(self):
+        licenses = [self._license(f"KEY-{i}", product_id=f"PROD-{i % 3}") for i in range(500)]
+        licenses[7].status = LicenseStatus.REVOKED
+        self.assertEqual(write_snapshot(self.snapshot_path, licenses), 500)
+
+        snapshot = LicenseSnapshot(self.snapshot_path)
+        try:
+            self.assertEqual(len(snapshot), 500)
+            for license in licenses:
+                self.assertEqual(snapshot.lookup(license.license_key),
+                                 (license.product_id, license.status, license.end_date))
+            stored = snapshot.get_license("KEY-7")
+            self.assertEqual(stored.license_type, LicenseType.ENTERPRISE)
+            self.assertEqual(stored.start_date, licenses[7].start_date)
+            self.assertEqual(stored.status, LicenseStatus.REVOKED)
+            self.assertIsNone(snapshot.lookup("MISSING"))
+            self.assertNotIn("MISSING", snapshot)
+        finally:
+            snapshot.close()
+
+    def test_streamed_licenses_with_estimated_count(self):
+        # 许可证按迭代器逐条写入，count 只用于确定哈希表大小
+        licenses = (self._license(f"KEY-{i}") for i in range(40))
+        self.assertEqual(write_snapshot(self.snapshot_path, licenses, count=30), 40)
+        snapshot = LicenseSnapshot(self.snapshot_path)
+        try:
+            self.assertEqual(len(snapshot), 40)
+            self.assertEqual(snapshot.slot_count, 64)
+            self.assertEqual(snapshot.lookup("KEY-39")[0], "PROD-A")
+        finally:
+            snapshot.close()
+
+        with self.assertRaises(ValueError):
+            write_snapshot(self.snapshot_path, (self._license(f"KEY-{i}") for i in range(20)), count=0)
+
+    def test_empty_snapshot(self):
+        self.assertEqual(write_snapshot(self.snapshot_path, []), 0)
+        repository = SnapshotRepository(self.snapshot_path)
+        self.assertIsNone(repository.get_license_by_key("KEY-1"))
+        repository.close()
+
+    def test_invalid_file(self):
+        with open(self.snapshot_path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            LicenseSnapshot(self.snapshot_path)
+
+    def test_reload_after_publish(self):
+        write_snapshot(self.snapshot_path, [self._license("KEY-1")])
+        repository = SnapshotRepository(self.snapshot_path)
+        self.assertFalse(repository.reload())
+
+        old_snapshot = repository.snapshot
+        write_snapshot(self.snapshot_path, [self._license("KEY-1", status=LicenseStatus.REVOKED),
+                                            self._license("KEY-2")])
+        self.assertTrue(repository.reload())
+        self.assertEqual(repository.get_license_by_key("KEY-1").status, LicenseStatus.REVOKED)
+        self.assertIsNotNone(repository.get_license_by_key("KEY-2"))
+        # 切换前取得的旧快照仍可继续读取
+        self.assertEqual(old_snapshot.lookup("KEY-1")[1], LicenseStatus.ACTIVE)
+        repository.close()
+
+    def test_manager_export_and_replica_validation(self):
+        manager = LicenseManager(secret_key="test_secret_key", repository=InMemoryLicenseRepository())
+        license = manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + timedelta(days=30),
+            product_id="PROD-A"
+        )
+        self.assertEqual(manager.export_snapshot(self.snapshot_path), 1)
+
+        replica = LicenseValidator("test_secret_key")
+        replica.set_license_repository(SnapshotRepository(self.snapshot_path))
+        self.assertEqual(replica.validate_license_online(license.license_key, "PROD-A", {}),
+                         (True, "许可证验证成功"))
+        self.assertEqual(replica.validate_license_online("MISSING", "PROD-A", {}), (False, "许可证不存在"))
+        replica.license_repository.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import os
+from benchmarks.load_test import run_load_test, parse_mix
+
+
+class TestLoadTest(unittest.TestCase):
+    test_db_path = "test_load_test.db"
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("validate=8, revoke=2"), {'validate': 8.0, 'revoke': 2.0})
+        with self.assertRaises(ValueError):
+            parse_mix("delete=1")
+
+    def test_short_run(self):
+        report = run_load_test(self.test_db_path, processes=2, threads=2, duration=0.5,
+                               mix={'validate': 6, 'create': 2, 'revoke': 2}, dataset_size=200)
+
+        self.assertEqual(set(report['operations']) - {'lock_probe'}, {'validate', 'create', 'revoke'})
+        for stats in report['operations'].values():
+            self.assertGreater(stats['count'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreater(report['total_ops_per_sec'], 0)
+        self.assertGreater(report['lock_wait']['samples'], 0)
+        self.assertIsInstance(report['errors'], dict)
+        # 验证使用签发的许可证和其自身的产品ID，吊销只作用于数据集，验证不应被拒绝
+        validate = report['operations']['validate']
+        self.assertEqual(validate['rejected'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
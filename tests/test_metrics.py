@@ -0,0 +1,87 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.metrics import METRICS, Metrics, Histogram, timed
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(enabled=True)
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram()
+        for _ in range(98):
+            histogram.observe(0.0004)
+        histogram.observe(0.2)
+        histogram.observe(0.2)
+        self.assertEqual(histogram.quantile(0.5), 0.0005)
+        self.assertEqual(histogram.quantile(0.99), 0.25)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_snapshot_and_prometheus(self):
+        self.metrics.observe("db.get_license_by_key", 0.001)
+        self.metrics.observe("db.get_license_by_key", 0.002, error=True)
+        self.metrics.record_cache("connection_pool", True)
+        self.metrics.record_cache("connection_pool", True)
+        self.metrics.record_cache("connection_pool", False)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['operations']["db.get_license_by_key"]['count'], 2)
+        self.assertEqual(snapshot['operations']["db.get_license_by_key"]['errors'], 1)
+        self.assertAlmostEqual(snapshot['caches']["connection_pool"]['hit_rate'], 2 / 3)
+
+        text = self.metrics.prometheus()
+        self.assertIn('license_operation_duration_seconds_count{operation="db.get_license_by_key"} 2', text)
+        self.assertIn('license_operation_duration_seconds_bucket{operation="db.get_license_by_key",le="+Inf"} 2', text)
+        self.assertIn('license_operation_errors_total{operation="db.get_license_by_key"} 1', text)
+        self.assertIn('license_cache_requests_total{cache="connection_pool",result="miss"} 1', text)
+
+    def test_disabled_records_nothing(self):
+        self.metrics.disable()
+        self.metrics.record_cache("connection_pool", True)
+        self.assertEqual(self.metrics.snapshot()['caches'], {})
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_metrics.db"
+        METRICS.reset()
+        METRICS.enable()
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+
+    def tearDown(self):
+        METRICS.disable()
+        METRICS.reset()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_operations_recorded(self):
+        now = datetime.now()
+        license = self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=now,
+            end_date=now + timedelta(days=30),
+            product_id="PROD-A"
+        )
+        self.manager.validator.validate_license_offline(license.license_key, "PROD-A")
+
+        operations = self.manager.metrics()['operations']
+        for name in ("manager.create_license", "generator.generate_license_key", "generator.encrypt_data",
+                     "db.save_licenses", "validator.validate_license_offline"):
+            self.assertGreaterEqual(operations[name]['count'], 1, name)
+        self.assertIn("connection_pool", self.manager.metrics()['caches'])
+
+    def test_timed_propagates_errors(self):
+        @timed("test.failing")
+        def failing():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            failing()
+        self.assertEqual(METRICS.snapshot()['operations']["test.failing"]['errors'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
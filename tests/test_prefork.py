@@ -0,0 +1,228 @@
+import unittest
+import os
+import json
+import time
+import signal
+import http.client
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.license_validator import LicenseValidator
+from src.memory_repository import InMemoryLicenseRepository
+from src.sqlite_repository import SQLiteLicenseRepository
+from src.prefork import RevocationSet, SharedStateRepository, PreforkSupervisor, _build_shared_snapshot
+from src.license_snapshot import LicenseSnapshot
+from src.sharded_repository import ShardedSQLiteRepository, shard_paths
+
+
+class TestPrefork(unittest.TestCase):
+    test_db_path = "test_prefork.db"
+
+    def setUp(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.now = datetime.now()
+        self.manager.repository.save_licenses([self._license(f"KEY-{i}") for i in range(20)])
+        self.elapsed = [0.0]
+        self.supervisor = PreforkSupervisor(self.manager, "test_secret_key", processes=2, port=0,
+                                            snapshot_interval=60, clock=lambda: self.elapsed[0])
+
+    def tearDown(self):
+        self.supervisor.stop()
+        self.manager.repository.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _license(self, key):
+        return License(
+            license_key=key,
+            license_type=LicenseType.STANDARD,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + timedelta(days=30),
+            product_id="PROD-A",
+            status=LicenseStatus.ACTIVE
+        )
+
+    def test_revocation_set(self):
+        revocations = RevocationSet.create(capacity=6)
+        try:
+            self.assertEqual(revocations.capacity, 8)
+            self.assertTrue(revocations.add("KEY-1"))
+            self.assertFalse(revocations.add("KEY-1"))
+
+            reader = RevocationSet.attach(revocations.name)
+            self.assertIn("KEY-1", reader)
+            self.assertNotIn("KEY-2", reader)
+            for i in range(2, 5):
+                revocations.add(f"KEY-{i}")
+            self.assertEqual(len(reader), 4)
+            self.assertTrue(reader.full)
+            self.assertIn("KEY-4", reader)
+            reader.close()
+        finally:
+            revocations.close()
+            revocations.unlink()
+
+    def test_shared_snapshot_with_large_product_table(self):
+        licenses = [self._license(f"KEY-{i}") for i in range(10)]
+        for i, license in enumerate(licenses):
+            license.product_id = f"PRODUCT-{i:04d}"
+        with patch('src.prefork.PRODUCT_TABLE_RESERVE', 16):
+            snapshot_shm, count = _build_shared_snapshot(iter(licenses), len(licenses))
+        try:
+            self.assertEqual(count, 10)
+            snapshot = LicenseSnapshot.from_buffer(snapshot_shm.buf)
+            self.assertEqual(snapshot.lookup("KEY-9")[0], "PRODUCT-0009")
+            snapshot.close()
+        finally:
+            snapshot_shm.close()
+            snapshot_shm.unlink()
+
+    def test_repository_follows_published_state(self):
+        self.assertEqual(self.supervisor.publish_snapshot(), 20)
+        repository = SharedStateRepository(self.supervisor.state_name)
+        try:
+            self.assertEqual(repository.get_license_by_key("KEY-1").status, LicenseStatus.ACTIVE)
+            self.assertIsNone(repository.get_license_by_key("MISSING"))
+
+            # 吊销直接写入共享的吊销集合，无需重建快照
+            self.manager.revoke_license("KEY-1")
+            self.assertEqual(self.supervisor.sync(), {'revoked': 1, 'republished': False})
+            self.assertEqual(repository.get_license_by_key("KEY-1").status, LicenseStatus.REVOKED)
+
+            # 新建的许可证在下一次重建快照后可见
+            self.manager.repository.save_license(self._license("KEY-NEW"))
+            self.assertFalse(self.supervisor.sync()['republished'])
+            self.assertIsNone(repository.get_license_by_key("KEY-NEW"))
+            self.elapsed[0] = 61
+            self.assertTrue(self.supervisor.sync()['republished'])
+            self.assertEqual(repository.get_license_by_key("KEY-NEW").status, LicenseStatus.ACTIVE)
+            self.assertEqual(repository.get_license_by_key("KEY-1").status, LicenseStatus.REVOKED)
+
+            # 撤销吊销需要立即重建快照
+            self.manager.revoke_license("KEY-2")
+            self.supervisor.sync()
+            license = self.manager.get_license_by_key("KEY-2")
+            license.status = LicenseStatus.ACTIVE
+            self.manager.update_license(license)
+            self.assertTrue(self.supervisor.sync()['republished'])
+            self.assertEqual(repository.get_license_by_key("KEY-2").status, LicenseStatus.ACTIVE)
+        finally:
+            repository.close()
+
+    def _issue(self, user_info=None):
+        """签发一个可以离线解密的许可证，返回密钥"""
+        return self.manager.create_license(LicenseType.STANDARD, self.now - timedelta(days=1),
+                                           self.now + timedelta(days=30), "PROD-A", user_info).license_key
+
+    def test_workers_write_activations_and_usage(self):
+        key = self._issue(user_info={"company": "Acme"})
+        self.supervisor.publish_snapshot()
+        writer = SQLiteLicenseRepository(self.test_db_path)
+        repository = SharedStateRepository(self.supervisor.state_name, writer=writer, max_activation_count=1)
+        validator = LicenseValidator("test_secret_key")
+        validator.set_license_repository(repository)
+        try:
+            self.assertTrue(validator.validate_license_online(key, "PROD-A", {"machine_id": "m1"})[0])
+            self.assertTrue(validator.validate_license_online(key, "PROD-A", {"machine_id": "m1"})[0])
+            # 设备激活上限在数据库中检查，所有工作进程共享
+            self.assertEqual(validator.validate_license_online(key, "PROD-A", {"machine_id": "m2"}),
+                             (False, "许可证激活设备数已达上限"))
+        finally:
+            repository.close()
+
+        license = self.manager.get_license_by_key(key)
+        self.assertEqual(license.activation_count, 2)
+        # 使用次数原子累加，不会用快照中的许可证覆盖 user_info 等字段
+        self.assertEqual(license.user_info, {"company": "Acme"})
+        self.assertEqual(len(self.manager.get_activations(key)), 1)
+        self.assertEqual(sum(row['count'] for row in self.manager.repository.get_validation_counters(key)), 2)
+
+    def test_workers_write_validation_audit_logs(self):
+        key = self._issue()
+        self.supervisor.publish_snapshot()
+        writer = SQLiteLicenseRepository(self.test_db_path)
+        repository = SharedStateRepository(self.supervisor.state_name, writer=writer, aggregate_validations=False)
+        validator = LicenseValidator("test_secret_key")
+        validator.set_license_repository(repository)
+        try:
+            self.assertTrue(validator.validate_license_online(key, "PROD-A", {"user_id": "u1"})[0])
+            repository.add_audit_log("解除设备激活", key, "system", {"fingerprint": "f1"})
+        finally:
+            repository.close()
+
+        # 关闭聚合时与 LicenseManager 一样逐条写审计日志，不累加按天计数
+        history = self.manager.get_license_usage_history(key)
+        self.assertEqual({(log.action, log.user_id) for log in history},
+                         {("创建许可证", "system"), ("验证许可证", "u1"), ("解除设备激活", "system")})
+        self.assertEqual(self.manager.get_license_by_key(key).activation_count, 1)
+        self.assertEqual(self.manager.repository.get_validation_counters(key), [])
+
+    def test_refuses_unwritable_backend(self):
+        manager = LicenseManager(secret_key="test_secret_key", repository=InMemoryLicenseRepository(),
+                                 aggregate_validations=True)
+        with self.assertRaises(ValueError):
+            PreforkSupervisor(manager, "test_secret_key", processes=1, port=0)
+        manager.max_activation_count = None
+        manager.aggregate_validations = False
+        with self.assertRaises(ValueError):
+            PreforkSupervisor(manager, "test_secret_key", processes=1, port=0)
+        manager.aggregate_validations = True
+        PreforkSupervisor(manager, "test_secret_key", processes=1, port=0).stop()
+
+    def test_sharded_backend_follows_change_feed(self):
+        base_path = "test_prefork_sharded.db"
+        manager = LicenseManager(secret_key="test_secret_key",
+                                 repository=ShardedSQLiteRepository.from_base_path(base_path, 2))
+        supervisor = PreforkSupervisor(manager, "test_secret_key", processes=1, port=0,
+                                       snapshot_interval=60, clock=lambda: self.elapsed[0])
+        try:
+            manager.repository.save_licenses([self._license(f"KEY-{i}") for i in range(6)])
+            self.assertEqual(supervisor.publish_snapshot(), 6)
+            manager.revoke_license("KEY-1")
+            manager.revoke_license("KEY-4")
+            self.assertEqual(supervisor.sync(), {'revoked': 2, 'republished': False})
+        finally:
+            supervisor.stop()
+            manager.repository.close()
+            for path in shard_paths(base_path, 2):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _revocation(self, port, license_key):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            conn.request("GET", f"/revocation/{license_key}")
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_workers_serve_and_restart(self):
+        port = self.supervisor.start()
+        self.assertEqual(self._revocation(port, "KEY-3"), (200, {
+            "license_key": "KEY-3", "revoked": False, "status": LicenseStatus.ACTIVE.value
+        }))
+
+        self.manager.revoke_license("KEY-3")
+        self.supervisor.sync()
+        # 连接可能由任一工作进程接受，每个进程都能看到吊销
+        for _ in range(4):
+            self.assertTrue(self._revocation(port, "KEY-3")[1]["revoked"])
+
+        killed = self.supervisor.worker_pids()[0]
+        os.kill(killed, signal.SIGKILL)
+        deadline = time.monotonic() + 5
+        restarted = 0
+        while not restarted and time.monotonic() < deadline:
+            restarted = self.supervisor.check_workers()
+            time.sleep(0.05)
+        self.assertEqual(restarted, 1)
+        self.assertNotIn(killed, self.supervisor.worker_pids())
+        self.assertEqual(self._revocation(port, "MISSING")[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.rate_limiter import RateLimiter
+from src.clock import FakeClock
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=3, period=60, clock=self.clock.monotonic)
+
+    def test_token_bucket(self):
+        self.assertEqual([self.limiter.allow("client") for _ in range(4)], [True, True, True, False])
+        # 其他键不受影响
+        self.assertTrue(self.limiter.allow("other"))
+
+        # 每20秒补充一个令牌
+        self.clock.advance(20)
+        self.assertTrue(self.limiter.allow("client"))
+        self.assertFalse(self.limiter.allow("client"))
+
+    def test_multiple_keys_consumed_together(self):
+        for _ in range(3):
+            self.assertTrue(self.limiter.allow(("ip", "1.2.3.4")))
+        # 任一键超限时整体拒绝，另一个键的令牌不被扣除
+        self.assertFalse(self.limiter.allow(("ip", "1.2.3.4"), ("api_key", "k1")))
+        self.assertEqual([self.limiter.allow(("api_key", "k1")) for _ in range(4)], [True, True, True, False])
+
+    def test_idle_buckets_expire(self):
+        for i in range(10):
+            self.limiter.allow(f"client-{i}")
+        self.assertEqual(len(self.limiter), 10)
+
+        # 空闲60秒后令牌已补满，桶在后续检查中被逐步清除
+        self.clock.advance(60)
+        for _ in range(10):
+            self.limiter.allow("active")
+            self.clock.advance(1)
+        self.assertLessEqual(len(self.limiter), 2)
+
+    def test_max_keys(self):
+        limiter = RateLimiter(rate=3, period=60, max_keys=5, clock=self.clock.monotonic)
+        for i in range(20):
+            limiter.allow(f"client-{i}")
+        self.assertEqual(len(limiter), 5)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=0)
+
+
+class TestValidatorRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_rate_limiter.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_rejected_before_crypto_and_db(self):
+        now = datetime.now()
+        license = self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=now,
+            end_date=now + timedelta(days=30),
+            product_id="PROD-A"
+        )
+        validator = self.manager.validator
+        validator.set_rate_limiter(RateLimiter(rate=1, period=60))
+
+        with patch.object(validator, 'validate_license_offline', wraps=validator.validate_license_offline) as offline:
+            self.assertEqual(validator.validate_license_online(license.license_key, "PROD-A", {}),
+                             (True, "许可证验证成功"))
+            with patch.object(self.manager, 'get_license_by_key') as lookup:
+                valid, message = validator.validate_license_online(license.license_key, "PROD-A", {})
+                self.assertFalse(valid)
+                self.assertEqual(message, "验证请求过于频繁，请稍后再试")
+                lookup.assert_not_called()
+            self.assertEqual(offline.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
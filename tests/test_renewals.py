@@ -0,0 +1,125 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.sharded_repository import ShardedSQLiteRepository, shard_index, shard_paths
+from src.clock import FakeClock
+
+
+class TestRenewals(unittest.TestCase):
+    test_db_path = "test_renewals.db"
+
+    def setUp(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+        self.now = datetime(2026, 6, 1, 12, 0)
+        self.clock = FakeClock(self.now)
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key", clock=self.clock)
+        self.licenses = [
+            self._license(f"KEY-{i:02d}", end_days=i - 5,
+                          product_id="PROD-A" if i < 8 else "PROD-B",
+                          status=LicenseStatus.REVOKED if i == 3 else LicenseStatus.ACTIVE)
+            for i in range(10)
+        ]
+        self.manager.repository.save_licenses(self.licenses)
+
+    def tearDown(self):
+        self.manager.repository.close()
+        for path in [self.test_db_path] + shard_paths(self.test_db_path, 3):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _license(self, key, end_days, product_id="PROD-A", status=LicenseStatus.ACTIVE):
+        return License(
+            license_key=key,
+            license_type=LicenseType.STANDARD,
+            start_date=self.now - timedelta(days=365),
+            end_date=self.now + timedelta(days=end_days),
+            product_id=product_id,
+            user_info={"company": "Acme" if key < "KEY-05" else "Other"},
+            status=status
+        )
+
+    def test_renew_by_keys(self):
+        extend_by = timedelta(days=365)
+        renewed = self.manager.renew_licenses(["KEY-01", "KEY-07", "KEY-07", "KEY-03", "MISSING"], extend_by)
+        self.assertEqual(set(renewed), {"KEY-01", "KEY-07"})
+
+        # 已过期的从当前时间起算，未过期的从原到期时间顺延
+        self.assertEqual(renewed["KEY-01"].end_date, self.now + extend_by)
+        self.assertEqual(renewed["KEY-07"].end_date, self.now + timedelta(days=2) + extend_by)
+
+        for old_key, license in renewed.items():
+            stored = self.manager.get_license_by_key(license.license_key)
+            self.assertEqual(stored.status, LicenseStatus.ACTIVE)
+            self.assertEqual(stored.start_date, self.licenses[int(old_key[-2:])].start_date)
+            self.assertEqual(stored.user_info, self.licenses[int(old_key[-2:])].user_info)
+            self.assertEqual(stored.created_at, self.now)
+            self.assertEqual(self.manager.get_license_by_key(old_key).status, LicenseStatus.REVOKED)
+            self.assertEqual(self.manager.get_superseded_by(old_key), license.license_key)
+            history = self.manager.get_license_usage_history(old_key)
+            self.assertEqual(history[0].details["new_license_key"], license.license_key)
+
+        # 再次续期时旧密钥已被吊销，不会重复签发
+        self.assertEqual(self.manager.renew_licenses(["KEY-01"], extend_by), {})
+
+    def test_renew_by_selector_in_parallel(self):
+        counts = []
+        renewed = self.manager.renew_licenses({"product_id": "PROD-A", "status": LicenseStatus.ACTIVE},
+                                              timedelta(days=30), chunk_size=3, workers=2, progress=counts.append)
+        self.assertEqual(sorted(renewed), [f"KEY-{i:02d}" for i in range(8) if i != 3])
+        self.assertEqual(counts, [3, 6, 7])
+        self.assertEqual(len(self.manager.get_all_licenses(product_id="PROD-A", status=LicenseStatus.ACTIVE)), 7)
+        self.assertEqual(self.manager.get_statistics()['total'], 17)
+
+        # 按 user_info 索引字段筛选，上一次续期签发的新许可证同样会被选中
+        previous = {renewed[key].license_key for key in ("KEY-05", "KEY-06", "KEY-07")}
+        renewed = self.manager.renew_licenses({"company": "Other"}, timedelta(days=30))
+        self.assertEqual(set(renewed), {"KEY-08", "KEY-09"} | previous)
+
+    def test_sharded_backend(self):
+        self.manager.repository.close()
+        repository = ShardedSQLiteRepository.from_base_path(self.test_db_path, 3)
+        self.manager = LicenseManager(secret_key="test_secret_key", repository=repository, clock=self.clock)
+        repository.save_licenses(self.licenses)
+
+        renewed = self.manager.renew_licenses([license.license_key for license in self.licenses], timedelta(days=30))
+        self.assertEqual(len(renewed), 9)
+        for old_key, license in renewed.items():
+            self.assertEqual(self.manager.get_superseded_by(old_key), license.license_key)
+            self.assertEqual(self.manager.get_license_by_key(old_key).status, LicenseStatus.REVOKED)
+        self.assertEqual(self.manager.get_statistics()['by_status'][LicenseStatus.ACTIVE.value], 9)
+
+    def test_sharded_link_failure_discards_new_licenses(self):
+        self.manager.repository.close()
+        repository = ShardedSQLiteRepository.from_base_path(self.test_db_path, 3)
+        self.manager = LicenseManager(secret_key="test_secret_key", repository=repository, clock=self.clock)
+        repository.save_licenses(self.licenses)
+        failing = shard_index("KEY-01", 3)
+
+        created = []
+        save_licenses = repository.save_licenses
+
+        def record(licenses, *args, **kwargs):
+            created.extend(licenses)
+            return save_licenses(licenses, *args, **kwargs)
+
+        with patch.object(repository, 'save_licenses', side_effect=record), \
+                patch.object(repository.shards[failing], 'link_renewals', side_effect=ValueError("disk I/O error")):
+            with self.assertRaises(ValueError):
+                self.manager.renew_licenses(["KEY-01", "KEY-02", "KEY-07"], timedelta(days=30))
+
+        # 登记失败的分片对应的新许可证被删除，旧密钥保持有效；其余分片的续期已生效
+        for old_key, license in zip(["KEY-01", "KEY-02", "KEY-07"], created):
+            if shard_index(old_key, 3) == failing:
+                self.assertIsNone(self.manager.get_license_by_key(license.license_key))
+                self.assertEqual(self.manager.get_license_by_key(old_key).status, LicenseStatus.ACTIVE)
+                self.assertIsNone(self.manager.get_superseded_by(old_key))
+            else:
+                self.assertEqual(self.manager.get_superseded_by(old_key), license.license_key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus, AuditLog
+from src.license_manager import LicenseManager
+from src.repository import LicenseRepository
+from src.sqlite_repository import SQLiteLicenseRepository
+from src.memory_repository import InMemoryLicenseRepository
+
+
+class RepositoryContractMixin:
+    """所有存储后端都必须满足的行为"""
+
+    def make_repository(self) -> LicenseRepository:
+        raise NotImplementedError
+
+    def setUp(self):
+        self.repository = self.make_repository()
+        self.now = datetime.now()
+
+    def _license(self, key, product_id="PROD-A", status=LicenseStatus.ACTIVE, end_days=30, user_info=None):
+        return License(
+            license_key=key,
+            license_type=LicenseType.STANDARD,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + timedelta(days=end_days),
+            product_id=product_id,
+            user_info=user_info,
+            status=status
+        )
+
+    def test_save_and_get(self):
+        license = self._license("KEY-1", user_info={"company": "Acme"})
+        self.repository.save_license(license)
+
+        stored = self.repository.get_license_by_key("KEY-1")
+        self.assertEqual(stored.to_dict(), license.to_dict())
+        self.assertIsNone(self.repository.get_license_by_key("MISSING"))
+
+        # 修改返回的对象不影响存储内容
+        stored.user_info["company"] = "Changed"
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").user_info, {"company": "Acme"})
+
+    def test_duplicate_key_rejected(self):
+        self.repository.save_license(self._license("KEY-1"))
+        with self.assertRaises(Exception):
+            self.repository.save_license(self._license("KEY-1"))
+
+    def test_save_conflict_policies(self):
+        self.repository.save_license(self._license("KEY-1"))
+        licenses = [self._license("KEY-1", product_id="PROD-B"), self._license("KEY-2")]
+        self.assertEqual(self.repository.save_licenses(licenses, on_conflict='skip'), 1)
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").product_id, "PROD-A")
+        self.assertEqual(self.repository.save_licenses(licenses, on_conflict='replace'), 2)
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").product_id, "PROD-B")
+        self.assertEqual([lic.license_key for lic in self.repository.iter_licenses(product_id="PROD-A")], ["KEY-2"])
+        with self.assertRaises(ValueError):
+            self.repository.save_licenses(licenses, on_conflict='merge')
+
+    def test_update_and_filter(self):
+        self.repository.save_licenses([
+            self._license("KEY-1"),
+            self._license("KEY-2", product_id="PROD-B"),
+            self._license("KEY-3", status=LicenseStatus.PENDING),
+        ])
+        license = self.repository.get_license_by_key("KEY-1")
+        license.status = LicenseStatus.REVOKED
+        self.assertTrue(self.repository.update_license(license))
+        self.assertFalse(self.repository.update_license(self._license("MISSING")))
+
+        self.assertEqual(len(self.repository.get_all_licenses()), 3)
+        self.assertEqual([lic.license_key for lic in self.repository.get_all_licenses(product_id="PROD-A")],
+                         ["KEY-1", "KEY-3"])
+        self.assertEqual([lic.license_key for lic in self.repository.get_all_licenses(status=LicenseStatus.REVOKED)],
+                         ["KEY-1"])
+
+    def test_search(self):
+        self.repository.save_licenses([
+            self._license("KEY-1", user_info={"company": "Acme", "batch_id": 1}),
+            self._license("KEY-2", user_info={"company": "Acme", "batch_id": 2}),
+            self._license("KEY-3", user_info={"company": "Globex"}),
+        ])
+        self.assertEqual([lic.license_key for lic in self.repository.search_licenses(company="Acme")],
+                         ["KEY-1", "KEY-2"])
+        self.assertEqual([lic.license_key for lic in self.repository.search_licenses(batch_id=2)], ["KEY-2"])
+        self.assertEqual(len(self.repository.search_licenses(company="Acme", limit=1)), 1)
+        with self.assertRaises(ValueError):
+            self.repository.search_licenses(phone="123")
+
+    def test_expiration(self):
+        self.repository.save_licenses([
+            self._license("KEY-1", end_days=-1),
+            self._license("KEY-2", end_days=-2, status=LicenseStatus.REVOKED),
+            self._license("KEY-3", end_days=5),
+        ])
+        self.assertEqual(self.repository.get_next_expiration(), self.now - timedelta(days=1))
+        self.assertEqual(self.repository.expire_licenses(self.now, chunk_size=1), 1)
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").status, LicenseStatus.EXPIRED)
+        self.assertEqual(self.repository.get_next_expiration(), self.now + timedelta(days=5))
+
+    def test_change_feed(self):
+        self.repository.save_licenses([self._license("KEY-1"), self._license("KEY-2", end_days=-1)])
+        self.repository.record_usage("KEY-1", {"machine_id": "m1"}, self.now)
+        license = self.repository.get_license_by_key("KEY-1")
+        license.status = LicenseStatus.REVOKED
+        self.repository.update_license(license)
+        self.repository.expire_licenses(self.now)
+
+        changes = self.repository.changes_since(0)
+        self.assertEqual([(c['seq'], c['license_key'], c['operation'], c['status']) for c in changes], [
+            (1, "KEY-1", "create", LicenseStatus.ACTIVE),
+            (2, "KEY-2", "create", LicenseStatus.ACTIVE),
+            (3, "KEY-1", "update", LicenseStatus.REVOKED),
+            (4, "KEY-2", "update", LicenseStatus.EXPIRED),
+        ])
+        self.assertEqual([c['seq'] for c in self.repository.changes_since(2, limit=1)], [3])
+        self.assertEqual(self.repository.changes_since(4), [])
+
+    def test_audit_history(self):
+        for action in ("创建许可证", "验证许可证", "吊销许可证"):
+            self.repository.add_audit_log(action=action, license_key="KEY-1", user_id="system", details={})
+        self.repository.add_audit_log(action="创建许可证", license_key="KEY-2", user_id="system")
+
+        history = list(self.repository.iter_usage_history("KEY-1", limit=2))
+        self.assertEqual([log.action for log in history], ["吊销许可证", "验证许可证"])
+        rest = list(self.repository.iter_usage_history("KEY-1", cursor=history[-1].cursor))
+        self.assertEqual([log.action for log in rest], ["创建许可证"])
+        filtered = list(self.repository.iter_usage_history("KEY-1", actions=["验证许可证"]))
+        self.assertEqual([log.action for log in filtered], ["验证许可证"])
+
+    def test_usage_and_activations(self):
+        self.repository.save_license(self._license("KEY-1"))
+        machine_info = {"user_id": "user1", "machine_id": "m1"}
+        self.repository.record_usage("KEY-1", machine_info, self.now)
+        self.repository.record_usage("KEY-1", machine_info, self.now)
+
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").activation_count, 2)
+        counters = self.repository.get_validation_counters("KEY-1")
+        self.assertEqual([(c['count'], c['machine_info']) for c in counters], [(2, machine_info)])
+
+        self.assertTrue(self.repository.add_activation("KEY-1", "fp-1", 1, self.now))
+        self.assertTrue(self.repository.add_activation("KEY-1", "fp-1", 1, self.now))
+        self.assertFalse(self.repository.add_activation("KEY-1", "fp-2", 1, self.now))
+        self.assertEqual([a['validation_count'] for a in self.repository.get_activations("KEY-1")], [2])
+        self.assertTrue(self.repository.remove_activation("KEY-1", "fp-1"))
+        self.assertEqual(self.repository.get_activations("KEY-1"), [])
+
+    def test_save_renewals(self):
+        self.repository.save_licenses([self._license("KEY-1"), self._license("KEY-2", status=LicenseStatus.REVOKED)])
+        renewed = self._license("KEY-1B", end_days=395)
+        log = AuditLog(action="续期许可证", license_key="KEY-1", user_id="system", timestamp=self.now)
+        self.assertEqual(self.repository.save_renewals([("KEY-1", renewed)], [log], self.now), 1)
+
+        self.assertEqual(self.repository.get_license_by_key("KEY-1").status, LicenseStatus.REVOKED)
+        self.assertEqual(self.repository.get_license_by_key("KEY-1B").end_date, renewed.end_date)
+        self.assertEqual(self.repository.get_superseded_by("KEY-1"), "KEY-1B")
+        self.assertIsNone(self.repository.get_superseded_by("KEY-1B"))
+        self.assertEqual([log.action for log in self.repository.iter_usage_history("KEY-1")], ["续期许可证"])
+
+        # 已吊销或已续期的许可证不能再续期，整批不生效
+        with self.assertRaises(ValueError):
+            self.repository.save_renewals([("KEY-2", self._license("KEY-2B")), ("KEY-1", self._license("KEY-1C"))],
+                                          [], self.now)
+        self.assertIsNone(self.repository.get_license_by_key("KEY-2B"))
+        self.assertIsNone(self.repository.get_superseded_by("KEY-2"))
+
+
+class TestSQLiteLicenseRepository(RepositoryContractMixin, unittest.TestCase):
+    test_db_path = "test_repository.db"
+
+    def make_repository(self):
+        return SQLiteLicenseRepository(self.test_db_path)
+
+    def tearDown(self):
+        self.repository.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def test_schema_version_skips_ddl(self):
+        self.repository.add_audit_log("创建许可证", "KEY-1", "system")
+        with self.repository.connection() as conn:
+            conn.execute("DROP INDEX idx_licenses_status_end_date")
+            conn.commit()
+        self.repository.close()
+
+        # 版本号未变时不再执行建表语句，被删除的索引不会重建
+        self.repository = SQLiteLicenseRepository(self.test_db_path)
+        with self.repository.connection() as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertNotIn('idx_licenses_status_end_date', indexes)
+        # 仍能读到已有的审计分区
+        self.assertEqual(len(list(self.repository.iter_usage_history("KEY-1"))), 1)
+
+    def test_schema_version_tracks_layout(self):
+        self.repository.close()
+        self.repository = SQLiteLicenseRepository(self.test_db_path, full_text_search=True)
+        with self.repository.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertEqual(version, self.repository.schema_version())
+        self.assertIn('licenses_fts', tables)
+
+
+class TestInMemoryLicenseRepository(RepositoryContractMixin, unittest.TestCase):
+    def make_repository(self):
+        return InMemoryLicenseRepository()
+
+    def test_manager_with_memory_backend(self):
+        manager = LicenseManager(secret_key="test_secret_key", repository=self.repository)
+        license = manager.create_license(
+            license_type=LicenseType.PROFESSIONAL,
+            start_date=self.now,
+            end_date=self.now + timedelta(days=30),
+            product_id="PROD-A",
+            user_info={"company": "Acme"}
+        )
+        self.assertTrue(manager.revoke_license(license.license_key))
+        self.assertEqual(manager.get_license_by_key(license.license_key).status, LicenseStatus.REVOKED)
+        actions = [log.action for log in manager.get_license_usage_history(license.license_key)]
+        self.assertEqual(actions[0], "吊销许可证")
+        self.assertIn("创建许可证", actions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import os
+import json
+import socket
+import asyncio
+import threading
+import http.client
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.server import LicenseServer
+from src.rate_limiter import RateLimiter
+
+
+class TestLicenseServer(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_server.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        now = datetime.now()
+        self.license = self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=now,
+            end_date=now + timedelta(days=30),
+            product_id="PROD-A"
+        )
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = LicenseServer(self.manager.validator, port=0, max_workers=2, max_batch_size=3)
+        self.port = asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _request(self, conn, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_endpoints_over_keep_alive_connection(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            self.assertEqual(self._request(conn, "GET", "/health"), (200, {"status": "ok"}))
+
+            status, result = self._request(conn, "POST", "/validate", {
+                "license_key": self.license.license_key, "product_id": "PROD-A",
+                "machine_info": {"machine_id": "m1"}
+            })
+            self.assertEqual(status, 200)
+            self.assertTrue(result["valid"])
+
+            status, result = self._request(conn, "POST", "/validate/batch", {"requests": [
+                {"license_key": self.license.license_key, "product_id": "PROD-A"},
+                {"license_key": "MISSING", "product_id": "PROD-A"},
+            ]})
+            self.assertEqual([item["valid"] for item in result["results"]], [True, False])
+
+            self.manager.revoke_license(self.license.license_key)
+            status, result = self._request(conn, "GET", f"/revocation/{self.license.license_key}")
+            self.assertEqual((status, result["revoked"]), (200, True))
+        finally:
+            conn.close()
+
+    def test_metrics_endpoint(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            conn.request("GET", "/metrics")
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+            self.assertIn(b"license_operation_duration_seconds", response.read())
+        finally:
+            conn.close()
+
+    def test_errors(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            self.assertEqual(self._request(conn, "GET", "/revocation/MISSING")[0], 404)
+            self.assertEqual(self._request(conn, "GET", "/unknown")[0], 404)
+            self.assertEqual(self._request(conn, "GET", "/validate")[0], 405)
+            self.assertEqual(self._request(conn, "POST", "/validate/batch", {"requests": [{}] * 4})[0], 413)
+            conn.request("POST", "/validate", body="not json")
+            response = conn.getresponse()
+            self.assertEqual(response.status, 400)
+            response.read()
+        finally:
+            conn.close()
+
+    def test_internal_error_is_not_leaked(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        error = RuntimeError("database is locked: /var/lib/licenses.db")
+        try:
+            with patch.object(self.manager.repository, 'get_license_by_key', side_effect=error), \
+                    self.assertLogs('src.server', level='ERROR') as logs:
+                status, payload = self._request(conn, "GET", f"/revocation/{self.license.license_key}")
+            self.assertEqual(status, 500)
+            self.assertEqual(payload, {"error": "服务器内部错误"})
+            self.assertIn("/var/lib/licenses.db", logs.output[0])
+        finally:
+            conn.close()
+
+    def test_transient_validation_failures(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        request = {"license_key": self.license.license_key, "product_id": "PROD-A"}
+        try:
+            # 按许可证限流返回429，而不是 valid=false
+            self.manager.validator.set_rate_limiter(RateLimiter(rate=1, period=60))
+            self.assertEqual(self._request(conn, "POST", "/validate", request)[0], 200)
+            self.assertEqual(self._request(conn, "POST", "/validate", request),
+                             (429, {"error": "验证请求过于频繁，请稍后再试"}))
+            self.manager.validator.set_rate_limiter(None)
+
+            # 数据库错误返回503，不泄露异常信息
+            error = RuntimeError("database is locked")
+            with patch.object(self.manager.repository, 'get_license_by_key', side_effect=error), \
+                    self.assertLogs('src.server', level='WARNING'):
+                status, payload = self._request(conn, "POST", "/validate", request)
+                self.assertEqual(status, 503)
+                self.assertNotIn("database", payload["error"])
+
+                status, payload = self._request(conn, "POST", "/validate/batch", {"requests": [request]})
+                self.assertEqual(status, 200)
+                self.assertEqual(payload["results"][0]["status"], 503)
+                self.assertFalse(payload["results"][0]["valid"])
+        finally:
+            conn.close()
+
+    def test_rate_limited(self):
+        self.server.rate_limiter = RateLimiter(rate=2, period=60)
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        try:
+            statuses = [self._request(conn, "GET", "/health")[0] for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+        finally:
+            conn.close()
+
+    def test_pipelined_requests(self):
+        request = (
+            "GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            f"GET /revocation/{self.license.license_key} HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            "GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as sock:
+            sock.sendall(request.encode())
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        responses = data.split(b'HTTP/1.1 ')[1:]
+        self.assertEqual(len(responses), 3)
+        self.assertTrue(all(response.startswith(b'200') for response in responses))
+        self.assertIn(b'"revoked": false', responses[1])
+        self.assertIn(b'Connection: close', responses[2])
+
+    def test_negative_content_length(self):
+        request = "POST /validate HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n"
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as sock:
+            sock.sendall(request.encode())
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+        self.assertTrue(data.startswith(b'HTTP/1.1 400'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+import os
+from datetime import datetime, timedelta
+from src.models import License, LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.sqlite_repository import SQLiteLicenseRepository
+from src.sharded_repository import ShardedSQLiteRepository, reshard_database, shard_index, shard_paths
+
+
+class TestShardedSQLiteRepository(unittest.TestCase):
+    base_path = "test_sharded.db"
+
+    def setUp(self):
+        self.repository = ShardedSQLiteRepository.from_base_path(self.base_path, 3)
+        self.now = datetime.now()
+
+    def tearDown(self):
+        self.repository.close()
+        for path in shard_paths(self.base_path, 3) + shard_paths("test_resharded.db", 2) + ["test_single.db"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _license(self, key, product_id="PROD-A", status=LicenseStatus.ACTIVE, end_days=30):
+        return License(
+            license_key=key,
+            license_type=LicenseType.STANDARD,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + timedelta(days=end_days),
+            product_id=product_id,
+            user_info={"company": "Acme"},
+            status=status
+        )
+
+    def test_shard_index_is_stable(self):
+        self.assertEqual(shard_paths("data/licenses.db", 2), ["data/licenses.shard0.db", "data/licenses.shard1.db"])
+        self.assertEqual(shard_index("KEY-1", 3), shard_index("KEY-1", 3))
+        self.assertTrue(all(0 <= shard_index(f"KEY-{i}", 3) < 3 for i in range(100)))
+
+    def test_routing(self):
+        keys = [f"KEY-{i}" for i in range(20)]
+        self.repository.save_licenses([self._license(key) for key in keys])
+
+        for key in keys:
+            shard = self.repository.shards[shard_index(key, 3)]
+            self.assertIsNotNone(shard.get_license_by_key(key))
+            self.assertEqual(self.repository.get_license_by_key(key).license_key, key)
+        self.assertEqual(sum(len(shard.get_all_licenses()) for shard in self.repository.shards), 20)
+
+        self.repository.add_audit_log("创建许可证", "KEY-1", "system")
+        history = list(self.repository.iter_usage_history("KEY-1"))
+        self.assertEqual([log.action for log in history], ["创建许可证"])
+
+    def test_scatter_gather(self):
+        self.repository.save_licenses([
+            self._license("KEY-1"),
+            self._license("KEY-2", product_id="PROD-B"),
+            self._license("KEY-3", end_days=-1),
+            self._license("KEY-4", status=LicenseStatus.REVOKED, end_days=-1),
+        ])
+        self.assertEqual({lic.license_key for lic in self.repository.get_all_licenses(product_id="PROD-A")},
+                         {"KEY-1", "KEY-3", "KEY-4"})
+        self.assertEqual(len(self.repository.search_licenses(company="Acme", limit=2)), 2)
+        self.assertEqual(self.repository.get_next_expiration(), self.now - timedelta(days=1))
+        self.assertEqual(self.repository.expire_licenses(self.now), 1)
+
+        stats = self.repository.get_statistics()
+        self.assertEqual(stats['total'], 4)
+        self.assertEqual(stats['by_status'], {
+            LicenseStatus.ACTIVE.value: 2, LicenseStatus.EXPIRED.value: 1, LicenseStatus.REVOKED.value: 1
+        })
+        self.assertEqual(stats['by_type'], {LicenseType.STANDARD.value: 4})
+
+    def _read_feed(self, seq, limit):
+        changes = []
+        while True:
+            page = self.repository.changes_since(seq, limit)
+            if not page:
+                return changes, seq
+            changes.extend(page)
+            seq = page[-1]['seq']
+
+    def test_merged_change_feed(self):
+        keys = [f"KEY-{i}" for i in range(10)]
+        for key in keys:
+            self.repository.save_license(self._license(key))
+        self.assertGreater(len({shard_index(key, 3) for key in keys}), 1)
+
+        # 分页读取：跨分片大致按变更时间交错，不重复、不遗漏
+        changes, seq = self._read_feed(0, limit=3)
+        self.assertEqual([c['license_key'] for c in changes], keys)
+        self.assertEqual({c['operation'] for c in changes}, {'create'})
+        self.assertEqual(len(seq), 3)
+
+        # 从游标继续，只返回之后的变更
+        self.repository.update_license(self._license("KEY-4", status=LicenseStatus.REVOKED))
+        self.repository.update_license(self._license("KEY-7", status=LicenseStatus.REVOKED))
+        changes, seq = self._read_feed(seq, limit=1)
+        self.assertEqual([(c['license_key'], c['status']) for c in changes],
+                         [("KEY-4", LicenseStatus.REVOKED), ("KEY-7", LicenseStatus.REVOKED)])
+        self.assertEqual(changes[0]['shard'], shard_index("KEY-4", 3))
+        self.assertEqual(self.repository.changes_since(seq), [])
+
+        with self.assertRaises(ValueError):
+            self.repository.changes_since((0, 0))
+
+    def test_change_feed_with_unordered_timestamps(self):
+        # 导入的许可证 updated_at 倒序，各分片内仍按序号读取，分页不会跳过任何变更
+        keys = [f"KEY-{i}" for i in range(12)]
+        for i, key in enumerate(keys):
+            license = self._license(key)
+            license.updated_at = self.now - timedelta(minutes=i)
+            self.repository.save_license(license)
+
+        changes, seq = self._read_feed(0, limit=2)
+        self.assertEqual(sorted(c['license_key'] for c in changes), sorted(keys))
+        for shard in range(3):
+            self.assertEqual([c['license_key'] for c in changes if c['shard'] == shard],
+                             [key for key in keys if shard_index(key, 3) == shard])
+        self.assertEqual(self.repository.changes_since(seq), [])
+
+    def test_manager_with_sharded_backend(self):
+        manager = LicenseManager(secret_key="test_secret_key", repository=self.repository)
+        license = manager.create_license(
+            license_type=LicenseType.PROFESSIONAL,
+            start_date=self.now,
+            end_date=self.now + timedelta(days=30),
+            product_id="PROD-A"
+        )
+        self.assertTrue(manager.revoke_license(license.license_key))
+        self.assertEqual(manager.get_license_by_key(license.license_key).status, LicenseStatus.REVOKED)
+        self.assertEqual(manager.get_statistics()['total'], 1)
+
+    def test_reshard_single_database(self):
+        source = SQLiteLicenseRepository("test_single.db")
+        keys = [f"KEY-{i}" for i in range(10)]
+        source.save_licenses([self._license(key) for key in keys])
+        source.add_audit_log("创建许可证", "KEY-1", "system", {"n": 1})
+        source.record_usage("KEY-2", {"machine_id": "m1"}, self.now)
+        source.add_activation("KEY-3", "fp-1", 5, self.now)
+        renewed = self._license("KEY-4-RENEWED")
+        source.save_renewals([("KEY-4", renewed)], [], self.now)
+        source.close()
+
+        progress = []
+        copied = reshard_database(["test_single.db"], shard_paths("test_resharded.db", 2), chunk_size=3,
+                                  progress=lambda table, count: progress.append((table, count)))
+        self.assertEqual(copied, {'licenses': 11, 'audit_logs': 1, 'activations': 1, 'validation_counters': 1,
+                                  'license_renewals': 1})
+        self.assertIn(('licenses', 11), progress)
+
+        target = ShardedSQLiteRepository.from_base_path("test_resharded.db", 2)
+        try:
+            self.assertEqual({lic.license_key for lic in target.get_all_licenses()}, set(keys) | {"KEY-4-RENEWED"})
+            self.assertEqual([log.details for log in target.iter_usage_history("KEY-1")], [{"n": 1}])
+            self.assertEqual(target.get_validation_counters("KEY-2")[0]['machine_info'], {"machine_id": "m1"})
+            self.assertEqual(len(target.get_activations("KEY-3")), 1)
+            self.assertEqual(target.get_superseded_by("KEY-4"), "KEY-4-RENEWED")
+            self.assertEqual(target.get_license_by_key("KEY-4").status, LicenseStatus.REVOKED)
+        finally:
+            target.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
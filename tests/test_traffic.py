@@ -0,0 +1,111 @@
+import unittest
+import os
+import gzip
+from datetime import datetime, timedelta
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+from src.traffic import TrafficRecorder, TrafficReplayer, read_trace
+from src.clock import FakeClock
+
+
+class TestTraffic(unittest.TestCase):
+    def setUp(self):
+        self.paths = ["test_traffic_source.db", "test_traffic_replay.db", "test_trace.jsonl.gz"]
+        self._remove_files()
+        self.trace_path = self.paths[2]
+        self.manager = LicenseManager(db_path=self.paths[0], secret_key="test_secret_key")
+        now = datetime.now()
+        self.license = self.manager.create_license(
+            LicenseType.STANDARD, now - timedelta(days=1), now + timedelta(days=30), "PROD-SECRET"
+        )
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.manager.repository.close()
+        self._remove_files()
+
+    def _remove_files(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _record(self):
+        recorder = TrafficRecorder(self.trace_path, clock=self.clock.monotonic)
+        recorder.attach(validator=self.manager.validator, manager=self.manager)
+        self.results = []
+        for _ in range(3):
+            self.results.append(self.manager.validator.validate_license_online(
+                self.license.license_key, "PROD-SECRET", {"machine_id": "m1"}
+            )[0])
+            self.clock.advance(2.0)
+        now = datetime.now()
+        created = self.manager.create_license(LicenseType.TRIAL, now, now + timedelta(days=30), "PROD-SECRET")
+        self.clock.advance(1.0)
+        self.manager.revoke_license(created.license_key)
+        recorder.close()
+        return created
+
+    def test_trace_is_anonymized(self):
+        created = self._record()
+        entries = list(read_trace(self.trace_path))
+        self.assertEqual([entry['op'] for entry in entries],
+                         ['validate_online'] * 3 + ['create', 'revoke'])
+        self.assertEqual([entry['t'] for entry in entries], [0.0, 2.0, 4.0, 6.0, 7.0])
+        self.assertEqual([entry['ok'] for entry in entries], self.results + [True, True])
+
+        with gzip.open(self.trace_path, 'rt', encoding='utf-8') as f:
+            raw = f.read()
+        for secret in (self.license.license_key, created.license_key, "PROD-SECRET", "m1"):
+            self.assertNotIn(secret, raw)
+        # 同一密钥对应同一摘要
+        self.assertEqual(len({entry['k'] for entry in entries[:3]}), 1)
+        self.assertEqual(entries[3]['k'], entries[4]['k'])
+
+    def test_detach_restores_methods(self):
+        recorder = TrafficRecorder(self.trace_path, clock=self.clock.monotonic)
+        recorder.attach(validator=self.manager.validator, manager=self.manager)
+        recorder.close()
+        self.assertNotIn('validate_license_online', self.manager.validator.__dict__)
+        self.assertNotIn('create_license', self.manager.__dict__)
+
+    def test_replay_original_speed(self):
+        self._record()
+        replay_manager = LicenseManager(db_path=self.paths[1], secret_key="test_secret_key")
+        try:
+            clock = FakeClock()
+            replayer = TrafficReplayer(replay_manager, speed=1.0, clock=clock.monotonic, sleep=clock.sleep)
+            report = replayer.replay(self.trace_path)
+            self.assertEqual(self.results, [True, True, True])
+            self.assertEqual(report['operations'], {'validate_online': 3, 'create': 1, 'revoke': 1})
+            self.assertEqual(report['mismatches'], {})
+            self.assertAlmostEqual(report['elapsed_seconds'], 7.0)
+            # 轨迹之前已存在的许可证 + 重放中创建的许可证
+            self.assertEqual(len(replay_manager.get_all_licenses()), 2)
+        finally:
+            replay_manager.repository.close()
+
+    def test_replay_accelerated(self):
+        self._record()
+        replay_manager = LicenseManager(db_path=self.paths[1], secret_key="test_secret_key")
+        try:
+            clock = FakeClock()
+            sleeps = []
+
+            def sleep(seconds):
+                sleeps.append(seconds)
+                clock.sleep(seconds)
+
+            replayer = TrafficReplayer(replay_manager, speed=10.0, clock=clock.monotonic, sleep=sleep)
+            report = replayer.replay(self.trace_path)
+            self.assertAlmostEqual(report['elapsed_seconds'], 0.7)
+            self.assertEqual(len(sleeps), 4)
+
+            sleeps.clear()
+            TrafficReplayer(replay_manager, speed=0, clock=clock.monotonic, sleep=sleep).replay(self.trace_path)
+            self.assertEqual(sleeps, [])
+        finally:
+            replay_manager.repository.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
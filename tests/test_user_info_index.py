@@ -0,0 +1,125 @@
+import unittest
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from src.models import LicenseType, LicenseStatus
+from src.license_manager import LicenseManager
+from src.user_info_index import UserInfoIndex
+
+
+class TestUserInfoIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_user_info_index.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                      full_text_search=True)
+        self.start_date = datetime.now()
+        self.end_date = self.start_date + timedelta(days=30)
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _create(self, product_id, user_info):
+        return self.manager.create_license(
+            license_type=LicenseType.STANDARD,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            product_id=product_id,
+            user_info=user_info
+        )
+
+    def test_search_by_indexed_fields(self):
+        first = self._create("PROD-A", {"company": "Acme", "email": "ops@acme.com"})
+        second = self._create("PROD-B", {"company": "Acme", "email": "it@acme.com"})
+        self._create("PROD-C", {"company": "Globex"})
+
+        results = self.manager.search_licenses(company="Acme")
+        self.assertEqual([lic.license_key for lic in results], [first.license_key, second.license_key])
+
+        results = self.manager.search_licenses(company="Acme", email="it@acme.com")
+        self.assertEqual([lic.license_key for lic in results], [second.license_key])
+
+        results = self.manager.search_licenses(company="Acme", product_id="PROD-A")
+        self.assertEqual([lic.license_key for lic in results], [first.license_key])
+
+        self.assertEqual(len(self.manager.search_licenses(company="Acme", limit=1)), 1)
+        self.assertEqual(self.manager.search_licenses(company="Acme", status=LicenseStatus.ACTIVE), [])
+
+    def test_search_uses_index(self):
+        with sqlite3.connect(self.test_db_path) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM licenses WHERE user_company = ?", ("Acme",)
+            ).fetchall()
+        self.assertIn("idx_licenses_user_company", plan[0][3])
+
+    def test_search_by_batch_id(self):
+        licenses = self.manager.batch_create_licenses(
+            count=1,
+            license_type=LicenseType.ENTERPRISE,
+            valid_years=1,
+            product_id="PROD-BATCH"
+        )
+        results = self.manager.search_licenses(batch_id=1)
+        self.assertEqual([lic.license_key for lic in results], [licenses[0].license_key])
+
+    def test_full_text_search(self):
+        license = self._create("PROD-A", {"company": "Acme", "contact": "Zhang San"})
+        self._create("PROD-B", {"company": "Globex", "contact": "Li Si"})
+
+        results = self.manager.search_licenses(text="zhang")
+        self.assertEqual([lic.license_key for lic in results], [license.license_key])
+
+        # 更新 user_info 后全文索引同步更新
+        license.user_info = {"company": "Acme", "contact": "Wang Wu"}
+        self.manager.update_license(license)
+        self.assertEqual(self.manager.search_licenses(text="zhang"), [])
+        self.assertEqual(len(self.manager.search_licenses(text="wang")), 1)
+
+    def test_full_text_search_cjk_and_email(self):
+        license = self._create("PROD-A", {"company": "北京测试科技", "contact": "张三",
+                                          "email": "zhangsan@example.com"})
+        self._create("PROD-B", {"company": "Globex", "contact": "李四", "email": "lisi@example.com"})
+
+        for text in ("张三", "北京测试科技", "zhangsan@example.com", "张三 zhangsan"):
+            results = self.manager.search_licenses(text=text)
+            self.assertEqual([lic.license_key for lic in results], [license.license_key], text)
+        self.assertEqual(len(self.manager.search_licenses(text="example.com")), 2)
+
+        # 查询语法字符按普通文本处理，不会报错
+        self.assertEqual(self.manager.search_licenses(text='"zhangsan OR * -'), [])
+        # 只索引值，不匹配JSON键名
+        self.assertEqual(self.manager.search_licenses(text="contact"), [])
+
+    def test_legacy_full_text_index_rebuilt(self):
+        license = self._create("PROD-A", {"contact": "张三"})
+        self.manager.repository.close()
+
+        # 模拟早期版本：直接索引 user_info 列JSON原文的外部内容表
+        conn = sqlite3.connect(self.test_db_path)
+        for trigger in ('licenses_fts_ai', 'licenses_fts_ad', 'licenses_fts_au'):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE licenses_fts")
+        conn.execute("CREATE VIRTUAL TABLE licenses_fts USING fts5(user_info, content='licenses', content_rowid='id')")
+        conn.execute("INSERT INTO licenses_fts (licenses_fts) VALUES ('rebuild')")
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                      full_text_search=True)
+        self.assertEqual([lic.license_key for lic in self.manager.search_licenses(text="张三")],
+                         [license.license_key])
+
+    def test_invalid_fields(self):
+        with self.assertRaises(ValueError):
+            self.manager.search_licenses(phone="123")
+        with self.assertRaises(ValueError):
+            UserInfoIndex(fields=("bad-field",))
+
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        with self.assertRaises(ValueError):
+            manager.search_licenses(text="acme")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from src.models import LicenseType
+from src.license_manager import LicenseManager
+
+
+class TestValidationCounters(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_validation_counters.db"
+        self.manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key",
+                                      aggregate_validations=True)
+        self.product_id = "TEST-PROD-001"
+        self.license = self.manager.create_license(
+            license_type=LicenseType.PROFESSIONAL,
+            start_date=datetime.now(),
+            end_date=datetime.now() + timedelta(days=30),
+            product_id=self.product_id
+        )
+
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+
+    def _validate(self, machine_info):
+        return self.manager.validator.validate_license_online(
+            license_key=self.license.license_key,
+            product_id=self.product_id,
+            machine_info=machine_info
+        )
+
+    def test_validations_are_aggregated(self):
+        machine_a = {"user_id": "user1", "machine_id": "machine-a"}
+        machine_b = {"user_id": "user2", "machine_id": "machine-b"}
+        for machine_info in (machine_a, machine_a, machine_b, dict(machine_a)):
+            self.assertEqual(self._validate(machine_info), (True, "许可证验证成功"))
+
+        counters = self.manager.get_validation_counters(self.license.license_key)
+        counts = {counter['machine_info']['machine_id']: counter['count'] for counter in counters}
+        self.assertEqual(counts, {"machine-a": 3, "machine-b": 1})
+        self.assertEqual(counters[0]['day'], datetime.now().date().isoformat())
+
+        # 验证事件不再写入完整的审计记录
+        actions = [log.action for log in self.manager.get_license_usage_history(self.license.license_key)]
+        self.assertEqual(actions, ["创建许可证"])
+
+        license = self.manager.get_license_by_key(self.license.license_key)
+        self.assertEqual(license.activation_count, 4)
+        self.assertIsNotNone(license.last_used)
+
+    def test_machine_info_is_interned(self):
+        for _ in range(3):
+            self._validate({"user_id": "user1", "machine_id": "machine-a"})
+
+        with sqlite3.connect(self.test_db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM machine_infos").fetchone()[0], 1)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM validation_counters").fetchone()[0], 1)
+
+    def test_non_validation_actions_keep_full_audit(self):
+        self.manager.revoke_license(self.license.license_key)
+
+        actions = [log.action for log in self.manager.get_license_usage_history(self.license.license_key)]
+        self.assertIn("吊销许可证", actions)
+        self.assertEqual(self._validate({"user_id": "user1"}), (False, "许可证已被吊销"))
+        self.assertEqual(self.manager.get_validation_counters(self.license.license_key), [])
+
+    def test_default_mode_writes_audit_rows(self):
+        manager = LicenseManager(db_path=self.test_db_path, secret_key="test_secret_key")
+        self.assertTrue(manager.validator.validate_license_online(
+            license_key=self.license.license_key,
+            product_id=self.product_id,
+            machine_info={"user_id": "user1"}
+        )[0])
+
+        actions = [log.action for log in manager.get_license_usage_history(self.license.license_key)]
+        self.assertIn("验证许可证", actions)
+        self.assertEqual(manager.get_validation_counters(self.license.license_key), [])
+
+
+if __name__ == "__main__":
+    unittest.main()